@@ -0,0 +1,77 @@
+"""
+Memory benchmark of the models: holds a job fleet and the recent checks in memory
+and reports the allocated bytes per object, compared to the same dataclasses without slots.
+
+    PYTHONPATH=. python benchmarks/bench_memory.py [--jobs N] [--checks N]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from dataclasses import fields, make_dataclass
+from datetime import datetime, timedelta
+
+from httpmonitor.models import Check, Job
+
+
+def unslotted(model_type: type) -> type:
+    """ The same fields in a plain (__dict__ based) dataclass, as the models were before. """
+    return make_dataclass(f"Unslotted{model_type.__name__}", [(act_field.name, act_field.type) for act_field in fields(model_type)])
+
+
+def create_jobs(model_type, count: int) -> list:
+    return [model_type(
+        name=f"job_{i}",
+        url=f"https://example.org/{i}",
+        method="GET",
+        headers={},
+        body={},
+        expected_regex="<title>.+?</title>",
+        scheduled_interval=30,
+        max_body_size=None
+    ) for i in range(count)]
+
+
+def create_checks(model_type, count: int) -> list:
+    start = datetime.now()
+    #The checks share the name strings of their jobs
+    job_names = [f"job_{i}" for i in range(1000)]
+    return [model_type(
+        job_name=job_names[i % 1000],
+        start_time=start + timedelta(microseconds=i),
+        end_time=start + timedelta(microseconds=i + 1500),
+        status_code=200,
+        regex_result="",
+        dns_ms=None,
+        connect_ms=None,
+        tls_ms=None,
+        ttfb_ms=12.5,
+        transfer_ms=3.25,
+        regex_ms=None
+    ) for i in range(count)]
+
+
+def measure(name: str, create, model_type, count: int):
+    gc.collect()
+    tracemalloc.start()
+    objects = create(model_type, count)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<20} {count:>9} objects {allocated / 2**20:>9.1f} MiB {allocated / count:>8.1f} B/object")
+    del objects
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=100_000)
+    parser.add_argument("--checks", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    measure("Job (slotted)", create_jobs, Job.trusted, args.jobs)
+    measure("Job (__dict__)", create_jobs, unslotted(Job), args.jobs)
+    measure("Check (slotted)", create_checks, Check.trusted, args.checks)
+    measure("Check (__dict__)", create_checks, unslotted(Check), args.checks)
+
+
+if __name__ == "__main__":
+    main()
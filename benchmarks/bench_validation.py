@@ -0,0 +1,60 @@
+"""
+Micro-benchmark of the model validation: cost per object of the Cerberus validation,
+the compiled schema validation and the trusted construction (no validation).
+
+    PYTHONPATH=. python benchmarks/bench_validation.py [--number N]
+"""
+import argparse
+import timeit
+
+from cerberus import Validator
+from datetime import datetime
+
+from httpmonitor.models import Check, Job
+from httpmonitor.validators import CheckValidator, JobValidator
+
+CHECK_VALUES = {
+    "job_name": "benchmark_job",
+    "start_time": datetime.now(),
+    "end_time": datetime.now(),
+    "status_code": 200,
+    "regex_result": "<title>Benchmark</title>"
+}
+
+JOB_VALUES = {
+    "name": "benchmark_job",
+    "url": "https://example.org/benchmark?page=1",
+    "method": "GET",
+    "headers": {"User-Agent": "httpmonitor"},
+    "body": {},
+    "expected_regex": "<title>.+?</title>",
+    "scheduled_interval": 30
+}
+
+
+def cerberus_validate(model_type, validator_type, values):
+    obj = model_type.trusted(**values)
+    validator = Validator()
+    validator.require_all = True
+    return validator.validate(obj.to_dict(), validator_type.schema)
+
+
+def measure(name: str, statement, number: int):
+    seconds = min(timeit.repeat(statement, number=number, repeat=3))
+    print(f"{name:<30} {seconds / number * 1e6:>10.2f} us/object")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000, help="objects created per measurement")
+    number = parser.parse_args().number
+
+    for model_type, validator_type, values in [(Check, CheckValidator, CHECK_VALUES), (Job, JobValidator, JOB_VALUES)]:
+        print(model_type.__name__)
+        measure("  Cerberus validation", lambda: cerberus_validate(model_type, validator_type, values), number)
+        measure("  compiled validation", lambda: model_type(**values), number)
+        measure("  trusted construction", lambda: model_type.trusted(**values), number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO, List, Tuple
+
+from .const import DEFAULT_WRITER_SPOOL_FSYNC_INTERVAL_MS, DEFAULT_WRITER_SPOOL_SEGMENT_MAX_BYTES
+from .logger import Logger
+from .models import Check
+
+#Every record is framed by its payload length and the CRC32 of the payload
+FRAME_HEADER = struct.Struct("<II")
+SEGMENT_PREFIX = "checks-"
+SEGMENT_SUFFIX = ".spool"
+CHECKPOINT_FILE = "checkpoint"
+
+
+@dataclass(frozen=True, order=True)
+class SpoolPosition:
+    segment: int
+    offset: int
+
+
+class CheckSpool:
+    """
+    Append-only local spool of the checks: the checks are written to segment files first and replayed to the database
+    from there, in order. The records are CRC framed, the writes are buffered and fsynced in batches (at most every
+    fsync_interval_ms), only the fsynced records are replayed. A new segment is started every segment_max_bytes and at
+    every start (so a torn tail of a crash is never appended to), the fully replayed segments are deleted.
+    The replayed position is kept in the checkpoint file: a check replayed right before a crash may be replayed again.
+    One spool directory must be used by one process only.
+    """
+
+    directory: str
+    segment_max_bytes: int
+    fsync_interval_ms: int
+
+    def __init__(self, directory: str, segment_max_bytes: int = DEFAULT_WRITER_SPOOL_SEGMENT_MAX_BYTES,
+                 fsync_interval_ms: int = DEFAULT_WRITER_SPOOL_FSYNC_INTERVAL_MS):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval_ms = fsync_interval_ms
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        segments = self.list_segments()
+        self.read_position = self.__load_checkpoint() or SpoolPosition(segments[0] if segments else 0, 0)
+        self.write_segment = segments[-1] + 1 if segments else 0
+        self.write_file = open(self.segment_path(self.write_segment), "ab")
+        self.write_offset = 0
+        self.synced_position = SpoolPosition(self.write_segment, 0)
+        self.last_sync = time.monotonic()
+        self.read_file: BinaryIO | None = None
+        self.read_file_segment: int | None = None
+
+    @staticmethod
+    def from_config(config_handler) -> "CheckSpool | None":
+        """ The spool of the [writer] config, None if spool_dir is not set. """
+        if not config_handler.writer_spool_dir:
+            return None
+        return CheckSpool(
+            directory=os.path.join(config_handler.working_dir, config_handler.writer_spool_dir),
+            segment_max_bytes=config_handler.writer_spool_segment_max_bytes,
+            fsync_interval_ms=config_handler.writer_spool_fsync_interval_ms
+        )
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment:012d}{SEGMENT_SUFFIX}")
+
+    def list_segments(self) -> List[int]:
+        return sorted(
+            int(act_name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            for act_name in os.listdir(self.directory)
+            if act_name.startswith(SEGMENT_PREFIX) and act_name.endswith(SEGMENT_SUFFIX)
+        )
+
+    @property
+    def pending_bytes(self) -> int:
+        """ Size of the spooled checks not replayed yet. """
+        with self.lock:
+            pending = self.write_offset - self.read_position.offset if self.read_position.segment == self.write_segment else self.write_offset
+            for act_segment in self.list_segments():
+                if self.read_position.segment <= act_segment < self.write_segment:
+                    size = os.path.getsize(self.segment_path(act_segment))
+                    pending += size - self.read_position.offset if act_segment == self.read_position.segment else size
+            return pending
+
+    def append(self, checks: List[Check]):
+        """ Appends the checks (buffered), they are readable after the next sync. """
+        with self.lock:
+            for act_check in checks:
+                payload = json.dumps(self.__encode(act_check), separators=(",", ":")).encode()
+                self.write_file.write(FRAME_HEADER.pack(len(payload), zlib.crc32(payload)))
+                self.write_file.write(payload)
+                self.write_offset += FRAME_HEADER.size + len(payload)
+                if self.write_offset >= self.segment_max_bytes:
+                    self.__rotate()
+
+    def sync(self, force: bool = False):
+        """ Fsyncs the appended checks if fsync_interval_ms passed since the last sync (or if forced). """
+        with self.lock:
+            if self.synced_position == SpoolPosition(self.write_segment, self.write_offset):
+                return
+            if not force and (time.monotonic() - self.last_sync) * 1000 < self.fsync_interval_ms:
+                return
+            self.__sync()
+
+    def read(self, max_count: int) -> Tuple[List[Check], SpoolPosition]:
+        """
+        Reads at most max_count synced checks from the replay position, returns them with the position after them.
+        The position is only stored by commit(), so the same checks are read again until they are committed.
+        """
+        with self.lock:
+            synced_position = self.synced_position
+        position = self.read_position
+        checks = []
+        while len(checks) < max_count and position < synced_position:
+            limit = synced_position.offset if position.segment == synced_position.segment else None
+            reader = self.__reader(position.segment)
+            if reader is None:
+                position = SpoolPosition(position.segment + 1, 0)
+                continue
+            reader.seek(position.offset)
+            header = reader.read(FRAME_HEADER.size)
+            if limit is None and len(header) == 0:
+                #End of a sealed segment
+                position = SpoolPosition(position.segment + 1, 0)
+                continue
+            length, crc = FRAME_HEADER.unpack(header) if len(header) == FRAME_HEADER.size else (0, None)
+            payload = reader.read(length) if crc is not None else b""
+            if crc is None or len(payload) != length or zlib.crc32(payload) != crc:
+                #Only the sealed segments can be corrupt (torn write before a crash), their rest is skipped
+                Logger.error("Corrupt record in the spool segment %d at offset %d, the rest of the segment is skipped.", position.segment, position.offset)
+                position = SpoolPosition(position.segment + 1, 0)
+                continue
+            checks.append(self.__decode(json.loads(payload)))
+            position = SpoolPosition(position.segment, position.offset + FRAME_HEADER.size + length)
+        return (checks, position)
+
+    def commit(self, position: SpoolPosition):
+        """ Stores the replay position and deletes the segments before it. """
+        checkpoint_path = os.path.join(self.directory, CHECKPOINT_FILE)
+        with open(checkpoint_path + ".tmp", "w") as writer:
+            writer.write(f"{position.segment} {position.offset}")
+        os.replace(checkpoint_path + ".tmp", checkpoint_path)
+        self.read_position = position
+        for act_segment in self.list_segments():
+            if act_segment < position.segment:
+                if self.read_file_segment == act_segment:
+                    self.__close_reader()
+                os.remove(self.segment_path(act_segment))
+
+    def close(self):
+        with self.lock:
+            self.__sync()
+            self.write_file.close()
+        self.__close_reader()
+
+    def __sync(self):
+        self.write_file.flush()
+        os.fsync(self.write_file.fileno())
+        self.synced_position = SpoolPosition(self.write_segment, self.write_offset)
+        self.last_sync = time.monotonic()
+
+    def __rotate(self):
+        self.__sync()
+        self.write_file.close()
+        self.write_segment += 1
+        self.write_file = open(self.segment_path(self.write_segment), "ab")
+        self.write_offset = 0
+        self.synced_position = SpoolPosition(self.write_segment, 0)
+
+    def __reader(self, segment: int) -> BinaryIO | None:
+        if self.read_file_segment != segment:
+            self.__close_reader()
+            try:
+                self.read_file = open(self.segment_path(segment), "rb")
+            except FileNotFoundError:
+                return None
+            self.read_file_segment = segment
+        return self.read_file
+
+    def __close_reader(self):
+        if self.read_file:
+            self.read_file.close()
+        self.read_file = None
+        self.read_file_segment = None
+
+    def __load_checkpoint(self) -> SpoolPosition | None:
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE)) as reader:
+                segment, offset = reader.read().split()
+            return SpoolPosition(int(segment), int(offset))
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def __encode(check: Check) -> dict:
+        values = check.to_dict()
+        values["start_time"] = check.start_time.isoformat()
+        values["end_time"] = check.end_time.isoformat()
+        return values
+
+    @staticmethod
+    def __decode(values: dict) -> Check:
+        values["start_time"] = datetime.fromisoformat(values["start_time"])
+        values["end_time"] = datetime.fromisoformat(values["end_time"])
+        #The spooled checks were validated before spooling them
+        return Check.trusted(**values)
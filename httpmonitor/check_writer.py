@@ -0,0 +1,169 @@
+import queue
+import threading
+import time
+
+from multiprocessing.queues import Queue
+from psycopg2 import InterfaceError, OperationalError
+from typing import List
+
+from .check_spool import CheckSpool
+from .const import SPOOL_MAX_RETRY_DELAY
+from .db_connector import DbConnector
+from .errors import SetupRequiredException
+from .logger import Logger
+from .models import Check
+
+
+class CheckWriter:
+    """
+    Collects the finished checks in a bounded in-memory queue and writes them to the database in batches
+    from a background thread. A batch is flushed when it reaches batch_size rows or when flush_interval_ms
+    has passed since its first check. If the queue is full, put() blocks until the writer catches up.
+    In multi-process mode the queue is the result queue shared with the worker processes.
+    With maintenance_interval set, the writer also maintains the partitions of the checks table that often (seconds).
+    With a spool, the batches are appended to the local spool instead, and a replayer thread writes them to the
+    database in order, retrying while the database is unavailable: the scans do not wait for the database.
+    """
+
+    batch_size: int
+    flush_interval_ms: int
+    queue_max_size: int
+    maintenance_interval: float
+    written: int
+    failed: int
+
+    def __init__(self, db_connector: DbConnector, batch_size: int, flush_interval_ms: int, queue_max_size: int, check_queue: Queue | None = None, maintenance_interval: float = 0,
+                 spool: CheckSpool | None = None):
+        self.db_connector = db_connector
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.queue_max_size = queue_max_size
+        self.maintenance_interval = maintenance_interval
+        self.next_maintenance = 0.0
+        self.written = 0
+        self.failed = 0
+
+        self.queue: queue.Queue[Check] | Queue = check_queue if check_queue is not None else queue.Queue(maxsize=queue_max_size)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.spool = spool
+        self.spooling_done = threading.Event()
+        self.replay_thread = None
+
+    @property
+    def depth(self) -> int:
+        """ Number of checks waiting for the upload. """
+        return self.queue.qsize()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.spooling_done.clear()
+        self.thread = threading.Thread(target=self.__run, name="httpmonitor_check_writer", daemon=True)
+        self.thread.start()
+        if self.spool:
+            self.replay_thread = threading.Thread(target=self.__replay, name="httpmonitor_check_replayer", daemon=True)
+            self.replay_thread.start()
+
+    def stop(self):
+        """
+        Stops the writer thread after flushing the checks already in the queue.
+        With a spool, the replayer stops when the spool is drained or the database is unavailable (the rest is replayed at the next start).
+        """
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        if self.replay_thread:
+            self.replay_thread.join()
+
+    def put(self, check: Check):
+        self.queue.put(check)
+
+    def __run(self):
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            #With a spool, the replayer talks to the database
+            if self.maintenance_interval and not self.spool and time.monotonic() >= self.next_maintenance:
+                self.maintain()
+            batch = self.__collect_batch()
+            if self.spool:
+                if batch:
+                    self.spool.append(batch)
+                self.spool.sync()
+            elif batch:
+                self.flush(batch)
+        if self.spool:
+            self.spool.sync(force=True)
+            self.spooling_done.set()
+
+    def __replay(self):
+        retry_delay = 0.0
+        while True:
+            if self.maintenance_interval and time.monotonic() >= self.next_maintenance:
+                self.maintain()
+            #Checked before reading, so the last checks spooled before stopping are replayed too
+            spooling_done = self.spooling_done.is_set()
+            checks, position = self.spool.read(self.batch_size)
+            if not checks:
+                if position != self.spool.read_position:
+                    self.spool.commit(position)
+                if spooling_done:
+                    break
+                time.sleep(0.05)
+                continue
+
+            try:
+                stored = self.db_connector.save_checks_into_db(checks)
+                self.spool.commit(position)
+                self.written += stored
+                retry_delay = 0.0
+                Logger.debug("%d checks replayed to the database, %d bytes waiting in the spool.", stored, self.spool.pending_bytes)
+            except (OperationalError, InterfaceError, SetupRequiredException) as e:
+                if self.spooling_done.is_set():
+                    Logger.error("The database is unavailable, %d bytes of checks stay in the spool: %s", self.spool.pending_bytes, e)
+                    break
+                retry_delay = min(max(retry_delay * 2, 0.5), SPOOL_MAX_RETRY_DELAY)
+                Logger.error("Replaying the spooled checks failed, retrying in %.1f seconds: %s", retry_delay, e)
+                time.sleep(retry_delay)
+            except Exception as e:
+                #Checks the database refuses would block the replay forever
+                self.spool.commit(position)
+                self.failed += len(checks)
+                Logger.error("Writing %d spooled checks to the database failed, they are dropped: %s", len(checks), e)
+
+    def __collect_batch(self) -> List[Check]:
+        batch = []
+        deadline = 0.0
+        while len(batch) < self.batch_size:
+            try:
+                if self.stop_event.is_set():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                #Waiting in short steps to notice the stop request
+                timeout = min(deadline - time.monotonic(), 0.1) if batch else 0.1
+                if timeout <= 0:
+                    break
+                batch.append(self.queue.get(timeout=timeout))
+                if len(batch) == 1:
+                    #The flush interval starts with the first check of the batch
+                    deadline = time.monotonic() + self.flush_interval_ms / 1000
+            except queue.Empty:
+                if not batch or self.stop_event.is_set():
+                    break
+        return batch
+
+    def flush(self, batch: List[Check]):
+        try:
+            stored = self.db_connector.save_checks_into_db(batch)
+            self.written += stored
+            Logger.debug("%d checks written to the database, %d waiting in the queue.", stored, self.depth)
+        except Exception as e:
+            self.failed += len(batch)
+            Logger.error("Writing %d checks to the database failed: %s", len(batch), e)
+
+    def maintain(self):
+        self.next_maintenance = time.monotonic() + self.maintenance_interval
+        try:
+            self.db_connector.maintain_check_partitions()
+        except Exception as e:
+            Logger.error("Maintaining the partitions of the checks table failed: %s", e)
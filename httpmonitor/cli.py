@@ -1,23 +1,52 @@
 import argparse
 
+from .config_handler import ConfigHandler
+from .const import ROLLUP_RESOLUTIONS
 from .errors import SetupRequiredException
+from .report import parse_duration, report
 from .scheduler import Scheduler
-from .setup import setup
+from .setup import migrate, setup
+from .supervisor import WorkerSupervisor
 
 class CommandHandler:
 
     @staticmethod
     def run(args):
-        if args.setup:
+        if args.command == "report":
+            try:
+                report(
+                    window=args.window,
+                    job_name=args.job,
+                    resolution=args.resolution,
+                    output_format=args.format,
+                    raw_checks=args.checks,
+                    output_path=args.output
+                )
+            except SetupRequiredException as e:
+                print(str(e))
+        elif args.setup:
             try:
                 setup()
             except Exception as e:
                 print(str(e))
+        elif args.migrate:
+            try:
+                migrate()
+            except Exception as e:
+                print(str(e))
         else:
             try:
-                scheduler = Scheduler(from_file="from_file" in args)
-                scheduler.schedule_jobs()
-                scheduler.scan_process.run()
+                ConfigHandler.reload_on_sighup()
+                config_handler = ConfigHandler.shared()
+                if config_handler.scan_workers > 1:
+                    supervisor = WorkerSupervisor(worker_count=config_handler.scan_workers, from_file=args.from_file)
+                    ConfigHandler.reload_on_sighup(on_reload=supervisor.request_reload)
+                    supervisor.run()
+                else:
+                    scheduler = Scheduler(from_file=args.from_file)
+                    ConfigHandler.reload_on_sighup(on_reload=scheduler.request_reload)
+                    scheduler.schedule_jobs()
+                    scheduler.scan_process.run()
             except SetupRequiredException as e:
                 print(str(e))
 
@@ -31,6 +60,16 @@ def run():
                         """,
                         action='store_true')
     parser.add_argument("--setup", help="Run setup initialization", action='store_true')
+    parser.add_argument("--migrate", help="Upgrade the database schema of an existing installation", action='store_true')
+
+    subparsers = parser.add_subparsers(dest="command")
+    report_parser = subparsers.add_parser("report", help="Uptime and latency statistics of the jobs (read with the Retriever user)")
+    report_parser.add_argument("--window", help="Time window of the report, ex. 30m, 24h, 7d (default: 24h)", type=parse_duration, default="24h")
+    report_parser.add_argument("--job", help="Report only this job")
+    report_parser.add_argument("--resolution", help="Rollups the statistics are computed from (default: hour)", choices=ROLLUP_RESOLUTIONS, default="hour")
+    report_parser.add_argument("--format", help="Output format (default: table)", choices=["table", "csv"], default="table")
+    report_parser.add_argument("--checks", help="Export the raw checks of the window instead of the statistics", action='store_true')
+    report_parser.add_argument("--output", help="Write the report to this file instead of the standard output")
     args = parser.parse_args()
 
     CommandHandler.run(args)
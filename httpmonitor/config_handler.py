@@ -1,14 +1,34 @@
 import json
 import keyring
 import os
+import signal
+import threading
+import time
 
 from http import HTTPMethod
 from configparser import ConfigParser
 from dataclasses import dataclass, field
+from typing import Callable, ClassVar
 
+from .const import (
+    CONFIG_RELOAD_CHECK_INTERVAL, CREDENTIAL_ENV_PREFIX,
+    DEFAULT_KEYRING_CACHE_TTL, DEFAULT_KEYRING_CREDENTIAL_FILE, DEFAULT_KEYRING_CREDENTIAL_SOURCE,
+    DEFAULT_DB_PARTITION_INTERVAL, DEFAULT_DB_PARTITIONS_AHEAD, DEFAULT_DB_RETENTION_DAYS,
+    DEFAULT_DB_POOL_HEALTH_CHECK_INTERVAL, DEFAULT_DB_POOL_IDLE_TIMEOUT, DEFAULT_DB_POOL_MAX_SIZE,
+    DEFAULT_HTTP_CONNECT_TIMEOUT, DEFAULT_HTTP_IDLE_TIMEOUT, DEFAULT_HTTP_MAX_HOSTS, DEFAULT_HTTP_POOL_MAX_SIZE, DEFAULT_HTTP_READ_TIMEOUT,
+    DEFAULT_LOG_JSON_BACKUP_COUNT, DEFAULT_LOG_JSON_MAX_BYTES, DEFAULT_LOG_JSON_OUT_PATH,
+    DEFAULT_SCAN_HOST_BURST, DEFAULT_SCAN_HOST_RATE, DEFAULT_SCAN_MAX_CONCURRENCY, DEFAULT_SCAN_MAX_PER_HOST, DEFAULT_SCAN_WORKERS,
+    DEFAULT_SCHEDULER_OVERRUN_POLICY, DEFAULT_SCHEDULER_RELOAD_INTERVAL, DEFAULT_SCHEDULER_RELOAD_NOTIFY,
+    DEFAULT_WRITER_BATCH_SIZE, DEFAULT_WRITER_FLUSH_INTERVAL_MS, DEFAULT_WRITER_QUEUE_MAX_SIZE,
+    DEFAULT_WRITER_SPOOL_DIR, DEFAULT_WRITER_SPOOL_FSYNC_INTERVAL_MS, DEFAULT_WRITER_SPOOL_SEGMENT_MAX_BYTES
+)
+from .credential_cache import CredentialCache
 from .models import AppConfig
 from .enums import DbUserType
-from .errors import EmptyParameterException, FilePathAlreadyTakenException, InvalidFilenameException, WrongUserTypeException
+from .errors import (
+    EmptyParameterException, FilePathAlreadyTakenException, InsecureCredentialFileException, InvalidFilenameException,
+    MissingCredentialFileException, WrongUserTypeException
+)
 
 @dataclass
 class ConfigHandler:
@@ -21,10 +41,107 @@ class ConfigHandler:
     db_port: str = field(init=False)
     db_name: str = field(init=False)
     db_name_default: str = field(init=False)
+    db_pool_max_size: int = field(init=False)
+    db_pool_idle_timeout: int = field(init=False)
+    db_pool_health_check_interval: int = field(init=False)
+    db_partition_interval: str = field(init=False)
+    db_partitions_ahead: int = field(init=False)
+    db_retention_days: int = field(init=False)
 
     keyring_service_name: str = field(init=False)
+    credential_source: str = field(init=False)
+    credential_file: str = field(init=False)
+    credential_cache_ttl: int = field(init=False)
     log_path: str = field(init=False)
     log_level: str = field(init=False)
+    log_json_path: str = field(init=False)
+    log_json_max_bytes: int = field(init=False)
+    log_json_backup_count: int = field(init=False)
+
+    scan_max_concurrency: int = field(init=False)
+    scan_workers: int = field(init=False)
+    scan_max_per_host: int = field(init=False)
+    scan_host_rate: float = field(init=False)
+    scan_host_burst: int = field(init=False)
+
+    reload_interval: int = field(init=False)
+    reload_notify: bool = field(init=False)
+    overrun_policy: str = field(init=False)
+
+    writer_batch_size: int = field(init=False)
+    writer_flush_interval_ms: int = field(init=False)
+    writer_queue_max_size: int = field(init=False)
+    writer_spool_dir: str = field(init=False)
+    writer_spool_segment_max_bytes: int = field(init=False)
+    writer_spool_fsync_interval_ms: int = field(init=False)
+
+    http_pool_max_size: int = field(init=False)
+    http_max_hosts: int = field(init=False)
+    http_idle_timeout: int = field(init=False)
+    http_connect_timeout: float = field(init=False)
+    http_read_timeout: float = field(init=False)
+
+    #Process-wide configuration, see shared()
+    _shared: ClassVar["ConfigHandler | None"] = None
+    _shared_mtime: ClassVar[float | None] = None
+    _next_mtime_check: ClassVar[float] = 0.0
+    _reload_requested: ClassVar[bool] = False
+    _shared_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @staticmethod
+    def shared() -> "ConfigHandler":
+        """
+        Returns the configuration loaded once for the whole process.
+        It is reloaded if the mtime of the config file changed (checked at most once per CONFIG_RELOAD_CHECK_INTERVAL)
+        or a reload was requested (SIGHUP). The reloaded configuration replaces the reference atomically:
+        the running scans keep using the object they already have, and an invalid new file keeps the previous config.
+        """
+        shared = ConfigHandler._shared
+        if shared is not None and not ConfigHandler._reload_requested and time.monotonic() < ConfigHandler._next_mtime_check:
+            return shared
+
+        with ConfigHandler._shared_lock:
+            if ConfigHandler._shared is None:
+                ConfigHandler._shared = ConfigHandler()
+                ConfigHandler._shared_mtime = ConfigHandler.__get_mtime(ConfigHandler._shared.config_path)
+            elif ConfigHandler._reload_requested or time.monotonic() >= ConfigHandler._next_mtime_check:
+                mtime = ConfigHandler.__get_mtime(ConfigHandler._shared.config_path)
+                if ConfigHandler._reload_requested or mtime != ConfigHandler._shared_mtime:
+                    ConfigHandler._reload_requested = False
+                    ConfigHandler._shared_mtime = mtime
+                    try:
+                        ConfigHandler._shared = ConfigHandler(config_path=ConfigHandler._shared.config_path)
+                        #The credential source might have changed
+                        CredentialCache.clear()
+                    except Exception as e:
+                        from .logger import Logger
+                        Logger.error("Reloading the config failed, the previous config is kept: %s", e)
+            ConfigHandler._next_mtime_check = time.monotonic() + CONFIG_RELOAD_CHECK_INTERVAL
+            return ConfigHandler._shared
+
+    @staticmethod
+    def request_reload():
+        """ The shared configuration is reloaded at its next use. """
+        ConfigHandler._reload_requested = True
+
+    @staticmethod
+    def reload_on_sighup(on_reload: Callable[[], None] | None = None):
+        """ On SIGHUP the config is reloaded, and on_reload is called (ex. to reload the jobs too). """
+        def handle_sighup(signum, frame):
+            # Only the flags are set in the signal handler, the file is read by the next shared() call
+            ConfigHandler.request_reload()
+            if on_reload:
+                on_reload()
+
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, handle_sighup)
+
+    @staticmethod
+    def __get_mtime(config_path: str) -> float | None:
+        try:
+            return os.stat(config_path).st_mtime
+        except OSError:
+            return None
 
     def deploy_default_app_config(self, out_filepath: str):
         """ The default config is:
@@ -36,13 +153,52 @@ class ConfigHandler:
         db_port = 5432
         db_name = httpmonitor
         db_name_default = defaultdb
+        pool_max_size = 10
+        pool_idle_timeout = 300
+        pool_health_check_interval = 30
+        partition_interval = day
+        partitions_ahead = 7
+        retention_days = 0
 
         [keyring]
         service_name = httpmonitor
+        credential_source = keyring
+        credential_file =
+        cache_ttl = 0
 
         [log]
         out_path = ./log.log
         level = info
+        json_out_path =
+        json_max_bytes = 10485760
+        json_backup_count = 5
+
+        [scanner]
+        max_concurrency = 100
+        workers = 1
+        max_per_host = 10
+        host_rate = 0
+        host_burst = 1
+
+        [scheduler]
+        reload_interval = 0
+        reload_notify = false
+        overrun_policy = skip
+
+        [writer]
+        batch_size = 500
+        flush_interval_ms = 1000
+        queue_max_size = 10000
+        spool_dir =
+        spool_segment_max_bytes = 67108864
+        spool_fsync_interval_ms = 200
+
+        [http]
+        pool_max_size = 10
+        max_hosts = 1000
+        idle_timeout = 60
+        connect_timeout = 5
+        read_timeout = 30
         """
 
         self.working_dir = os.path.abspath(".")
@@ -57,13 +213,52 @@ class ConfigHandler:
         parser.set("database", "db_port", "5432")
         parser.set("database", "db_name", "httpmonitor")
         parser.set("database", "db_name_default", "defaultdb")
+        parser.set("database", "pool_max_size", str(DEFAULT_DB_POOL_MAX_SIZE))
+        parser.set("database", "pool_idle_timeout", str(DEFAULT_DB_POOL_IDLE_TIMEOUT))
+        parser.set("database", "pool_health_check_interval", str(DEFAULT_DB_POOL_HEALTH_CHECK_INTERVAL))
+        parser.set("database", "partition_interval", DEFAULT_DB_PARTITION_INTERVAL)
+        parser.set("database", "partitions_ahead", str(DEFAULT_DB_PARTITIONS_AHEAD))
+        parser.set("database", "retention_days", str(DEFAULT_DB_RETENTION_DAYS))
 
         parser.add_section("keyring")
         parser.set("keyring", "service_name", "httpmonitor")
+        parser.set("keyring", "credential_source", DEFAULT_KEYRING_CREDENTIAL_SOURCE)
+        parser.set("keyring", "credential_file", DEFAULT_KEYRING_CREDENTIAL_FILE)
+        parser.set("keyring", "cache_ttl", str(DEFAULT_KEYRING_CACHE_TTL))
 
         parser.add_section("log")
         parser.set("log", "out_path" ,os.path.join(self.working_dir,"log.log"))
         parser.set("log", "level", "info")
+        parser.set("log", "json_out_path", DEFAULT_LOG_JSON_OUT_PATH)
+        parser.set("log", "json_max_bytes", str(DEFAULT_LOG_JSON_MAX_BYTES))
+        parser.set("log", "json_backup_count", str(DEFAULT_LOG_JSON_BACKUP_COUNT))
+
+        parser.add_section("scanner")
+        parser.set("scanner", "max_concurrency", str(DEFAULT_SCAN_MAX_CONCURRENCY))
+        parser.set("scanner", "workers", str(DEFAULT_SCAN_WORKERS))
+        parser.set("scanner", "max_per_host", str(DEFAULT_SCAN_MAX_PER_HOST))
+        parser.set("scanner", "host_rate", str(DEFAULT_SCAN_HOST_RATE))
+        parser.set("scanner", "host_burst", str(DEFAULT_SCAN_HOST_BURST))
+
+        parser.add_section("scheduler")
+        parser.set("scheduler", "reload_interval", str(DEFAULT_SCHEDULER_RELOAD_INTERVAL))
+        parser.set("scheduler", "reload_notify", str(DEFAULT_SCHEDULER_RELOAD_NOTIFY).lower())
+        parser.set("scheduler", "overrun_policy", DEFAULT_SCHEDULER_OVERRUN_POLICY)
+
+        parser.add_section("writer")
+        parser.set("writer", "batch_size", str(DEFAULT_WRITER_BATCH_SIZE))
+        parser.set("writer", "flush_interval_ms", str(DEFAULT_WRITER_FLUSH_INTERVAL_MS))
+        parser.set("writer", "queue_max_size", str(DEFAULT_WRITER_QUEUE_MAX_SIZE))
+        parser.set("writer", "spool_dir", DEFAULT_WRITER_SPOOL_DIR)
+        parser.set("writer", "spool_segment_max_bytes", str(DEFAULT_WRITER_SPOOL_SEGMENT_MAX_BYTES))
+        parser.set("writer", "spool_fsync_interval_ms", str(DEFAULT_WRITER_SPOOL_FSYNC_INTERVAL_MS))
+
+        parser.add_section("http")
+        parser.set("http", "pool_max_size", str(DEFAULT_HTTP_POOL_MAX_SIZE))
+        parser.set("http", "max_hosts", str(DEFAULT_HTTP_MAX_HOSTS))
+        parser.set("http", "idle_timeout", str(DEFAULT_HTTP_IDLE_TIMEOUT))
+        parser.set("http", "connect_timeout", str(DEFAULT_HTTP_CONNECT_TIMEOUT))
+        parser.set("http", "read_timeout", str(DEFAULT_HTTP_READ_TIMEOUT))
 
         out_fullpath = os.path.join(self.working_dir, out_filepath)
         if not os.path.exists(out_fullpath):
@@ -84,6 +279,10 @@ class ConfigHandler:
                 body: dict,
                 (opt)expected_regex: str(max. size 100)
                 scheduled_interval: int(0-300)
+                (opt)max_body_size: int
+                (opt)connect_timeout: float(seconds)
+                (opt)read_timeout: float(seconds)
+                (opt)conditional: bool
             }
         ]
         """
@@ -124,9 +323,40 @@ class ConfigHandler:
             database_db_port=int(parser.get('database', 'db_port')),
             database_db_name=parser.get('database', 'db_name'),
             database_db_name_default=parser.get('database', 'db_name_default'),
+            database_pool_max_size=int(parser.get('database', 'pool_max_size', fallback=DEFAULT_DB_POOL_MAX_SIZE)),
+            database_pool_idle_timeout=int(parser.get('database', 'pool_idle_timeout', fallback=DEFAULT_DB_POOL_IDLE_TIMEOUT)),
+            database_pool_health_check_interval=int(parser.get('database', 'pool_health_check_interval', fallback=DEFAULT_DB_POOL_HEALTH_CHECK_INTERVAL)),
+            database_partition_interval=parser.get('database', 'partition_interval', fallback=DEFAULT_DB_PARTITION_INTERVAL),
+            database_partitions_ahead=int(parser.get('database', 'partitions_ahead', fallback=DEFAULT_DB_PARTITIONS_AHEAD)),
+            database_retention_days=int(parser.get('database', 'retention_days', fallback=DEFAULT_DB_RETENTION_DAYS)),
             keyring_service_name=parser.get('keyring','service_name'),
+            keyring_credential_source=parser.get('keyring', 'credential_source', fallback=DEFAULT_KEYRING_CREDENTIAL_SOURCE),
+            keyring_credential_file=parser.get('keyring', 'credential_file', fallback=DEFAULT_KEYRING_CREDENTIAL_FILE),
+            keyring_cache_ttl=int(parser.get('keyring', 'cache_ttl', fallback=DEFAULT_KEYRING_CACHE_TTL)),
             log_out_path=parser.get('log', 'out_path'),
-            log_level=parser.get('log', 'level')
+            log_level=parser.get('log', 'level'),
+            log_json_out_path=parser.get('log', 'json_out_path', fallback=DEFAULT_LOG_JSON_OUT_PATH),
+            log_json_max_bytes=int(parser.get('log', 'json_max_bytes', fallback=DEFAULT_LOG_JSON_MAX_BYTES)),
+            log_json_backup_count=int(parser.get('log', 'json_backup_count', fallback=DEFAULT_LOG_JSON_BACKUP_COUNT)),
+            scanner_max_concurrency=int(parser.get('scanner', 'max_concurrency', fallback=DEFAULT_SCAN_MAX_CONCURRENCY)),
+            scanner_workers=int(parser.get('scanner', 'workers', fallback=DEFAULT_SCAN_WORKERS)),
+            scanner_max_per_host=int(parser.get('scanner', 'max_per_host', fallback=DEFAULT_SCAN_MAX_PER_HOST)),
+            scanner_host_rate=float(parser.get('scanner', 'host_rate', fallback=DEFAULT_SCAN_HOST_RATE)),
+            scanner_host_burst=int(parser.get('scanner', 'host_burst', fallback=DEFAULT_SCAN_HOST_BURST)),
+            scheduler_reload_interval=int(parser.get('scheduler', 'reload_interval', fallback=DEFAULT_SCHEDULER_RELOAD_INTERVAL)),
+            scheduler_reload_notify=parser.getboolean('scheduler', 'reload_notify', fallback=DEFAULT_SCHEDULER_RELOAD_NOTIFY),
+            scheduler_overrun_policy=parser.get('scheduler', 'overrun_policy', fallback=DEFAULT_SCHEDULER_OVERRUN_POLICY),
+            writer_batch_size=int(parser.get('writer', 'batch_size', fallback=DEFAULT_WRITER_BATCH_SIZE)),
+            writer_flush_interval_ms=int(parser.get('writer', 'flush_interval_ms', fallback=DEFAULT_WRITER_FLUSH_INTERVAL_MS)),
+            writer_queue_max_size=int(parser.get('writer', 'queue_max_size', fallback=DEFAULT_WRITER_QUEUE_MAX_SIZE)),
+            writer_spool_dir=parser.get('writer', 'spool_dir', fallback=DEFAULT_WRITER_SPOOL_DIR),
+            writer_spool_segment_max_bytes=int(parser.get('writer', 'spool_segment_max_bytes', fallback=DEFAULT_WRITER_SPOOL_SEGMENT_MAX_BYTES)),
+            writer_spool_fsync_interval_ms=int(parser.get('writer', 'spool_fsync_interval_ms', fallback=DEFAULT_WRITER_SPOOL_FSYNC_INTERVAL_MS)),
+            http_pool_max_size=int(parser.get('http', 'pool_max_size', fallback=DEFAULT_HTTP_POOL_MAX_SIZE)),
+            http_max_hosts=int(parser.get('http', 'max_hosts', fallback=DEFAULT_HTTP_MAX_HOSTS)),
+            http_idle_timeout=int(parser.get('http', 'idle_timeout', fallback=DEFAULT_HTTP_IDLE_TIMEOUT)),
+            http_connect_timeout=float(parser.get('http', 'connect_timeout', fallback=DEFAULT_HTTP_CONNECT_TIMEOUT)),
+            http_read_timeout=float(parser.get('http', 'read_timeout', fallback=DEFAULT_HTTP_READ_TIMEOUT))
         )
 
         #validate appconfig!
@@ -135,51 +365,117 @@ class ConfigHandler:
         self.db_port = str(config.database_db_port)
         self.db_name = config.database_db_name
         self.db_name_default = config.database_db_name_default
+        self.db_pool_max_size = config.database_pool_max_size
+        self.db_pool_idle_timeout = config.database_pool_idle_timeout
+        self.db_pool_health_check_interval = config.database_pool_health_check_interval
+        self.db_partition_interval = config.database_partition_interval
+        self.db_partitions_ahead = config.database_partitions_ahead
+        self.db_retention_days = config.database_retention_days
         self.keyring_service_name = config.keyring_service_name
+        self.credential_source = config.keyring_credential_source
+        self.credential_file = config.keyring_credential_file
+        self.credential_cache_ttl = config.keyring_cache_ttl
         self.log_path = config.log_out_path
         self.log_level = config.log_level
+        self.log_json_path = config.log_json_out_path
+        self.log_json_max_bytes = config.log_json_max_bytes
+        self.log_json_backup_count = config.log_json_backup_count
+        self.scan_max_concurrency = config.scanner_max_concurrency
+        self.scan_workers = config.scanner_workers
+        self.scan_max_per_host = config.scanner_max_per_host
+        self.scan_host_rate = config.scanner_host_rate
+        self.scan_host_burst = config.scanner_host_burst
+        self.reload_interval = config.scheduler_reload_interval
+        self.reload_notify = config.scheduler_reload_notify
+        self.overrun_policy = config.scheduler_overrun_policy
+        self.writer_batch_size = config.writer_batch_size
+        self.writer_flush_interval_ms = config.writer_flush_interval_ms
+        self.writer_queue_max_size = config.writer_queue_max_size
+        self.writer_spool_dir = config.writer_spool_dir
+        self.writer_spool_segment_max_bytes = config.writer_spool_segment_max_bytes
+        self.writer_spool_fsync_interval_ms = config.writer_spool_fsync_interval_ms
+        self.http_pool_max_size = config.http_pool_max_size
+        self.http_max_hosts = config.http_max_hosts
+        self.http_idle_timeout = config.http_idle_timeout
+        self.http_connect_timeout = config.http_connect_timeout
+        self.http_read_timeout = config.http_read_timeout
 
     def get_username(self, user_type: DbUserType):
-        match user_type:
-            case DbUserType.Retriever:
-                return keyring.get_password(self.keyring_service_name, "dqluser_username")
-            case DbUserType.Loader:
-                return keyring.get_password(self.keyring_service_name, "dmluser_username")
-            case DbUserType.Connector:
-                return keyring.get_password(self.keyring_service_name, "connector_username")
-            case _:
-                raise WrongUserTypeException(given_type=str(user_type))
-
+        return CredentialCache.get(
+            user_type=user_type,
+            kind="username",
+            loader=lambda: self.__load_credential(user_type, "username"),
+            ttl=self.credential_cache_ttl
+        )
 
     def get_password(self, user_type: DbUserType):
+        return CredentialCache.get(
+            user_type=user_type,
+            kind="password",
+            loader=lambda: self.__load_credential(user_type, "password"),
+            ttl=self.credential_cache_ttl
+        )
+
+    def __load_credential(self, user_type: DbUserType, kind: str) -> str | None:
+        """ Reads the credential from the configured source, the missing ones are looked up in the keyring. """
         match user_type:
             case DbUserType.Retriever:
-                return keyring.get_password(self.keyring_service_name, "dqluser_password")
+                keyring_name = f"dqluser_{kind}"
             case DbUserType.Loader:
-                return keyring.get_password(self.keyring_service_name, "dmluser_password")
+                keyring_name = f"dmluser_{kind}"
             case DbUserType.Connector:
-                return keyring.get_password(self.keyring_service_name, "connector_password")
+                keyring_name = f"connector_{kind}"
             case _:
                 raise WrongUserTypeException(given_type=str(user_type))
 
+        value = None
+        match self.credential_source:
+            case "env":
+                value = os.environ.get(f"{CREDENTIAL_ENV_PREFIX}_{user_type.value.upper()}_{kind.upper()}")
+            case "file":
+                value = self.__read_credential_file(user_type, kind)
+        if value is None:
+            value = keyring.get_password(self.keyring_service_name, keyring_name)
+        return value
+
+    def __read_credential_file(self, user_type: DbUserType, kind: str) -> str | None:
+        """
+        The credential file is an ini file with a section for every user type, ex.:
+        [Loader]
+        username = loader
+        password = <password>
+        """
+        credential_path = os.path.join(self.working_dir, self.credential_file)
+        try:
+            mode = os.stat(credential_path).st_mode
+        except FileNotFoundError:
+            raise MissingCredentialFileException(path=credential_path)
+        if mode & 0o077:
+            raise InsecureCredentialFileException(path=credential_path)
+        parser = ConfigParser(interpolation=None)
+        parser.read(credential_path)
+        return parser.get(user_type.value, kind, fallback=None)
+
     def set_username(self, user_type: DbUserType, username: str):
         if not username or username == "":
             raise EmptyParameterException(method_name="set_username")
         match user_type:
             case DbUserType.Retriever:
-                return keyring.set_password(self.keyring_service_name, "dqluser_username", username)
+                keyring.set_password(self.keyring_service_name, "dqluser_username", username)
             case DbUserType.Loader:
-                return keyring.set_password(self.keyring_service_name, "dmluser_username", username)
+                keyring.set_password(self.keyring_service_name, "dmluser_username", username)
             case _:
                 raise WrongUserTypeException(given_type=str(user_type))
+        CredentialCache.invalidate(user_type)
 
     def set_password(self, user_type: DbUserType, password: str):
         if not password or password == "":
             raise EmptyParameterException(method_name="set_username")
         match user_type:
             case DbUserType.Retriever:
-                return keyring.set_password(self.keyring_service_name, "dqluser_password", password)
+                keyring.set_password(self.keyring_service_name, "dqluser_password", password)
             case DbUserType.Loader:
-                return keyring.set_password(self.keyring_service_name, "dmluser_password", password)
+                keyring.set_password(self.keyring_service_name, "dmluser_password", password)
             case _:
                 raise WrongUserTypeException(given_type=str(user_type))
+        CredentialCache.invalidate(user_type)
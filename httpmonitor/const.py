@@ -1,2 +1,67 @@
 CONFIG_PATH = "./config.ini"
 JOBS_PATH = "./jobs.json"
+#The shared config is reloaded if the file changed, its mtime is checked at most this often (seconds)
+CONFIG_RELOAD_CHECK_INTERVAL = 5
+
+DEFAULT_SCAN_MAX_CONCURRENCY = 100
+DEFAULT_SCAN_WORKERS = 1
+DEFAULT_SCAN_MAX_PER_HOST = 10
+DEFAULT_SCAN_HOST_RATE = 0
+DEFAULT_SCAN_HOST_BURST = 1
+#The per-host limiter state of the unused hosts is dropped this often (seconds)
+HOST_LIMITER_PRUNE_INTERVAL = 60
+#The counters of the scan engine (and the host limiter stats) are logged this often (seconds)
+SCAN_ENGINE_STATS_INTERVAL = 300
+
+DEFAULT_SCHEDULER_RELOAD_INTERVAL = 0
+DEFAULT_SCHEDULER_RELOAD_NOTIFY = False
+#The reload thread waiting for the notifications checks the reload requests (SIGHUP) this often (seconds)
+RELOAD_REQUEST_CHECK_INTERVAL = 1
+#What happens if a job is due while its previous run is still going: skip the new run, run it once after the previous one (coalesce), or run both (overlap)
+DEFAULT_SCHEDULER_OVERRUN_POLICY = "skip"
+#Channel of the notifications sent by the trigger of the jobs table
+JOBS_NOTIFY_CHANNEL = "httpmonitor_jobs"
+
+DEFAULT_DB_POOL_MAX_SIZE = 10
+DEFAULT_DB_POOL_IDLE_TIMEOUT = 300
+DEFAULT_DB_POOL_HEALTH_CHECK_INTERVAL = 30
+DEFAULT_DB_PARTITION_INTERVAL = "day"
+DEFAULT_DB_PARTITIONS_AHEAD = 7
+DEFAULT_DB_RETENTION_DAYS = 0
+#Time buckets of the per-job rollups of the checks, and the number of latency histogram buckets per doubling of the latency
+ROLLUP_RESOLUTIONS = ("minute", "hour")
+LATENCY_HISTOGRAM_RESOLUTION = 4
+#The future partitions of the checks table are created (and the expired ones dropped) this often (seconds)
+PARTITION_MAINTENANCE_INTERVAL = 3600
+
+DEFAULT_WRITER_BATCH_SIZE = 500
+DEFAULT_WRITER_FLUSH_INTERVAL_MS = 1000
+DEFAULT_WRITER_QUEUE_MAX_SIZE = 10000
+DEFAULT_WRITER_SPOOL_DIR = ""
+DEFAULT_WRITER_SPOOL_SEGMENT_MAX_BYTES = 67108864
+DEFAULT_WRITER_SPOOL_FSYNC_INTERVAL_MS = 200
+#Maximum delay between the replay attempts of the spooled checks while the database is unavailable (seconds)
+SPOOL_MAX_RETRY_DELAY = 30
+
+DEFAULT_HTTP_POOL_MAX_SIZE = 10
+DEFAULT_HTTP_MAX_HOSTS = 1000
+DEFAULT_HTTP_IDLE_TIMEOUT = 60
+DEFAULT_HTTP_CONNECT_TIMEOUT = 5
+DEFAULT_HTTP_READ_TIMEOUT = 30
+
+DEFAULT_KEYRING_CREDENTIAL_SOURCE = "keyring"
+DEFAULT_KEYRING_CREDENTIAL_FILE = ""
+DEFAULT_KEYRING_CACHE_TTL = 0
+#Environment variables of the 'env' credential source, ex. HTTPMONITOR_LOADER_PASSWORD
+CREDENTIAL_ENV_PREFIX = "HTTPMONITOR"
+
+DEFAULT_LOG_JSON_OUT_PATH = ""
+DEFAULT_LOG_JSON_MAX_BYTES = 10485760
+DEFAULT_LOG_JSON_BACKUP_COUNT = 5
+
+#Rows fetched per round trip by the server-side cursors of the reports
+REPORT_CURSOR_ITERSIZE = 2000
+
+#Streaming regex search: size of the read chunks (bytes) and of the overlap window kept between them (characters)
+STREAM_CHUNK_SIZE = 16384
+REGEX_STREAM_OVERLAP = 4096
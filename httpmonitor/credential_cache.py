@@ -0,0 +1,40 @@
+import threading
+import time
+
+from typing import Callable, Dict, Tuple
+
+from .enums import DbUserType
+
+
+class CredentialCache:
+    """
+    Process-wide cache of the database credentials, so the connections do not query the key storage
+    (a D-Bus round trip with the Secret Service backend) every time.
+    The entries expire after ttl seconds (never if the ttl is 0), missing credentials are not cached.
+    """
+
+    _entries: Dict[Tuple[DbUserType, str], Tuple[str, float]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(user_type: DbUserType, kind: str, loader: Callable[[], str | None], ttl: float = 0) -> str | None:
+        entry = CredentialCache._entries.get((user_type, kind))
+        if entry is not None and (ttl <= 0 or time.monotonic() - entry[1] < ttl):
+            return entry[0]
+
+        value = loader()
+        if value is not None:
+            with CredentialCache._lock:
+                CredentialCache._entries[(user_type, kind)] = (value, time.monotonic())
+        return value
+
+    @staticmethod
+    def invalidate(user_type: DbUserType):
+        with CredentialCache._lock:
+            CredentialCache._entries.pop((user_type, "username"), None)
+            CredentialCache._entries.pop((user_type, "password"), None)
+
+    @staticmethod
+    def clear():
+        with CredentialCache._lock:
+            CredentialCache._entries = {}
@@ -1,45 +1,376 @@
+import csv
+import hashlib
+import io
 import json
 import psycopg2
 
+from contextlib import contextmanager
+from dataclasses import dataclass
 from psycopg2 import OperationalError
+from psycopg2.extras import execute_values
 from psycopg2.sql import SQL, Identifier, Literal
-from psycopg2.extensions import cursor
-from typing import List, Tuple
+from psycopg2.extensions import connection, cursor
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
 
 from .logger import Logger
 from .config_handler import ConfigHandler
+from .const import JOBS_NOTIFY_CHANNEL, LATENCY_HISTOGRAM_RESOLUTION, REPORT_CURSOR_ITERSIZE, ROLLUP_RESOLUTIONS
+from .db_pool import ConnectionPool, ConnectionPoolRegistry
 from .enums import DbUserType
 from .errors import UserAlreadyExistsException, SetupRequiredException
+from .finding_cache import FindingIdCache
+from .job_cache import JobIdCache
 from .models import Check, DbCredentials, Job
+from .rollups import Rollup
+
+#Schema changes applied after the initial schema, every statement must be idempotent
+MIGRATIONS = [
+    """
+    ALTER TABLE {db_name}.jobs ADD COLUMN IF NOT EXISTS max_body_size INT;
+    """,
+    """
+    ALTER TABLE {db_name}.checks
+        ADD COLUMN IF NOT EXISTS dns_ms REAL,
+        ADD COLUMN IF NOT EXISTS connect_ms REAL,
+        ADD COLUMN IF NOT EXISTS tls_ms REAL,
+        ADD COLUMN IF NOT EXISTS ttfb_ms REAL,
+        ADD COLUMN IF NOT EXISTS transfer_ms REAL,
+        ADD COLUMN IF NOT EXISTS regex_ms REAL;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION {db_name}.notify_jobs_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('""" + JOBS_NOTIFY_CHANNEL + """', TG_OP);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    DROP TRIGGER IF EXISTS jobs_changed ON {db_name}.jobs;
+    CREATE TRIGGER jobs_changed AFTER INSERT OR UPDATE OR DELETE ON {db_name}.jobs
+        FOR EACH STATEMENT EXECUTE FUNCTION {db_name}.notify_jobs_changed();
+    """,
+    #The checks table is partitioned by range on start_ts. The unpartitioned table of the older installations
+    #is kept as the checks_legacy partition (it is dropped by the retention like the others)
+    """
+    DO $$
+    DECLARE
+        act_grant RECORD;
+    BEGIN
+        IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('{db_name}.checks')) = 'r' THEN
+            ALTER TABLE {db_name}.checks RENAME TO checks_legacy;
+            --The primary key of a partitioned table has to include the partition key
+            ALTER TABLE {db_name}.checks_legacy DROP CONSTRAINT checks_pkey, ADD PRIMARY KEY (id, start_ts);
+            CREATE TABLE {db_name}.checks (
+                LIKE {db_name}.checks_legacy INCLUDING DEFAULTS,
+                PRIMARY KEY (id, start_ts),
+                FOREIGN KEY (job_id) REFERENCES {db_name}.jobs(id),
+                FOREIGN KEY (regex_result_id) REFERENCES {db_name}.regex_raw(id)
+            ) PARTITION BY RANGE (start_ts);
+            ALTER SEQUENCE {db_name}.checks_id_seq OWNED BY {db_name}.checks.id;
+            FOR act_grant IN
+                SELECT acl.grantee::regrole::text AS grantee, acl.privilege_type
+                FROM pg_class, aclexplode(pg_class.relacl) AS acl
+                WHERE pg_class.oid = to_regclass('{db_name}.checks_legacy') AND acl.grantee NOT IN (0, pg_class.relowner)
+            LOOP
+                EXECUTE format('GRANT %s ON {db_name}.checks TO %s', act_grant.privilege_type, act_grant.grantee);
+            END LOOP;
+            EXECUTE format('ALTER TABLE {db_name}.checks ATTACH PARTITION {db_name}.checks_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+                date_trunc('day', greatest((SELECT max(start_ts) FROM {db_name}.checks_legacy), localtimestamp)) + INTERVAL '1 day');
+        END IF;
+    END $$;
+    CREATE TABLE IF NOT EXISTS {db_name}.checks_default PARTITION OF {db_name}.checks DEFAULT;
+    CREATE INDEX IF NOT EXISTS checks_start_ts_brin ON {db_name}.checks USING BRIN (start_ts);
+    CREATE INDEX IF NOT EXISTS checks_job_id_start_ts_idx ON {db_name}.checks (job_id, start_ts);
+    """,
+    #The partitions are managed by the owner of the checks table, the Loader user can only call these functions
+    """
+    CREATE OR REPLACE FUNCTION {db_name}.create_checks_partitions(period TEXT, ahead INT) RETURNS INT AS $$
+    DECLARE
+        step INTERVAL;
+        lower_bound TIMESTAMP;
+        partition_name TEXT;
+        created INT := 0;
+    BEGIN
+        IF period NOT IN ('day', 'week', 'month') THEN
+            RAISE EXCEPTION 'Unsupported partition interval: %', period;
+        END IF;
+        step := ('1 ' || period)::INTERVAL;
+        lower_bound := date_trunc(period, localtimestamp);
+        FOR i IN 0..ahead LOOP
+            partition_name := 'checks_' || to_char(lower_bound, 'YYYYMMDD');
+            IF to_regclass(format('%s.%I', '{db_name}', partition_name)) IS NULL THEN
+                BEGIN
+                    --The checks stored in the default partition for the range are moved to the new partition
+                    EXECUTE format('CREATE TABLE {db_name}.%I (LIKE {db_name}.checks INCLUDING DEFAULTS)', partition_name);
+                    EXECUTE format('WITH moved AS (DELETE FROM {db_name}.checks_default WHERE start_ts >= %L AND start_ts < %L RETURNING *) INSERT INTO {db_name}.%I SELECT * FROM moved',
+                        lower_bound, lower_bound + step, partition_name);
+                    EXECUTE format('ALTER TABLE {db_name}.checks ATTACH PARTITION {db_name}.%I FOR VALUES FROM (%L) TO (%L)',
+                        partition_name, lower_bound, lower_bound + step);
+                    created := created + 1;
+                EXCEPTION WHEN invalid_object_definition THEN
+                    --The range overlaps an existing partition (the legacy one, or one created with another interval)
+                    NULL;
+                END;
+            END IF;
+            lower_bound := lower_bound + step;
+        END LOOP;
+        RETURN created;
+    END;
+    $$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = pg_catalog, pg_temp;
+
+    CREATE OR REPLACE FUNCTION {db_name}.drop_checks_partitions(retention INTERVAL) RETURNS INT AS $$
+    DECLARE
+        cutoff TIMESTAMP := localtimestamp - retention;
+        act_partition RECORD;
+        dropped INT := 0;
+    BEGIN
+        FOR act_partition IN
+            SELECT child.oid::regclass::text AS partition_name,
+                substring(pg_get_expr(child.relpartbound, child.oid) FROM 'TO \\(''([^'']+)''\\)')::TIMESTAMP AS upper_bound
+            FROM pg_inherits JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass('{db_name}.checks')
+        LOOP
+            IF act_partition.upper_bound <= cutoff THEN
+                EXECUTE format('DROP TABLE %s', act_partition.partition_name);
+                dropped := dropped + 1;
+            END IF;
+        END LOOP;
+        DELETE FROM {db_name}.checks_default WHERE start_ts < cutoff;
+        RETURN dropped;
+    END;
+    $$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = pg_catalog, pg_temp;
+
+    REVOKE ALL ON FUNCTION {db_name}.create_checks_partitions(TEXT, INT), {db_name}.drop_checks_partitions(INTERVAL) FROM PUBLIC;
+    DO $$
+    DECLARE
+        act_grantee TEXT;
+    BEGIN
+        FOR act_grantee IN
+            SELECT acl.grantee::regrole::text
+            FROM pg_class, aclexplode(pg_class.relacl) AS acl
+            WHERE pg_class.oid = to_regclass('{db_name}.checks') AND acl.privilege_type = 'INSERT' AND acl.grantee NOT IN (0, pg_class.relowner)
+        LOOP
+            EXECUTE format('GRANT EXECUTE ON FUNCTION {db_name}.create_checks_partitions(TEXT, INT), {db_name}.drop_checks_partitions(INTERVAL) TO %s', act_grantee);
+        END LOOP;
+    END $$;
+    """,
+    #Per-job rollups of the checks, updated with every written batch. The latency histograms of the rollups
+    #can be summed up (sum_histograms) over any time range, the percentiles are estimated by histogram_percentile()
+    """
+    CREATE TABLE IF NOT EXISTS {db_name}.job_rollups_minute (
+        job_id INT NOT NULL,
+        bucket_ts TIMESTAMP NOT NULL,
+        check_count INT NOT NULL DEFAULT 0,
+        status_1xx INT NOT NULL DEFAULT 0,
+        status_2xx INT NOT NULL DEFAULT 0,
+        status_3xx INT NOT NULL DEFAULT 0,
+        status_4xx INT NOT NULL DEFAULT 0,
+        status_5xx INT NOT NULL DEFAULT 0,
+        regex_checks INT NOT NULL DEFAULT 0,
+        regex_hits INT NOT NULL DEFAULT 0,
+        latency_histogram INT[] NOT NULL DEFAULT '{{}}',
+        latency_sum_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+        latency_max_ms REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (job_id, bucket_ts)
+    );
+    CREATE TABLE IF NOT EXISTS {db_name}.job_rollups_hour (LIKE {db_name}.job_rollups_minute INCLUDING ALL);
+
+    CREATE OR REPLACE FUNCTION {db_name}.add_histograms(INT[], INT[]) RETURNS INT[] AS $$
+        SELECT coalesce(array_agg(coalesce(left_count, 0) + coalesce(right_count, 0) ORDER BY bucket), '{{}}')
+        FROM unnest($1, $2) WITH ORDINALITY AS histogram(left_count, right_count, bucket);
+    $$ LANGUAGE sql IMMUTABLE;
+    CREATE OR REPLACE AGGREGATE {db_name}.sum_histograms(INT[]) (
+        SFUNC = {db_name}.add_histograms,
+        STYPE = INT[],
+        INITCOND = '{{}}'
+    );
+    CREATE OR REPLACE FUNCTION {db_name}.histogram_percentile(histogram INT[], percentile DOUBLE PRECISION) RETURNS REAL AS $$
+        SELECT power(2, (bucket - 0.5) / """ + str(LATENCY_HISTOGRAM_RESOLUTION) + """.0)::REAL
+        FROM (
+            SELECT bucket, sum(bucket_count) OVER (ORDER BY bucket) AS cumulative, sum(bucket_count) OVER () AS total
+            FROM unnest(histogram) WITH ORDINALITY AS histogram(bucket_count, bucket)
+        ) AS buckets
+        WHERE total > 0 AND cumulative >= percentile * total
+        ORDER BY bucket
+        LIMIT 1;
+    $$ LANGUAGE sql IMMUTABLE;
+    """ + "".join("""
+    CREATE OR REPLACE VIEW {db_name}.job_stats_""" + act_resolution + """ AS
+        SELECT job_id, bucket_ts, check_count,
+            (status_2xx + status_3xx)::REAL / nullif(check_count, 0) AS availability,
+            status_1xx, status_2xx, status_3xx, status_4xx, status_5xx,
+            regex_hits::REAL / nullif(regex_checks, 0) AS regex_hit_ratio,
+            (latency_sum_ms / nullif(check_count, 0))::REAL AS latency_avg_ms,
+            {db_name}.histogram_percentile(latency_histogram, 0.5) AS latency_p50_ms,
+            {db_name}.histogram_percentile(latency_histogram, 0.95) AS latency_p95_ms,
+            {db_name}.histogram_percentile(latency_histogram, 0.99) AS latency_p99_ms,
+            latency_max_ms
+        FROM {db_name}.job_rollups_""" + act_resolution + """;
+    """ for act_resolution in ROLLUP_RESOLUTIONS) + """
+    --The users of the checks table get the same access to the rollups
+    DO $$
+    DECLARE
+        act_grant RECORD;
+    BEGIN
+        FOR act_grant IN
+            SELECT acl.grantee::regrole::text AS grantee, acl.privilege_type
+            FROM pg_class, aclexplode(pg_class.relacl) AS acl
+            WHERE pg_class.oid = to_regclass('{db_name}.checks') AND acl.grantee NOT IN (0, pg_class.relowner)
+                AND acl.privilege_type IN ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+        LOOP
+            EXECUTE format('GRANT %s ON {db_name}.job_rollups_minute, {db_name}.job_rollups_hour TO %s', act_grant.privilege_type, act_grant.grantee);
+            IF act_grant.privilege_type = 'SELECT' THEN
+                EXECUTE format('GRANT SELECT ON {db_name}.job_stats_minute, {db_name}.job_stats_hour TO %s', act_grant.grantee);
+            END IF;
+        END LOOP;
+    END $$;
+    """,
+    #The regex findings are deduplicated by their content hash, the checks of the duplicates point to the kept row
+    """
+    ALTER TABLE {db_name}.regex_raw ADD COLUMN IF NOT EXISTS content_hash BYTEA;
+    UPDATE {db_name}.regex_raw SET content_hash = sha256(convert_to(coalesce(raw_finding, ''), 'UTF8')) WHERE content_hash IS NULL;
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM {db_name}.regex_raw GROUP BY content_hash HAVING count(*) > 1) THEN
+            CREATE TEMPORARY TABLE regex_raw_duplicates ON COMMIT DROP AS
+                SELECT id, canonical_id FROM (
+                    SELECT id, min(id) OVER (PARTITION BY content_hash) AS canonical_id FROM {db_name}.regex_raw
+                ) AS findings
+                WHERE id <> canonical_id;
+            UPDATE {db_name}.checks AS checks SET regex_result_id = duplicates.canonical_id
+                FROM regex_raw_duplicates AS duplicates WHERE checks.regex_result_id = duplicates.id;
+            DELETE FROM {db_name}.regex_raw AS regex_raw
+                USING regex_raw_duplicates AS duplicates WHERE regex_raw.id = duplicates.id;
+        END IF;
+    END $$;
+    ALTER TABLE {db_name}.regex_raw ALTER COLUMN content_hash SET NOT NULL;
+    CREATE UNIQUE INDEX IF NOT EXISTS regex_raw_content_hash_key ON {db_name}.regex_raw (content_hash);
+    """,
+    """
+    ALTER TABLE {db_name}.checks ADD COLUMN IF NOT EXISTS queue_ms REAL;
+    """,
+    #The checks timed out before the response headers have no status code
+    """
+    ALTER TABLE {db_name}.jobs
+        ADD COLUMN IF NOT EXISTS connect_timeout REAL,
+        ADD COLUMN IF NOT EXISTS read_timeout REAL;
+    ALTER TABLE {db_name}.checks
+        ALTER COLUMN status_code DROP NOT NULL,
+        ADD COLUMN IF NOT EXISTS timed_out BOOLEAN NOT NULL DEFAULT false;
+    """,
+    """
+    ALTER TABLE {db_name}.jobs ADD COLUMN IF NOT EXISTS conditional BOOLEAN NOT NULL DEFAULT false;
+    ALTER TABLE {db_name}.checks ADD COLUMN IF NOT EXISTS from_cache BOOLEAN NOT NULL DEFAULT false;
+    """,
+]
+
+@dataclass
+class UpsertReport:
+    """ Result of a bulk job upsert: the number of the new, the modified and the unchanged (skipped) jobs. """
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
 
 class DbConnector:
-    def __init__(self):
-        self.config = ConfigHandler()
+    @property
+    def config(self) -> ConfigHandler:
+        #The shared config is loaded once per process (and reloaded if the file changes)
+        return ConfigHandler.shared()
 
-    def __connect(self, user_type: DbUserType, db_name = None) -> cursor:
+    def __connect(self, user_type: DbUserType, db_name = None) -> connection:
+        #Resolved before connecting, so the errors of the credential source reach the caller as they are
+        username = self.config.get_username(user_type=user_type)
+        password = self.config.get_password(user_type=user_type)
         try:
             conn = psycopg2.connect(
                 host=self.config.db_url,
                 database=db_name if db_name else self.config.db_name,
                 port=self.config.db_port,
-                user=self.config.get_username(user_type=user_type),
-                password=self.config.get_password(user_type=user_type),
+                user=username,
+                password=password,
                 sslmode='require'
             )
             conn.autocommit = True
-            return conn.cursor()
+            return conn
         except OperationalError as e:
             Logger.error(e)
             raise SetupRequiredException()
         except Exception as e:
             raise NotImplemented(e)
-            
+
+    def __get_pool(self, user_type: DbUserType, db_name = None) -> ConnectionPool:
+        db_name = db_name if db_name else self.config.db_name
+        return ConnectionPoolRegistry.get_pool(
+            user_type=user_type,
+            db_name=db_name,
+            factory=lambda: ConnectionPool(
+                connect=lambda: self.__connect(user_type=user_type, db_name=db_name),
+                max_size=self.config.db_pool_max_size,
+                idle_timeout=self.config.db_pool_idle_timeout,
+                health_check_interval=self.config.db_pool_health_check_interval
+            )
+        )
+
+    @contextmanager
+    def __cursor(self, user_type: DbUserType, db_name = None) -> Iterator[cursor]:
+        """ Borrows a pooled (autocommit) connection of the given user for the lifetime of the cursor. """
+        with self.__get_pool(user_type=user_type, db_name=db_name).connection() as conn:
+            with conn.cursor() as cur:
+                yield cur
+
+    @contextmanager
+    def __transaction(self, user_type: DbUserType, db_name = None) -> Iterator[cursor]:
+        """ Borrows a pooled connection and runs the statements of the cursor in a single transaction. """
+        with self.__get_pool(user_type=user_type, db_name=db_name).connection() as conn:
+            conn.autocommit = False
+            try:
+                with conn.cursor() as cur:
+                    yield cur
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+
+    @contextmanager
+    def __server_cursor(self, user_type: DbUserType, name: str) -> Iterator[cursor]:
+        """
+        Named (server-side) cursor: the result stays in the database and the rows are fetched
+        in batches of REPORT_CURSOR_ITERSIZE while iterating, so the memory use does not depend on the row count.
+        """
+        with self.__get_pool(user_type=user_type).connection() as conn:
+            #Named cursors only live inside a transaction
+            conn.autocommit = False
+            try:
+                with conn.cursor(name=name) as cur:
+                    cur.itersize = REPORT_CURSOR_ITERSIZE
+                    yield cur
+            finally:
+                conn.rollback()
+                conn.autocommit = True
+
+    @contextmanager
+    def listen(self, channel: str = JOBS_NOTIFY_CHANNEL) -> Iterator[connection]:
+        """
+        Dedicated (not pooled) connection of the Retriever user listening on the channel.
+        The notifications can be waited for with select() on the connection, they are collected by conn.poll().
+        """
+        conn = self.__connect(user_type=DbUserType.Retriever)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(SQL("LISTEN {channel};").format(channel=Identifier(channel)))
+            yield conn
+        finally:
+            conn.close()
 
     def user_exists(self, username) -> bool:
-        cur = self.__connect(user_type=DbUserType.Connector)
         q_exists = SQL("SELECT 1 FROM pg_roles WHERE rolname=%s;")
-        cur.execute(q_exists, (username,))
-        match cur.fetchone():
+        with self.__cursor(user_type=DbUserType.Connector) as cur:
+            cur.execute(q_exists, (username,))
+            result = cur.fetchone()
+        match result:
             case None:
                 return False
             case (1,):
@@ -51,7 +382,8 @@ class DbConnector:
         query_create_db = SQL("""
         CREATE DATABASE {db_name};
         """).format(db_name=Identifier(self.config.db_name))
-        self.__connect(user_type=DbUserType.Connector, db_name=self.config.db_name_default).execute(query_create_db)
+        with self.__cursor(user_type=DbUserType.Connector, db_name=self.config.db_name_default) as cur:
+            cur.execute(query_create_db)
 
         query_init = SQL("""
         CREATE SCHEMA {db_name}
@@ -70,65 +402,104 @@ class DbConnector:
                 scheduled_interval INT DEFAULT 60
             )
             CREATE TABLE {db_name}.checks (
-                id SERIAL PRIMARY KEY,
+                id SERIAL,
                 job_id INT REFERENCES jobs(id),
                 start_ts TIMESTAMP NOT NULL,
                 end_ts TIMESTAMP NOT NULL,
-                status_code INT NOT NULL,
-                regex_result_id INT REFERENCES regex_raw(id)
-            )
+                status_code INT,
+                regex_result_id INT REFERENCES regex_raw(id),
+                PRIMARY KEY (id, start_ts)
+            ) PARTITION BY RANGE (start_ts)
             """).format(db_name=Identifier(self.config.db_name))
-        self.__connect(user_type=DbUserType.Connector).execute(query_init)
+        with self.__cursor(user_type=DbUserType.Connector) as cur:
+            cur.execute(query_init)
+
+        self.migrate_database()
+
+    def migrate_database(self):
+        """ Applies the schema migrations (with the admin user), used by the setup and the '--migrate' command. """
+        with self.__transaction(user_type=DbUserType.Connector) as cur:
+            for act_migration in MIGRATIONS:
+                cur.execute(SQL(act_migration).format(db_name=Identifier(self.config.db_name)))
+        self.maintain_check_partitions(user_type=DbUserType.Connector)
+
+    def maintain_check_partitions(self, user_type: DbUserType = DbUserType.Loader) -> Tuple[int, int]:
+        """
+        Creates the partitions of the checks table for the next partitions_ahead periods and, with retention_days set,
+        drops the partitions older than the retention (instead of deleting the rows one by one).
+        Returns the number of the created and the dropped partitions.
+        """
+        with self.__cursor(user_type=user_type) as cur:
+            cur.execute(SQL("SELECT {db_name}.create_checks_partitions(%s, %s);").format(
+                db_name=Identifier(self.config.db_name)
+            ), (self.config.db_partition_interval, self.config.db_partitions_ahead))
+            created = cur.fetchone()[0]
+            dropped = 0
+            if self.config.db_retention_days > 0:
+                cur.execute(SQL("SELECT {db_name}.drop_checks_partitions(make_interval(days => %s));").format(
+                    db_name=Identifier(self.config.db_name)
+                ), (self.config.db_retention_days,))
+                dropped = cur.fetchone()[0]
+                #The minute rollups follow the retention of the checks, the hourly ones are kept
+                cur.execute(SQL("DELETE FROM {db_name}.job_rollups_minute WHERE bucket_ts < localtimestamp - make_interval(days => %s);").format(
+                    db_name=Identifier(self.config.db_name)
+                ), (self.config.db_retention_days,))
+        if created or dropped:
+            Logger.info("Partitions of the checks table: %d created, %d dropped.", created, dropped)
+        return (created, dropped)
 
     def drop_database(self, schema_name: str):
         query_drop_schema = SQL("""
         DROP SCHEMA {schema_name} CASCADE;
         """).format(schema_name=Identifier(schema_name))
-        self.__connect(user_type=DbUserType.Connector).execute(query_drop_schema)
+        with self.__cursor(user_type=DbUserType.Connector) as cur:
+            cur.execute(query_drop_schema)
 
     def create_user(self, user_creds: DbCredentials):
         try:
             if not self.user_exists(user_creds.username):
-                cursor = self.__connect(user_type=DbUserType.Connector)
-
-                #Creating user
-                query_create_user = SQL("CREATE ROLE {username} LOGIN PASSWORD {password};").format(
-                    username=Identifier(user_creds.username),
-                    password=Literal(user_creds.password)
-                )
-                cursor.execute(query_create_user)
-
-                #Granting default access
-                query_grant_access = SQL("""
-                    GRANT CONNECT ON DATABASE {db_name} TO {username};
-                    GRANT USAGE ON SCHEMA {db_name} TO {username};
-                    GRANT USAGE, SELECT ON ALL SEQUENCES IN SCHEMA {db_name} TO {username};
-                """).format(
-                    db_name=Identifier(self.config.db_name),
-                    username=Identifier(user_creds.username)
-                )
-                cursor.execute(query_grant_access)
-
-                #Granting DQL or DML roles
-                query_grant_permissions = ""
-                match user_creds.type:
-                    case DbUserType.Loader:
-                        query_grant_permissions = SQL("""
-                            GRANT SELECT,INSERT,UPDATE,DELETE ON ALL TABLES IN SCHEMA {db_name} TO {username};
-                            """).format(
-                            db_name=Identifier(self.config.db_name),
-                            username=Identifier(user_creds.username)
-                        )
-                    case DbUserType.Retriever:
-                        query_grant_permissions = SQL("""
-                            GRANT SELECT ON {db_name}.checks TO {username};
-                            GRANT SELECT ON {db_name}.jobs TO {username};
-                            GRANT SELECT ON {db_name}.regex_raw TO {username};
-                            """).format(
-                            db_name=Identifier(self.config.db_name),
-                            username=Identifier(user_creds.username)
-                        )
-                cursor.execute(query_grant_permissions)
+                with self.__cursor(user_type=DbUserType.Connector) as cursor:
+                    #Creating user
+                    query_create_user = SQL("CREATE ROLE {username} LOGIN PASSWORD {password};").format(
+                        username=Identifier(user_creds.username),
+                        password=Literal(user_creds.password)
+                    )
+                    cursor.execute(query_create_user)
+
+                    #Granting default access
+                    query_grant_access = SQL("""
+                        GRANT CONNECT ON DATABASE {db_name} TO {username};
+                        GRANT USAGE ON SCHEMA {db_name} TO {username};
+                        GRANT USAGE, SELECT ON ALL SEQUENCES IN SCHEMA {db_name} TO {username};
+                    """).format(
+                        db_name=Identifier(self.config.db_name),
+                        username=Identifier(user_creds.username)
+                    )
+                    cursor.execute(query_grant_access)
+
+                    #Granting DQL or DML roles
+                    query_grant_permissions = ""
+                    match user_creds.type:
+                        case DbUserType.Loader:
+                            query_grant_permissions = SQL("""
+                                GRANT SELECT,INSERT,UPDATE,DELETE ON ALL TABLES IN SCHEMA {db_name} TO {username};
+                                GRANT EXECUTE ON FUNCTION {db_name}.create_checks_partitions(TEXT, INT), {db_name}.drop_checks_partitions(INTERVAL) TO {username};
+                                """).format(
+                                db_name=Identifier(self.config.db_name),
+                                username=Identifier(user_creds.username)
+                            )
+                        case DbUserType.Retriever:
+                            query_grant_permissions = SQL("""
+                                GRANT SELECT ON {db_name}.checks TO {username};
+                                GRANT SELECT ON {db_name}.jobs TO {username};
+                                GRANT SELECT ON {db_name}.regex_raw TO {username};
+                                GRANT SELECT ON {db_name}.job_rollups_minute, {db_name}.job_rollups_hour TO {username};
+                                GRANT SELECT ON {db_name}.job_stats_minute, {db_name}.job_stats_hour TO {username};
+                                """).format(
+                                db_name=Identifier(self.config.db_name),
+                                username=Identifier(user_creds.username)
+                            )
+                    cursor.execute(query_grant_permissions)
             else:
                 raise UserAlreadyExistsException(given_username=user_creds.username) 
         except Exception as e:
@@ -136,91 +507,329 @@ class DbConnector:
             print(e)
 
     def save_job_into_db(self, job:Job):
-        query_insert_job=SQL("""
-            INSERT INTO {db_name}.jobs(name,url,method,headers,body,scheduled_interval,expected_regex)
-            VALUES ({name}, {url}, {method}, {headers}, {body}, {scheduled_interval}, {expected_regex})
+        self.save_jobs_into_db([job])
+
+    def save_jobs_into_db(self, jobs: List[Job], page_size: int = 1000) -> UpsertReport:
+        """
+        Inserts the new jobs and updates the modified ones in one transaction (multi-row INSERT ... ON CONFLICT).
+        The rows with unchanged content are not rewritten, so they do not fire the notification trigger either.
+        If a job name appears more than once, the last one is saved.
+        """
+        jobs_by_name = {act_job.name: act_job for act_job in jobs}
+        if not jobs_by_name:
+            return UpsertReport()
+
+        query_upsert_jobs = SQL("""
+            INSERT INTO {db_name}.jobs AS act_job(name,url,method,headers,body,scheduled_interval,expected_regex,max_body_size,connect_timeout,read_timeout,conditional)
+            VALUES %s
             ON CONFLICT (name) DO
-            UPDATE SET url={url}, method={method}, body={body}, scheduled_interval={scheduled_interval}, expected_regex={expected_regex};
-        """).format(
-            db_name=Identifier(self.config.db_name),
-            name=Literal(job.name),
-            url=Literal(job.url),
-            method=Literal(job.method),
-            headers=Literal(str(job.headers)),
-            body=Literal(str(job.body)),
-            scheduled_interval=Literal(job.scheduled_interval),
-            expected_regex=Literal(job.expected_regex)
-        )
-        self.__connect(user_type=DbUserType.Loader).execute(query_insert_job)
+            UPDATE SET url=EXCLUDED.url, method=EXCLUDED.method, headers=EXCLUDED.headers, body=EXCLUDED.body,
+                scheduled_interval=EXCLUDED.scheduled_interval, expected_regex=EXCLUDED.expected_regex, max_body_size=EXCLUDED.max_body_size,
+                connect_timeout=EXCLUDED.connect_timeout, read_timeout=EXCLUDED.read_timeout, conditional=EXCLUDED.conditional
+            WHERE (act_job.url, act_job.method, act_job.headers, act_job.body, act_job.scheduled_interval, act_job.expected_regex, act_job.max_body_size,
+                    act_job.connect_timeout, act_job.read_timeout, act_job.conditional)
+                IS DISTINCT FROM (EXCLUDED.url, EXCLUDED.method, EXCLUDED.headers, EXCLUDED.body, EXCLUDED.scheduled_interval, EXCLUDED.expected_regex, EXCLUDED.max_body_size,
+                    EXCLUDED.connect_timeout, EXCLUDED.read_timeout, EXCLUDED.conditional)
+            RETURNING id, name, (xmax = 0) AS inserted;
+        """).format(db_name=Identifier(self.config.db_name))
+        values = [(
+            act_job.name,
+            act_job.url,
+            str(act_job.method),
+            json.dumps(act_job.headers),
+            json.dumps(act_job.body),
+            int(act_job.scheduled_interval),
+            act_job.expected_regex,
+            act_job.max_body_size,
+            act_job.connect_timeout,
+            act_job.read_timeout,
+            act_job.conditional
+        ) for act_job in jobs_by_name.values()]
+
+        report = UpsertReport()
+        job_ids = {}
+        with self.__transaction(user_type=DbUserType.Loader) as cur:
+            rows = execute_values(cur, query_upsert_jobs.as_string(cur), values, page_size=page_size, fetch=True)
+            for act_job_id, act_job_name, act_inserted in rows:
+                job_ids[act_job_name] = act_job_id
+                if act_inserted:
+                    report.inserted += 1
+                else:
+                    report.updated += 1
+            report.unchanged = len(values) - len(rows)
+
+            #The ids of the skipped rows are not returned, they are only queried if they are not cached yet
+            missing_job_names = [act_name for act_name in jobs_by_name if act_name not in job_ids and JobIdCache.get(act_name) is None]
+            if missing_job_names:
+                cur.execute(SQL("""
+                    SELECT name, id FROM {db_name}.jobs WHERE name = ANY(%s);
+                """).format(db_name=Identifier(self.config.db_name)), (missing_job_names,))
+                job_ids.update(cur.fetchall())
+        #Only the committed ids are cached
+        JobIdCache.set_many(job_ids)
+        return report
 
     def get_jobs_from_db(self) -> List[Job]:
         query_get_jobs=SQL("""
-            SELECT * FROM {db_name}.jobs;
+            SELECT id, name, url, method, headers, body, expected_regex, scheduled_interval, max_body_size, connect_timeout, read_timeout, conditional
+            FROM {db_name}.jobs;
         """).format(db_name=Identifier(self.config.db_name))
-        cur = self.__connect(user_type=DbUserType.Retriever)
-        cur.execute(query_get_jobs)
-        results = cur.fetchall()
+        with self.__cursor(user_type=DbUserType.Retriever) as cur:
+            cur.execute(query_get_jobs)
+            results = cur.fetchall()
+        JobIdCache.set_many({act_job[1]: act_job[0] for act_job in results})
+        #The stored jobs were validated before saving them
         jobs = []
         for act_job in results:
-            jobs.append(Job(
+            jobs.append(Job.trusted(
                 name = act_job[1],
                 url = act_job[2],
                 method = act_job[3],
                 headers=json.loads(act_job[4]),
                 body=json.loads(act_job[5]),
                 expected_regex=act_job[6],
-                scheduled_interval=act_job[7]
+                scheduled_interval=act_job[7],
+                max_body_size=act_job[8],
+                connect_timeout=act_job[9],
+                read_timeout=act_job[10],
+                conditional=act_job[11]
             ))
         return jobs
 
     def get_job_from_db(self, job_name: str) -> Tuple[int, Job]:
         query_get_jobs=SQL("""
-            SELECT * FROM {db_name}.jobs WHERE name={job_name};
+            SELECT id, name, url, method, headers, body, expected_regex, scheduled_interval, max_body_size, connect_timeout, read_timeout, conditional
+            FROM {db_name}.jobs WHERE name={job_name};
         """).format(
             db_name=Identifier(self.config.db_name),
             job_name=Literal(job_name)
         )
-        cur = self.__connect(user_type=DbUserType.Retriever)
-        cur.execute(query_get_jobs)
-        result = cur.fetchone()
-        job = Job(
+        with self.__cursor(user_type=DbUserType.Retriever) as cur:
+            cur.execute(query_get_jobs)
+            result = cur.fetchone()
+        job = Job.trusted(
             name=result[1],
             url=result[2],
             method=result[3],
             headers=json.loads(result[4]),
             body=json.loads(result[5]),
             expected_regex=result[6],
-            scheduled_interval=result[7]
+            scheduled_interval=result[7],
+            max_body_size=result[8],
+            connect_timeout=result[9],
+            read_timeout=result[10],
+            conditional=result[11]
         )
+        JobIdCache.set(result[1], result[0])
         return (result[0],job)
 
-    def save_check_into_db(self, check: Check):
-        job_id, job = self.get_job_from_db(job_name=check.job_name)
-
-        regex_id=None
-        if job.expected_regex and check.regex_result:
-            query_insert_regex_result=SQL("""
-            INSERT INTO {db_name}.regex_raw(raw_finding)
-            VALUES ({regex_result})
-            RETURNING id;
+    def get_job_id(self, job_name: str) -> int | None:
+        """ Returns the database id of the job, the jobs table is only queried if the id is not cached yet. """
+        job_id = JobIdCache.get(job_name)
+        if job_id is None:
+            query_get_job_id=SQL("""
+                SELECT id FROM {db_name}.jobs WHERE name={job_name};
             """).format(
                 db_name=Identifier(self.config.db_name),
-                regex_result=Literal(check.regex_result)
+                job_name=Literal(job_name)
             )
-            cur = self.__connect(user_type=DbUserType.Loader)
-            cur.execute(query_insert_regex_result)
-            regex_id = cur.fetchone()[0]
+            with self.__cursor(user_type=DbUserType.Retriever) as cur:
+                cur.execute(query_get_job_id)
+                result = cur.fetchone()
+            if result:
+                job_id = result[0]
+                JobIdCache.set(job_name, job_id)
+        return job_id
+
+    def save_check_into_db(self, check: Check):
+        self.save_checks_into_db([check])
+
+    def save_checks_into_db(self, checks: List[Check]) -> int:
+        """
+        Bulk version of save_check_into_db: the job ids and the regex findings of the batch are resolved
+        and the checks are loaded with COPY, all in one transaction.
+        Returns the number of the stored checks.
+        """
+        if not checks:
+            return 0
+
+        with self.__transaction(user_type=DbUserType.Loader) as cur:
+            job_ids = {act_check.job_name: JobIdCache.get(act_check.job_name) for act_check in checks}
+            missing_job_names = [act_job_name for act_job_name, act_job_id in job_ids.items() if act_job_id is None]
+            if missing_job_names:
+                cur.execute(SQL("""
+                    SELECT name, id FROM {db_name}.jobs WHERE name = ANY(%s);
+                """).format(db_name=Identifier(self.config.db_name)), (missing_job_names,))
+                found_job_ids = dict(cur.fetchall())
+                JobIdCache.set_many(found_job_ids)
+                job_ids.update(found_job_ids)
+
+            #The findings are stored once, keyed by their content hash
+            finding_hashes = {
+                act_check.regex_result: hashlib.sha256(act_check.regex_result.encode()).digest()
+                for act_check in checks if act_check.regex_result
+            }
+            finding_ids = {act_hash: FindingIdCache.get(act_hash) for act_hash in finding_hashes.values()}
+            new_finding_ids = self.__store_findings(cur, {
+                act_hash: act_finding for act_finding, act_hash in finding_hashes.items() if finding_ids[act_hash] is None
+            })
+            finding_ids.update(new_finding_ids)
+            regex_ids = {act_finding: finding_ids[act_hash] for act_finding, act_hash in finding_hashes.items()}
 
-        query_insert_check=SQL("""
-            INSERT INTO {db_name}.checks(job_id, start_ts, end_ts, status_code, regex_result_id)
-            VALUES ({job_id}, {start_ts}, {end_ts}, {status_code}, {regex_result_id});
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            stored = 0
+            for act_check in checks:
+                if job_ids[act_check.job_name] is None:
+                    Logger.error("Check of the unknown job '%s' is dropped.", act_check.job_name)
+                    continue
+                writer.writerow((
+                    job_ids[act_check.job_name],
+                    act_check.start_time.isoformat(),
+                    act_check.end_time.isoformat(),
+                    "" if act_check.status_code is None else int(act_check.status_code),
+                    regex_ids.get(act_check.regex_result, ""),
+                    *["" if act_timing is None else act_timing for act_timing in (
+                        act_check.dns_ms,
+                        act_check.connect_ms,
+                        act_check.tls_ms,
+                        act_check.ttfb_ms,
+                        act_check.transfer_ms,
+                        act_check.regex_ms,
+                        act_check.queue_ms
+                    )],
+                    act_check.timed_out,
+                    act_check.from_cache
+                ))
+                stored += 1
+            buffer.seek(0)
+
+            cur.copy_expert(SQL("""
+                COPY {db_name}.checks(job_id, start_ts, end_ts, status_code, regex_result_id,
+                    dns_ms, connect_ms, tls_ms, ttfb_ms, transfer_ms, regex_ms, queue_ms, timed_out, from_cache) FROM STDIN WITH (FORMAT csv);
+            """).format(db_name=Identifier(self.config.db_name)), buffer)
+
+            for act_resolution in ROLLUP_RESOLUTIONS:
+                self.__merge_rollups(cur, act_resolution, Rollup.aggregate(checks, job_ids, act_resolution))
+        #Only the committed ids are cached
+        FindingIdCache.set_many(new_finding_ids)
+        return stored
+
+    def __store_findings(self, cur: cursor, findings: Dict[bytes, str]) -> Dict[bytes, int]:
+        """ Returns the regex_raw ids of the findings (by content hash), only the new ones are inserted. """
+        if not findings:
+            return {}
+        rows = execute_values(
+            cur,
+            SQL("""
+                INSERT INTO {db_name}.regex_raw(raw_finding, content_hash) VALUES %s
+                ON CONFLICT (content_hash) DO NOTHING
+                RETURNING content_hash, id;
+            """).format(db_name=Identifier(self.config.db_name)).as_string(cur),
+            [(act_finding, act_hash) for act_hash, act_finding in findings.items()],
+            page_size=len(findings),
+            fetch=True
+        )
+        finding_ids = {bytes(act_hash): act_id for act_hash, act_id in rows}
+        #The findings already stored (ex. by an other process) are not returned by the insert
+        existing_hashes = [act_hash for act_hash in findings if act_hash not in finding_ids]
+        if existing_hashes:
+            cur.execute(SQL("""
+                SELECT content_hash, id FROM {db_name}.regex_raw WHERE content_hash = ANY(%s);
+            """).format(db_name=Identifier(self.config.db_name)), (existing_hashes,))
+            finding_ids.update({bytes(act_hash): act_id for act_hash, act_id in cur.fetchall()})
+        return finding_ids
+
+    def __merge_rollups(self, cur: cursor, resolution: str, rollups: Dict[Tuple[int, datetime], Rollup]):
+        """ Adds the rollups of the batch to the stored ones (in the transaction of the batch). """
+        if not rollups:
+            return
+        query_merge_rollups = SQL("""
+            INSERT INTO {table} AS act_rollup(job_id, bucket_ts, check_count, status_1xx, status_2xx, status_3xx, status_4xx, status_5xx,
+                regex_checks, regex_hits, latency_histogram, latency_sum_ms, latency_max_ms)
+            VALUES %s
+            ON CONFLICT (job_id, bucket_ts) DO
+            UPDATE SET check_count = act_rollup.check_count + EXCLUDED.check_count,
+                status_1xx = act_rollup.status_1xx + EXCLUDED.status_1xx,
+                status_2xx = act_rollup.status_2xx + EXCLUDED.status_2xx,
+                status_3xx = act_rollup.status_3xx + EXCLUDED.status_3xx,
+                status_4xx = act_rollup.status_4xx + EXCLUDED.status_4xx,
+                status_5xx = act_rollup.status_5xx + EXCLUDED.status_5xx,
+                regex_checks = act_rollup.regex_checks + EXCLUDED.regex_checks,
+                regex_hits = act_rollup.regex_hits + EXCLUDED.regex_hits,
+                latency_histogram = {db_name}.add_histograms(act_rollup.latency_histogram, EXCLUDED.latency_histogram),
+                latency_sum_ms = act_rollup.latency_sum_ms + EXCLUDED.latency_sum_ms,
+                latency_max_ms = greatest(act_rollup.latency_max_ms, EXCLUDED.latency_max_ms);
+        """).format(
+            table=Identifier(self.config.db_name, f"job_rollups_{resolution}"),
+            db_name=Identifier(self.config.db_name)
+        )
+        #The rows are locked in key order, so concurrent writers can not deadlock
+        values = [(
+            job_id,
+            bucket_ts,
+            act_rollup.check_count,
+            *act_rollup.status_classes,
+            act_rollup.regex_checks,
+            act_rollup.regex_hits,
+            act_rollup.latency_histogram,
+            act_rollup.latency_sum_ms,
+            act_rollup.latency_max_ms
+        ) for (job_id, bucket_ts), act_rollup in sorted(rollups.items())]
+        execute_values(
+            cur,
+            query_merge_rollups.as_string(cur),
+            values,
+            template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::INT[], %s, %s)",
+            page_size=len(values)
+        )
+
+    def iter_job_stats(self, since: datetime, resolution: str = "hour", job_name: str | None = None) -> Iterator[Tuple]:
+        """
+        Streams the statistics of the jobs from the rollups of the buckets starting at or after since:
+        (job name, checks, availability %, 4xx, 5xx, regex hit %, avg, p50, p95, p99, max latency ms).
+        The percentiles are estimated from the latency histograms (capped by the max latency).
+        """
+        if resolution not in ROLLUP_RESOLUTIONS:
+            raise NotImplementedError(resolution)
+        query_job_stats = SQL("""
+            SELECT jobs.name,
+                sum(rollups.check_count),
+                round(100 * sum(rollups.status_2xx + rollups.status_3xx)::NUMERIC / nullif(sum(rollups.check_count), 0), 2),
+                sum(rollups.status_4xx),
+                sum(rollups.status_5xx),
+                round(100 * sum(rollups.regex_hits)::NUMERIC / nullif(sum(rollups.regex_checks), 0), 2),
+                round((sum(rollups.latency_sum_ms) / nullif(sum(rollups.check_count), 0))::NUMERIC, 2),
+                round(least({db_name}.histogram_percentile({db_name}.sum_histograms(rollups.latency_histogram), 0.5), max(rollups.latency_max_ms))::NUMERIC, 2),
+                round(least({db_name}.histogram_percentile({db_name}.sum_histograms(rollups.latency_histogram), 0.95), max(rollups.latency_max_ms))::NUMERIC, 2),
+                round(least({db_name}.histogram_percentile({db_name}.sum_histograms(rollups.latency_histogram), 0.99), max(rollups.latency_max_ms))::NUMERIC, 2),
+                round(max(rollups.latency_max_ms)::NUMERIC, 2)
+            FROM {rollups} AS rollups JOIN {db_name}.jobs AS jobs ON jobs.id = rollups.job_id
+            WHERE rollups.bucket_ts >= %(since)s AND (%(job_name)s IS NULL OR jobs.name = %(job_name)s)
+            GROUP BY jobs.name
+            ORDER BY jobs.name;
         """).format(
             db_name=Identifier(self.config.db_name),
-            job_id=Literal(job_id),
-            start_ts=Literal(check.start_time),
-            end_ts=Literal(check.end_time),
-            status_code=Literal(int(check.status_code)),
-            regex_result_id=Literal(regex_id)
+            rollups=Identifier(self.config.db_name, f"job_rollups_{resolution}")
         )
-        cur = self.__connect(user_type=DbUserType.Loader)
-        cur.execute(query_insert_check)
+        with self.__server_cursor(user_type=DbUserType.Retriever, name="httpmonitor_job_stats") as cur:
+            cur.execute(query_job_stats, {"since": since, "job_name": job_name})
+            yield from cur
+
+    def iter_checks(self, since: datetime, until: datetime, job_name: str | None = None) -> Iterator[Tuple]:
+        """
+        Streams the raw checks started in [since, until) in storage order (only the partitions of the range are read):
+        (job name, start, end, status code, regex finding, dns, connect, tls, ttfb, transfer, regex, queue ms, timed out, from cache).
+        """
+        query_checks = SQL("""
+            SELECT jobs.name, checks.start_ts, checks.end_ts, checks.status_code, regex_raw.raw_finding,
+                checks.dns_ms, checks.connect_ms, checks.tls_ms, checks.ttfb_ms, checks.transfer_ms, checks.regex_ms,
+                checks.queue_ms, checks.timed_out, checks.from_cache
+            FROM {db_name}.checks AS checks
+                JOIN {db_name}.jobs AS jobs ON jobs.id = checks.job_id
+                LEFT JOIN {db_name}.regex_raw AS regex_raw ON regex_raw.id = checks.regex_result_id
+            WHERE checks.start_ts >= %(since)s AND checks.start_ts < %(until)s AND (%(job_name)s IS NULL OR jobs.name = %(job_name)s);
+        """).format(db_name=Identifier(self.config.db_name))
+        with self.__server_cursor(user_type=DbUserType.Retriever, name="httpmonitor_checks") as cur:
+            cur.execute(query_checks, {"since": since, "until": until, "job_name": job_name})
+            yield from cur
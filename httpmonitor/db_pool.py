@@ -0,0 +1,150 @@
+import atexit
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from psycopg2 import InterfaceError, OperationalError
+from psycopg2.extensions import connection, TRANSACTION_STATUS_IDLE
+from typing import Callable, Dict, List, Tuple
+
+from .enums import DbUserType
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections for one database user.
+    Idle connections are reused in LIFO order, the ones idle for longer than idle_timeout are closed,
+    and the ones idle for longer than health_check_interval are checked with a 'SELECT 1' before reuse.
+    """
+
+    max_size: int
+    idle_timeout: float
+    health_check_interval: float
+    size: int
+
+    def __init__(self, connect: Callable[[], connection], max_size: int, idle_timeout: float, health_check_interval: float):
+        self.connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.size = 0
+        self.idle: List[Tuple[connection, float]] = []
+        self.condition = threading.Condition()
+
+    def acquire(self) -> connection:
+        while True:
+            with self.condition:
+                self.__expire_idle()
+                while not self.idle and self.size >= self.max_size:
+                    self.condition.wait()
+                    self.__expire_idle()
+                if self.idle:
+                    conn, last_used = self.idle.pop()
+                else:
+                    self.size += 1
+                    conn = None
+
+            if conn is None:
+                try:
+                    return self.connect()
+                except Exception:
+                    with self.condition:
+                        self.size -= 1
+                        self.condition.notify()
+                    raise
+
+            if self.__is_healthy(conn, last_used):
+                return conn
+            with self.condition:
+                self.__close(conn)
+                self.condition.notify()
+
+    def release(self, conn: connection, discard: bool = False):
+        with self.condition:
+            if discard or conn.closed:
+                self.__close(conn)
+            else:
+                try:
+                    if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    self.idle.append((conn, time.monotonic()))
+                except (OperationalError, InterfaceError):
+                    self.__close(conn)
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except (OperationalError, InterfaceError):
+            self.release(conn, discard=True)
+            raise
+        except Exception:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        with self.condition:
+            while self.idle:
+                self.__close(self.idle.pop()[0])
+            self.condition.notify_all()
+
+    def __expire_idle(self):
+        now = time.monotonic()
+        # The oldest connections are at the beginning of the LIFO list
+        while self.idle and now - self.idle[0][1] > self.idle_timeout:
+            self.__close(self.idle.pop(0)[0])
+
+    def __is_healthy(self, conn: connection, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            return True
+        except (OperationalError, InterfaceError):
+            return False
+
+    def __close(self, conn: connection):
+        self.size -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class ConnectionPoolRegistry:
+    """ Process-wide registry of the connection pools, one pool for every database user and database. """
+
+    _pools: Dict[Tuple[DbUserType, str], ConnectionPool] = {}
+    _lock = threading.Lock()
+    _pid = os.getpid()
+
+    @staticmethod
+    def get_pool(user_type: DbUserType, db_name: str, factory: Callable[[], ConnectionPool]) -> ConnectionPool:
+        with ConnectionPoolRegistry._lock:
+            # Connections can not be shared with forked worker processes
+            if ConnectionPoolRegistry._pid != os.getpid():
+                ConnectionPoolRegistry._pools = {}
+                ConnectionPoolRegistry._pid = os.getpid()
+
+            key = (user_type, db_name)
+            if key not in ConnectionPoolRegistry._pools:
+                ConnectionPoolRegistry._pools[key] = factory()
+            return ConnectionPoolRegistry._pools[key]
+
+    @staticmethod
+    def close_all():
+        with ConnectionPoolRegistry._lock:
+            if ConnectionPoolRegistry._pid == os.getpid():
+                for act_pool in ConnectionPoolRegistry._pools.values():
+                    act_pool.close_all()
+            ConnectionPoolRegistry._pools = {}
+
+atexit.register(ConnectionPoolRegistry.close_all)
@@ -6,7 +6,7 @@ class BaseException(Exception):
 
     def __post_init__(self):
         from .logger import Logger
-        Logger.error(f"Exception: {self.message}")
+        Logger.error("Exception: %s", self.message)
 
     def __repr__(self):
         return self.message
@@ -68,3 +68,31 @@ class InvalidFilenameException(BaseException):
 class EmptyParameterException(BaseException):
     method_name: str = field()
     message: str = f"Empty parameter found in method '{method_name}'"
+
+@dataclass
+class InsecureCredentialFileException(BaseException):
+    path: str = field()
+    message: str = ""
+
+    def __post_init__(self):
+        self.message = f"Credential file '{self.path}' must not be accessible by other users (chmod 600)."
+        super().__post_init__()
+
+@dataclass
+class MissingCredentialFileException(BaseException):
+    path: str = field()
+    message: str = ""
+
+    def __post_init__(self):
+        self.message = f"Credential file '{self.path}' of the 'file' credential source does not exist (credential_file in the [keyring] config)."
+        super().__post_init__()
+
+@dataclass
+class InvalidRegexException(BaseException):
+    pattern: str = field()
+    error: str = field()
+    message: str = ""
+
+    def __post_init__(self):
+        self.message = f"Expected regex '{self.pattern}' is invalid: {self.error}"
+        super().__post_init__()
@@ -0,0 +1,38 @@
+import threading
+
+from collections import OrderedDict
+from typing import Dict
+
+
+class FindingIdCache:
+    """
+    Process-wide cache of the content hash -> regex_raw id mapping of the regex findings.
+    The jobs nearly always find the same text, so the repeated findings are resolved without a database round trip.
+    The least recently used entries are evicted above max_size.
+    """
+
+    max_size: int = 100000
+    _ids: "OrderedDict[bytes, int]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(content_hash: bytes) -> int | None:
+        with FindingIdCache._lock:
+            finding_id = FindingIdCache._ids.get(content_hash)
+            if finding_id is not None:
+                FindingIdCache._ids.move_to_end(content_hash)
+            return finding_id
+
+    @staticmethod
+    def set_many(finding_ids: Dict[bytes, int]):
+        with FindingIdCache._lock:
+            for act_hash, act_id in finding_ids.items():
+                FindingIdCache._ids[act_hash] = act_id
+                FindingIdCache._ids.move_to_end(act_hash)
+            while len(FindingIdCache._ids) > FindingIdCache.max_size:
+                FindingIdCache._ids.popitem(last=False)
+
+    @staticmethod
+    def clear():
+        with FindingIdCache._lock:
+            FindingIdCache._ids = OrderedDict()
@@ -0,0 +1,180 @@
+import heapq
+import itertools
+import threading
+import time
+import zlib
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+from .logger import Logger
+
+
+@dataclass(order=True)
+class ScheduledEntry:
+    due: float
+    seq: int
+    key: str = field(compare=False)
+    interval: float = field(compare=False)
+    callback: Callable[[], object] = field(compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+@dataclass
+class FiringLag:
+    """ Delay between the planned and the actual firing times (seconds). """
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    last: float = 0.0
+    skipped: int = 0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def record(self, lag: float):
+        self.count += 1
+        self.total += lag
+        self.last = lag
+        self.max = max(self.max, lag)
+
+
+class HeapScheduler:
+    """
+    Fires the registered callbacks periodically, the next firing times are kept in a min-heap.
+    Adding, removing and rescheduling an entry is O(log n) (removed entries are dropped lazily),
+    and the loop sleeps exactly until the next due entry instead of polling.
+    The first firing of every entry is shifted by a deterministic offset (derived from its key) within its interval,
+    so entries with the same interval do not fire at the same moment.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, lag_report_interval: float = 60):
+        self.clock = clock
+        self.lag_report_interval = lag_report_interval
+        self.heap: List[ScheduledEntry] = []
+        self.entries: Dict[str, ScheduledEntry] = {}
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.lag = FiringLag()
+        self.stopped = False
+        #Set when the entries change, so a change between computing the wait and waiting is not missed
+        self.changed = False
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def start_offset(key: str, interval: float) -> float:
+        """ Deterministic offset of the first firing, spread evenly in the [0, interval) range. """
+        interval_ms = max(int(interval * 1000), 1)
+        return (zlib.crc32(key.encode()) % interval_ms) / 1000
+
+    def add(self, key: str, interval: float, callback: Callable[[], object], offset: float | None = None) -> ScheduledEntry:
+        """ Registers (or replaces) the entry of the key, the first firing is after the offset. """
+        if offset is None:
+            offset = self.start_offset(key, interval)
+        with self.condition:
+            return self.__push(key, interval, callback, due=self.clock() + offset)
+
+    def remove(self, key: str):
+        with self.condition:
+            self.__cancel(key)
+            self.changed = True
+            self.condition.notify()
+
+    def reschedule(self, key: str, interval: float, callback: Callable[[], object] | None = None):
+        """ Changes the interval of an entry, the next firing stays in the same phase if it is still ahead. """
+        with self.condition:
+            entry = self.entries.get(key)
+            if not entry:
+                return
+            now = self.clock()
+            due = entry.due if entry.due - now <= interval else now + self.start_offset(key, interval)
+            self.__push(key, interval, callback or entry.callback, due=due)
+
+    def next_due(self, key: str) -> float | None:
+        entry = self.entries.get(key)
+        return entry.due if entry else None
+
+    def run_pending(self) -> float | None:
+        """ Fires the due entries. Returns the seconds until the next due entry (None if there is no entry). """
+        while True:
+            with self.condition:
+                self.__drop_cancelled()
+                #The wait is computed from the current entries, only the later changes have to wake the loop
+                self.changed = False
+                if not self.heap:
+                    return None
+                now = self.clock()
+                entry = self.heap[0]
+                if entry.due > now:
+                    return entry.due - now
+
+                self.lag.record(now - entry.due)
+                heapq.heappop(self.heap)
+                next_due = entry.due + entry.interval
+                # Missed periods are skipped instead of firing them in a burst
+                if next_due <= now:
+                    missed = int((now - next_due) // entry.interval) + 1
+                    self.lag.skipped += missed
+                    next_due += missed * entry.interval
+                entry.due = next_due
+                entry.seq = next(self.counter)
+                heapq.heappush(self.heap, entry)
+                callback = entry.callback
+
+            try:
+                callback()
+            except Exception as e:
+                Logger.error("Scheduled callback of '%s' failed: %s", entry.key, e)
+
+    def run(self):
+        """ Runs the scheduler loop until stop() is called. """
+        next_report = self.clock() + self.lag_report_interval
+        while True:
+            wait = self.run_pending()
+            if self.clock() >= next_report:
+                next_report = self.clock() + self.lag_report_interval
+                Logger.info("Scheduler firing lag: mean %.4fs, max %.4fs, %d firings, %d skipped periods",
+                            self.lag.mean, self.lag.max, self.lag.count, self.lag.skipped)
+            with self.condition:
+                if self.stopped:
+                    return
+                if self.changed:
+                    continue
+                self.condition.wait(timeout=wait if wait is None else min(wait, max(next_report - self.clock(), 0)))
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def __push(self, key: str, interval: float, callback: Callable[[], object], due: float) -> ScheduledEntry:
+        # Called with the condition held
+        self.__cancel(key)
+        entry = ScheduledEntry(
+            due=due,
+            seq=next(self.counter),
+            key=key,
+            interval=interval,
+            callback=callback
+        )
+        self.entries[key] = entry
+        heapq.heappush(self.heap, entry)
+        self.changed = True
+        self.condition.notify()
+        return entry
+
+    def __cancel(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry:
+            entry.cancelled = True
+
+    def __drop_cancelled(self):
+        # Rebuilding the heap if most of it is made of removed entries
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [act_entry for act_entry in self.heap if not act_entry.cancelled]
+            heapq.heapify(self.heap)
+        while self.heap and self.heap[0].cancelled:
+            heapq.heappop(self.heap)
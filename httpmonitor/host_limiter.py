@@ -0,0 +1,147 @@
+import asyncio
+import time
+
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict
+from urllib.parse import urlsplit
+
+from .const import HOST_LIMITER_PRUNE_INTERVAL
+
+
+@dataclass
+class HostLimiterStats:
+    #Number of the scans which had to wait for a host limit, and their waiting time (ms)
+    waited: int = 0
+    wait_ms_total: float = 0.0
+    wait_ms_max: float = 0.0
+    hosts: int = 0
+
+    @property
+    def wait_ms_avg(self) -> float:
+        return self.wait_ms_total / self.waited if self.waited else 0.0
+
+
+class HostGate:
+    """ Limits of one host: a semaphore of the concurrent requests and a token bucket of the request rate. """
+
+    max_concurrency: int
+    rate: float
+    burst: int
+
+    def __init__(self, max_concurrency: int, rate: float, burst: int):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        #The waiters of the lock are served in arrival order, so the token bucket is fair too
+        self.bucket_lock = asyncio.Lock()
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.users = 0
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    async def take_token(self):
+        async with self.bucket_lock:
+            now = time.monotonic()
+            self.refill(now)
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.refill(time.monotonic())
+            self.tokens -= 1
+
+    @property
+    def idle(self) -> bool:
+        """ Unused and its bucket is full, so it can be recreated without changing the limits. """
+        if self.users:
+            return False
+        if self.rate:
+            self.refill(time.monotonic())
+            return self.tokens >= self.burst
+        return True
+
+
+class HostLimiter:
+    """
+    Per-host limits of the scans of one ScanEngine loop: at most max_per_host requests in flight per host,
+    and at most rate requests per second per host (token bucket with burst tokens). 0 disables a limit.
+    The scans of a host wait in arrival order, the waiting times are collected in the stats.
+    The gates of the hosts not used for a while are dropped.
+    """
+
+    max_per_host: int
+    rate: float
+    burst: int
+
+    def __init__(self, max_per_host: int = 0, rate: float = 0, burst: int = 1):
+        self.max_per_host = max_per_host
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.gates: Dict[str, HostGate] = {}
+        self.next_prune = time.monotonic() + HOST_LIMITER_PRUNE_INTERVAL
+        self._stats = HostLimiterStats()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_per_host or self.rate)
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        split_url = urlsplit(url)
+        return (split_url.hostname or split_url.netloc).lower()
+
+    @asynccontextmanager
+    async def limit(self, url: str) -> AsyncIterator[float]:
+        """ Waits for the limits of the host of the url, yields the waiting time (seconds). """
+        if not self.enabled:
+            yield 0.0
+            return
+
+        gate = self.__get_gate(self.host_of(url))
+        gate.users += 1
+        try:
+            start = time.monotonic()
+            #The rate token is only taken with a free slot, so the request is sent right after it
+            if gate.semaphore:
+                await gate.semaphore.acquire()
+            try:
+                if self.rate:
+                    await gate.take_token()
+                waited = time.monotonic() - start
+                self.__record(waited)
+                yield waited
+            finally:
+                if gate.semaphore:
+                    gate.semaphore.release()
+        finally:
+            gate.users -= 1
+
+    def stats(self) -> HostLimiterStats:
+        return HostLimiterStats(
+            waited=self._stats.waited,
+            wait_ms_total=self._stats.wait_ms_total,
+            wait_ms_max=self._stats.wait_ms_max,
+            hosts=len(self.gates)
+        )
+
+    def __get_gate(self, host: str) -> HostGate:
+        now = time.monotonic()
+        if now >= self.next_prune:
+            self.next_prune = now + HOST_LIMITER_PRUNE_INTERVAL
+            for act_host in [act_host for act_host, act_gate in self.gates.items() if act_gate.idle]:
+                del self.gates[act_host]
+        gate = self.gates.get(host)
+        if gate is None:
+            gate = self.gates[host] = HostGate(max_concurrency=self.max_per_host, rate=self.rate, burst=self.burst)
+        return gate
+
+    def __record(self, waited: float):
+        #Waits shorter than a millisecond are not counted as waiting
+        if waited < 0.001:
+            return
+        self._stats.waited += 1
+        self._stats.wait_ms_total += waited * 1000
+        self._stats.wait_ms_max = max(self._stats.wait_ms_max, waited * 1000)
@@ -0,0 +1,115 @@
+import atexit
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from http.cookiejar import DefaultCookiePolicy
+from requests import Response, Session
+from typing import Tuple
+from urllib.parse import urlsplit
+
+from .config_handler import ConfigHandler
+from .http_timing import TimedHTTPAdapter
+
+
+@dataclass
+class HostSession:
+    session: Session
+    last_used: float
+
+
+class HttpClient:
+    """
+    Shared HTTP client of the scanners, it keeps one requests.Session (with its own connection pool) for every host.
+    The connections are kept alive between the checks, so the jobs hitting the same origin do not pay
+    for a new TCP connection and TLS handshake on every run.
+    The number of hosts is limited (the least recently used session is closed first),
+    and the sessions not used for idle_timeout seconds are closed.
+    Cookies are never stored, so the jobs targeting the same host do not affect each other.
+    """
+
+    pool_max_size: int
+    max_hosts: int
+    idle_timeout: float
+
+    _default = None
+    _lock = threading.Lock()
+    _pid = os.getpid()
+
+    def __init__(self, pool_max_size: int, max_hosts: int, idle_timeout: float):
+        self.pool_max_size = pool_max_size
+        self.max_hosts = max_hosts
+        self.idle_timeout = idle_timeout
+        self.sessions: OrderedDict[Tuple[str, str], HostSession] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def default() -> "HttpClient":
+        """ Process-wide client configured from the [http] section of the config. """
+        with HttpClient._lock:
+            # Sockets can not be shared with forked worker processes
+            if HttpClient._default is None or HttpClient._pid != os.getpid():
+                config_handler = ConfigHandler.shared()
+                HttpClient._default = HttpClient(
+                    pool_max_size=config_handler.http_pool_max_size,
+                    max_hosts=config_handler.http_max_hosts,
+                    idle_timeout=config_handler.http_idle_timeout
+                )
+                HttpClient._pid = os.getpid()
+            return HttpClient._default
+
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        return self.get_session(url).request(method=method, url=url, **kwargs)
+
+    def get_session(self, url: str) -> Session:
+        split_url = urlsplit(url)
+        key = (split_url.scheme.lower(), split_url.netloc.lower())
+        now = time.monotonic()
+        with self.lock:
+            self.__expire_idle(now)
+            host_session = self.sessions.get(key)
+            if host_session is None:
+                host_session = HostSession(session=self.__create_session(), last_used=now)
+                self.sessions[key] = host_session
+                while len(self.sessions) > self.max_hosts:
+                    _, evicted = self.sessions.popitem(last=False)
+                    evicted.session.close()
+            else:
+                host_session.last_used = now
+                self.sessions.move_to_end(key)
+            return host_session.session
+
+    def close_all(self):
+        with self.lock:
+            for act_host_session in self.sessions.values():
+                act_host_session.session.close()
+            self.sessions.clear()
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __create_session(self) -> Session:
+        session = Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=self.pool_max_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def __expire_idle(self, now: float):
+        # The sessions are ordered by their last use, the expired ones are at the front
+        while self.sessions:
+            key, host_session = next(iter(self.sessions.items()))
+            if now - host_session.last_used < self.idle_timeout:
+                break
+            del self.sessions[key]
+            host_session.session.close()
+
+
+def close_default_client():
+    if HttpClient._default is not None and HttpClient._pid == os.getpid():
+        HttpClient._default.close_all()
+
+atexit.register(close_default_client)
@@ -0,0 +1,123 @@
+import socket
+import threading
+import time
+
+from dataclasses import dataclass
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+try:
+    from urllib3.exceptions import NameResolutionError
+except ImportError:
+    #Older urllib3 versions report the failed lookups as NewConnectionError
+    NameResolutionError = None
+
+
+@dataclass
+class ConnectionTimings:
+    """ Durations (ms) of the phases of opening a new connection, None if the request reused a kept-alive one. """
+    dns_ms: float | None = None
+    connect_ms: float | None = None
+    tls_ms: float | None = None
+    #The socket the response is read from, so it can be aborted from an other thread
+    sock: socket.socket | None = None
+
+    @property
+    def total_ms(self) -> float:
+        return (self.dns_ms or 0.0) + (self.connect_ms or 0.0) + (self.tls_ms or 0.0)
+
+    def abort(self):
+        """ Shuts down the socket of the request, the blocked reads of the request thread return right away. """
+        if self.sock is None:
+            return
+        try:
+            #The plain socket shutdown, the one of SSLSocket would drop its TLS state under the reading thread
+            socket.socket.shutdown(self.sock, socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+#The requests run synchronously, so the connection opened for a request is recorded for its thread
+_thread_timings = threading.local()
+
+def reset_connection_timings():
+    _thread_timings.timings = ConnectionTimings()
+
+def get_connection_timings() -> ConnectionTimings:
+    if not hasattr(_thread_timings, "timings"):
+        reset_connection_timings()
+    return _thread_timings.timings
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """
+    Resolves the host before connecting, so the DNS lookup and the TCP connect are timed separately.
+    It relies on the private _dns_host of the urllib3 connection, without it the connection is opened by urllib3 (without phase timings).
+    """
+
+    def _new_conn(self) -> socket.socket:
+        dns_host = getattr(self, "_dns_host", None)
+        if dns_host is None:
+            return super()._new_conn()
+        timings = get_connection_timings()
+        start = time.monotonic()
+        try:
+            addresses = socket.getaddrinfo(dns_host.strip("[]"), self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            if NameResolutionError is None:
+                raise NewConnectionError(self, f"Failed to resolve '{self.host}' ({e})") from e
+            raise NameResolutionError(self.host, self, e) from e
+        resolved = time.monotonic()
+        timings.dns_ms = (resolved - start) * 1000
+
+        # Trying the resolved addresses in order, as urllib3 does
+        error = None
+        try:
+            for act_address in addresses:
+                self._dns_host = act_address[4][0]
+                try:
+                    sock = super()._new_conn()
+                    timings.connect_ms = (time.monotonic() - resolved) * 1000
+                    return sock
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    error = e
+            raise error if error else NewConnectionError(self, f"No address found for {self.host}")
+        finally:
+            self._dns_host = dns_host
+
+    def getresponse(self, *args, **kwargs):
+        #The socket is recorded before the connection drops it (ex. the response closes the connection)
+        get_connection_timings().sock = self.sock
+        return super().getresponse(*args, **kwargs)
+
+
+class TimedHTTPSConnection(TimedHTTPConnection, HTTPSConnection):
+    """ The TLS handshake is the part of the connect not spent on the DNS lookup and the TCP connect. """
+
+    def connect(self):
+        start = time.monotonic()
+        super().connect()
+        timings = get_connection_timings()
+        timings.tls_ms = max((time.monotonic() - start) * 1000 - (timings.dns_ms or 0.0) - (timings.connect_ms or 0.0), 0.0)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """ HTTPAdapter opening its connections with the timed connection classes. """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool
+        }
@@ -0,0 +1,37 @@
+import threading
+
+from typing import Dict
+
+
+class JobIdCache:
+    """
+    Process-wide cache of the job name -> database id mapping.
+    It is filled when the jobs are loaded or upserted, so the check uploads do not need to query the jobs table.
+    """
+
+    _ids: Dict[str, int] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(job_name: str) -> int | None:
+        return JobIdCache._ids.get(job_name)
+
+    @staticmethod
+    def set(job_name: str, job_id: int):
+        with JobIdCache._lock:
+            JobIdCache._ids[job_name] = job_id
+
+    @staticmethod
+    def set_many(job_ids: Dict[str, int]):
+        with JobIdCache._lock:
+            JobIdCache._ids.update(job_ids)
+
+    @staticmethod
+    def invalidate(job_name: str):
+        with JobIdCache._lock:
+            JobIdCache._ids.pop(job_name, None)
+
+    @staticmethod
+    def clear():
+        with JobIdCache._lock:
+            JobIdCache._ids = {}
@@ -1,25 +1,42 @@
 import json
 import os
+import zlib
 
+from dataclasses import dataclass, field
 from http import HTTPMethod
 from typing import List
 
 from .errors import InvalidFilenameException
 from .config_handler import ConfigHandler
 from .const import JOBS_PATH
-from .db_connector import DbConnector
+from .db_connector import DbConnector, UpsertReport
 from .logger import Logger
 from .models import Job
+from .regex_registry import RegexRegistry
+
+
+@dataclass
+class JobDiff:
+    """ Difference of two job sets (matched by name). """
+    added: List[Job] = field(default_factory=list)
+    changed: List[Job] = field(default_factory=list)
+    removed: List[Job] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.changed) + len(self.removed)
 
 
 class JobHandler:
 
     jobs_path: str
-    jobs: List[Job] = []
+    jobs: List[Job]
+    from_file: bool
     
     def __init__(self, jobs_path: str = JOBS_PATH, from_file: bool = False):
-        config_handler = ConfigHandler()
+        config_handler = ConfigHandler.shared()
         self.jobs_path = os.path.join(config_handler.working_dir,jobs_path)
+        self.from_file = from_file
+        self.jobs = []
 
         if from_file:
             if not os.path.exists(self.jobs_path):
@@ -43,20 +60,68 @@ class JobHandler:
                     headers=act_job_dict["headers"] if "headers" in act_job_dict else {},
                     body=act_job_dict["body"] if "url" in act_job_dict else {},
                     scheduled_interval=int(act_job_dict["scheduled_interval"] if "url" in act_job_dict else ""),
-                    expected_regex=str(act_job_dict["expected_regex"]) if "expected_regex" in act_job_dict else None
+                    expected_regex=str(act_job_dict["expected_regex"]) if "expected_regex" in act_job_dict else None,
+                    max_body_size=int(act_job_dict["max_body_size"]) if act_job_dict.get("max_body_size") else None,
+                    connect_timeout=float(act_job_dict["connect_timeout"]) if act_job_dict.get("connect_timeout") else None,
+                    read_timeout=float(act_job_dict["read_timeout"]) if act_job_dict.get("read_timeout") else None,
+                    conditional=bool(act_job_dict.get("conditional", False))
                 ))
         Logger.debug("Jobs read from file")
 
-    def save_to_database(self):
-        db_connector = DbConnector()
-        for act_job in self.jobs:
-            db_connector.save_job_into_db(act_job)
-        Logger.debug("Jobs saved to the database")
+    def save_to_database(self) -> UpsertReport:
+        report = DbConnector().save_jobs_into_db(self.jobs)
+        Logger.debug("Jobs saved to the database: %d inserted, %d updated, %d unchanged.", report.inserted, report.updated, report.unchanged)
+        return report
 
     def load_all_from_database(self):
         db_connector = DbConnector()
         self.jobs = db_connector.get_jobs_from_db()
 
+    @staticmethod
+    def diff_jobs(old_jobs: List[Job], new_jobs: List[Job]) -> JobDiff:
+        old_by_name = {act_job.name: act_job for act_job in old_jobs}
+        new_names = {act_job.name for act_job in new_jobs}
+        diff = JobDiff()
+        for act_job in new_jobs:
+            old_job = old_by_name.get(act_job.name)
+            if old_job is None:
+                diff.added.append(act_job)
+            elif old_job != act_job:
+                diff.changed.append(act_job)
+        diff.removed = [act_job for act_job in old_jobs if act_job.name not in new_names]
+        return diff
+
+    def reload(self) -> JobDiff:
+        """
+        Reads the jobs again from their source and returns the difference to the previous set.
+        The added and changed jobs of the file are saved to the database (removing a job from the file does not delete it).
+        """
+        old_jobs = self.jobs
+        if self.from_file:
+            self.jobs = []
+            try:
+                self.read_jobs_from_file()
+            except Exception:
+                #Keeping the running jobs if the file is invalid (ex. while it is edited)
+                self.jobs = old_jobs
+                raise
+        else:
+            self.load_all_from_database()
+
+        diff = self.diff_jobs(old_jobs, self.jobs)
+        RegexRegistry.retain(act_job.expected_regex for act_job in self.jobs if act_job.expected_regex)
+        if self.from_file and (diff.added or diff.changed):
+            DbConnector().save_jobs_into_db(diff.added + diff.changed)
+        return diff
+
+    @staticmethod
+    def shard_of(job_name: str, shard_count: int) -> int:
+        """ Stable shard index of the job (the same in every process and run). """
+        return zlib.crc32(job_name.encode()) % shard_count
+
+    def get_shard(self, shard_index: int, shard_count: int) -> List[Job]:
+        return [act_job for act_job in self.jobs if self.shard_of(act_job.name, shard_count) == shard_index]
+
     def get_by_name(self, job_name: str) -> Job | None:
         if len(self.jobs) == 0:
             self.read_jobs_from_file()
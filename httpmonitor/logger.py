@@ -1,17 +1,45 @@
+import atexit
+import json
 import logging
 import os
+import queue
+
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 from .config_handler import ConfigHandler
 
+class JsonLinesFormatter(logging.Formatter):
+    """ Formats the records as one JSON object per line. """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "process": record.processName,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
 class LoggerFactory:
     """
     [Source: https://medium.com/geekculture/create-a-reusable-logger-factory-for-python-projects-419ad408665d]
+    The records are only put on a queue by the logging threads (the scans are not blocked by the disk),
+    they are written to the outputs by the background thread of a QueueListener.
+    Messages should be logged with %-style arguments, so they are only formatted if the level is enabled.
+    The worker processes do not write the outputs themselves (the rotation of the files would race),
+    their records are sent to the queue of the parent process.
     """
 
+    _process_queue = None
+
     @staticmethod
-    def __create_logger(log_path, level, working_dir):
+    def __create_logger(log_path, level, working_dir, json_path, json_max_bytes, json_backup_count):
         format = "%(asctime)s|%(levelname)s|%(message)s"
-        formatter = logging.Formatter(format)
+        formatter = logging.Formatter(format, datefmt="%Y-%m-%d %H:%M:%S")
 
         full_log_path = os.path.join(working_dir, log_path)
         
@@ -21,7 +49,7 @@ class LoggerFactory:
         
         logging.basicConfig(level=logging.INFO, format=format, datefmt="%Y-%m-%d %H:%M:%S")
 
-        match level:
+        match level.upper():
             case "INFO":
                 LoggerFactory._logger.setLevel(logging.INFO)
             case "ERROR":
@@ -33,21 +61,67 @@ class LoggerFactory:
             case "CRITICAL":
                 LoggerFactory._logger.setLevel(logging.CRITICAL)
 
-
         file_handler = logging.FileHandler(full_log_path)
-        file_handler.setLevel(LoggerFactory._logger.level)
         file_handler.setFormatter(formatter)
-        LoggerFactory._logger.addHandler(file_handler)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        handlers = [file_handler, console_handler]
+
+        if json_path:
+            json_handler = RotatingFileHandler(
+                os.path.join(working_dir, json_path),
+                maxBytes=json_max_bytes,
+                backupCount=json_backup_count
+            )
+            json_handler.setFormatter(JsonLinesFormatter())
+            handlers.append(json_handler)
+
+        #The records are already filtered by the level of the logger, the console output is written by the listener as well
+        log_queue = queue.SimpleQueue()
+        LoggerFactory._queue_handler = QueueHandler(log_queue)
+        LoggerFactory._logger.addHandler(LoggerFactory._queue_handler)
+        LoggerFactory._logger.propagate = False
+        LoggerFactory._listener = QueueListener(log_queue, *handlers)
+        LoggerFactory._listener.start()
+        atexit.register(LoggerFactory._listener.stop)
 
         return LoggerFactory._logger
 
+    @staticmethod
+    def create_process_queue(context):
+        """ Queue of the records of the worker processes (of the multiprocessing context), they are put on the queue of this process. """
+        if LoggerFactory._process_queue is None:
+            LoggerFactory._process_queue = context.Queue()
+            process_listener = QueueListener(LoggerFactory._process_queue, LoggerFactory._queue_handler)
+            process_listener.start()
+            atexit.register(process_listener.stop)
+        return LoggerFactory._process_queue
+
+    @staticmethod
+    def forward_to(process_queue):
+        """ Called in a worker process: its records are sent to the parent process instead of its own outputs. """
+        atexit.unregister(LoggerFactory._listener.stop)
+        LoggerFactory._listener.stop()
+        for act_handler in LoggerFactory._listener.handlers:
+            act_handler.close()
+        LoggerFactory._logger.removeHandler(LoggerFactory._queue_handler)
+        LoggerFactory._queue_handler = QueueHandler(process_queue)
+        LoggerFactory._logger.addHandler(LoggerFactory._queue_handler)
+
     @staticmethod
     def get_logger():
-        config_handler = ConfigHandler()
+        config_handler = ConfigHandler.shared()
         log_path = config_handler.log_path
         level = config_handler.log_level
         working_dir = config_handler.working_dir
-        logger = LoggerFactory.__create_logger(log_path, level, working_dir)
+        logger = LoggerFactory.__create_logger(
+            log_path,
+            level,
+            working_dir,
+            config_handler.log_json_path,
+            config_handler.log_json_max_bytes,
+            config_handler.log_json_backup_count
+        )
         return logger
 
 Logger = LoggerFactory.get_logger()
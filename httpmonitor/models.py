@@ -1,19 +1,39 @@
-from dataclasses import dataclass
+from dataclasses import MISSING, Field, dataclass, fields
 from datetime import datetime
-from typing import Dict
+from functools import cache
+from typing import Dict, Tuple
 
 from .enums import DbUserType
 from .errors import ValidatorException
+from .regex_registry import RegexRegistry
 from .validators import CheckValidator, DbCredentialValidator, JobValidator, ConfigValidator
 
 
-@dataclass
+@cache
+def model_fields(model_type: type) -> Tuple[Field, ...]:
+    return fields(model_type)
+
+#The models are slotted (no per-object __dict__), the dict form is only built when to_dict() is called
+@dataclass(slots=True)
 class BaseModel:
     def to_dict(self) -> dict:
-        return self.__dict__
+        return {act_field.name: getattr(self, act_field.name) for act_field in model_fields(type(self))}
+
+    @classmethod
+    def trusted(cls, **values):
+        """ Creates the object from values built by the system itself (not by the user), without validating them again. """
+        obj = cls.__new__(cls)
+        for act_field in model_fields(cls):
+            if act_field.name in values:
+                setattr(obj, act_field.name, values[act_field.name])
+            elif act_field.default is not MISSING:
+                setattr(obj, act_field.name, act_field.default)
+            else:
+                raise TypeError(f"{cls.__name__}.trusted() missing argument: '{act_field.name}'")
+        return obj
 
 #Configuration models
-@dataclass
+@dataclass(slots=True)
 class DbCredentials(BaseModel):
     username: str
     password: str
@@ -34,7 +54,7 @@ class DbCredentials(BaseModel):
 
 
 #Database models
-@dataclass
+@dataclass(slots=True)
 class Job(BaseModel):
     name: str
     url: str
@@ -43,36 +63,101 @@ class Job(BaseModel):
     body: Dict
     expected_regex: str | None
     scheduled_interval: int
-    
+    #Maximum number of body bytes read for the regex search (None: unlimited)
+    max_body_size: int | None = None
+    #Connect and read timeouts of the requests (seconds, None: the [http] defaults)
+    connect_timeout: float | None = None
+    read_timeout: float | None = None
+    #Conditional requests (If-None-Match, If-Modified-Since), the regex result is reused if the content did not change
+    conditional: bool = False
+
     def __post_init__(self):
         validator = JobValidator(self)
         if not validator.validate():
             raise ValidatorException(model_type="Job", errors=",".join(validator.errors))
+        self.compile_regex()
+
+    @classmethod
+    def trusted(cls, **values) -> "Job":
+        #Zero-argument super() does not work in slotted dataclasses
+        job = super(Job, cls).trusted(**values)
+        job.compile_regex()
+        return job
+
+    def compile_regex(self):
+        #Compiling the pattern while loading the job, so invalid patterns are rejected before the scans
+        if self.expected_regex:
+            RegexRegistry.compile(self.expected_regex)
 
 
-@dataclass
+@dataclass(slots=True)
 class Check(BaseModel):
     job_name: str
     start_time: datetime
     end_time: datetime
-    status_code: int
+    #None if the check timed out before the response headers
+    status_code: int | None
     regex_result: str
+    #Durations of the phases of the check (ms): new connection (None if it was reused), waiting for and reading the response, regex search
+    dns_ms: float | None = None
+    connect_ms: float | None = None
+    tls_ms: float | None = None
+    ttfb_ms: float | None = None
+    transfer_ms: float | None = None
+    regex_ms: float | None = None
+    #Time waited for the concurrency and per-host limits before the request (ms)
+    queue_ms: float | None = None
+    #The request timed out or the check exceeded its deadline (the interval of the job)
+    timed_out: bool = False
+    #The server answered 304 Not Modified and the regex result of the previous full response was reused
+    from_cache: bool = False
     
     def __post_init__(self):
         validator = CheckValidator(self)
         if not validator.validate():
             raise ValidatorException(model_type="Check", errors=",".join(validator.errors))
 
-@dataclass
+@dataclass(slots=True)
 class AppConfig(BaseModel):
     general_working_dir: str
     database_db_url: str
     database_db_port: int | str
     database_db_name: str
     database_db_name_default: str
+    database_pool_max_size: int
+    database_pool_idle_timeout: int
+    database_pool_health_check_interval: int
+    database_partition_interval: str
+    database_partitions_ahead: int
+    database_retention_days: int
     keyring_service_name: str
+    keyring_credential_source: str
+    keyring_credential_file: str
+    keyring_cache_ttl: int
     log_out_path: str
     log_level: str
+    log_json_out_path: str
+    log_json_max_bytes: int
+    log_json_backup_count: int
+    scanner_max_concurrency: int
+    scanner_workers: int
+    scanner_max_per_host: int
+    scanner_host_rate: float
+    scanner_host_burst: int
+    scheduler_reload_interval: int
+    scheduler_reload_notify: bool
+    scheduler_overrun_policy: str
+    writer_batch_size: int
+    writer_flush_interval_ms: int
+    writer_queue_max_size: int
+    writer_spool_dir: str
+    writer_spool_segment_max_bytes: int
+    writer_spool_fsync_interval_ms: int
+    http_pool_max_size: int
+    http_max_hosts: int
+    http_idle_timeout: int
+    http_connect_timeout: float
+    http_read_timeout: float
 
     def __post_init__(self):
         validator = ConfigValidator(self)
@@ -0,0 +1,78 @@
+import re
+import threading
+
+from dataclasses import dataclass
+from typing import Dict, Iterable
+
+from .errors import InvalidRegexException
+
+
+@dataclass
+class RegexRegistryStats:
+    hits: int = 0
+    misses: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class RegexRegistry:
+    """
+    Process-wide registry of the compiled expected_regex patterns.
+    Every distinct pattern is compiled once (when the jobs are loaded) and shared by all jobs using it,
+    so the scans do not depend on the small internal cache of the re module.
+    The stats count the loaded jobs (a hit is a job sharing an already compiled pattern), the scans use get() which is not counted.
+    """
+
+    _patterns: Dict[str, re.Pattern] = {}
+    _stats = RegexRegistryStats()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def compile(pattern: str) -> re.Pattern:
+        """ Returns the compiled pattern, raises InvalidRegexException if it can not be compiled. """
+        with RegexRegistry._lock:
+            compiled = RegexRegistry._patterns.get(pattern)
+            if compiled is None:
+                try:
+                    compiled = re.compile(pattern)
+                except re.error as e:
+                    raise InvalidRegexException(pattern=pattern, error=str(e))
+                RegexRegistry._patterns[pattern] = compiled
+                RegexRegistry._stats.misses += 1
+                RegexRegistry._stats.size = len(RegexRegistry._patterns)
+            else:
+                RegexRegistry._stats.hits += 1
+        return compiled
+
+    @staticmethod
+    def get(pattern: str) -> re.Pattern:
+        """ Returns the compiled pattern for a scan without counting it, compiles it if it is not registered. """
+        compiled = RegexRegistry._patterns.get(pattern)
+        return compiled if compiled is not None else RegexRegistry.compile(pattern)
+
+    @staticmethod
+    def retain(patterns: Iterable[str]):
+        """ Drops the patterns not used by the (reloaded) jobs anymore. """
+        used = set(patterns)
+        with RegexRegistry._lock:
+            RegexRegistry._patterns = {act_pattern: compiled for act_pattern, compiled in RegexRegistry._patterns.items() if act_pattern in used}
+            RegexRegistry._stats.size = len(RegexRegistry._patterns)
+
+    @staticmethod
+    def stats() -> RegexRegistryStats:
+        with RegexRegistry._lock:
+            return RegexRegistryStats(
+                hits=RegexRegistry._stats.hits,
+                misses=RegexRegistry._stats.misses,
+                size=RegexRegistry._stats.size
+            )
+
+    @staticmethod
+    def clear():
+        with RegexRegistry._lock:
+            RegexRegistry._patterns = {}
+            RegexRegistry._stats = RegexRegistryStats()
@@ -0,0 +1,84 @@
+import csv
+import re
+import sys
+
+from datetime import datetime, timedelta
+from typing import Iterable, TextIO, Tuple
+
+from .db_connector import DbConnector
+from .rollups import Rollup
+
+#Columns of the outputs: (header, width in the table format)
+JOB_STATS_COLUMNS = (
+    ("job", 30), ("checks", 8), ("availability_%", 14), ("4xx", 6), ("5xx", 6), ("regex_hit_%", 11),
+    ("avg_ms", 10), ("p50_ms", 10), ("p95_ms", 10), ("p99_ms", 10), ("max_ms", 10)
+)
+CHECK_COLUMNS = (
+    ("job", 30), ("start_ts", 26), ("end_ts", 26), ("status_code", 11), ("regex_result", 30),
+    ("dns_ms", 8), ("connect_ms", 10), ("tls_ms", 8), ("ttfb_ms", 8), ("transfer_ms", 11), ("regex_ms", 8),
+    ("queue_ms", 8), ("timed_out", 9), ("from_cache", 10)
+)
+DURATION_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_duration(value: str) -> timedelta:
+    """ Parses durations like 30m, 24h, 7d or 2w. """
+    match = re.fullmatch(r"(\d+)([mhdw])", value.strip())
+    if not match:
+        raise ValueError(f"Invalid duration: '{value}' (expected ex. 30m, 24h, 7d, 2w)")
+    return timedelta(**{DURATION_UNITS[match.group(2)]: int(match.group(1))})
+
+def format_value(value) -> str:
+    match value:
+        case None:
+            return ""
+        case datetime():
+            return value.isoformat(sep=" ")
+        case _:
+            return str(value)
+
+def write_rows(rows: Iterable[Tuple], columns: Tuple[Tuple[str, int], ...], out: TextIO, output_format: str) -> int:
+    """ Writes the rows one by one (without collecting them), the table has fixed column widths. Returns the row count. """
+    count = 0
+    match output_format:
+        case "csv":
+            writer = csv.writer(out)
+            writer.writerow([act_header for act_header, _ in columns])
+            for act_row in rows:
+                writer.writerow([format_value(act_value) for act_value in act_row])
+                count += 1
+        case "table":
+            line = "  ".join(
+                f"{{:<{act_width}}}" if act_index == 0 else f"{{:>{act_width}}}"
+                for act_index, (_, act_width) in enumerate(columns)
+            )
+            out.write(line.format(*[act_header for act_header, _ in columns]) + "\n")
+            for act_row in rows:
+                out.write(line.format(*[format_value(act_value) for act_value in act_row]) + "\n")
+                count += 1
+        case _:
+            raise NotImplementedError(output_format)
+    return count
+
+def report(window: timedelta, job_name: str | None = None, resolution: str = "hour", output_format: str = "table",
+           raw_checks: bool = False, output_path: str | None = None):
+    """
+    Prints the uptime and latency statistics of the jobs over the last window (read from the rollups,
+    aggregated by the database), or with raw_checks exports the checks of the window.
+    The statistics window is extended to the beginning of its first rollup bucket (minute or hour).
+    """
+    db_connector = DbConnector()
+    now = datetime.now()
+    if raw_checks:
+        rows = db_connector.iter_checks(since=now - window, until=now, job_name=job_name)
+        columns = CHECK_COLUMNS
+    else:
+        rows = db_connector.iter_job_stats(since=Rollup.truncate(now - window, resolution), resolution=resolution, job_name=job_name)
+        columns = JOB_STATS_COLUMNS
+
+    if output_path:
+        with open(output_path, "w", newline="") as out:
+            count = write_rows(rows, columns, out, output_format)
+        print(f"{count} rows written to {output_path}")
+    else:
+        write_rows(rows, columns, sys.stdout, output_format)
@@ -0,0 +1,57 @@
+import threading
+
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .models import Job
+
+
+@dataclass(slots=True)
+class CachedResponse:
+    #The job the response was received for, the entry is not used after the job changed
+    job: Job
+    etag: str | None
+    last_modified: str | None
+    regex_result: str
+
+
+class ResponseCache:
+    """
+    Process-wide cache of the validators (ETag, Last-Modified) and the regex result of the last full response of the
+    jobs with conditional requests, by job name. If the server answers 304 Not Modified, the cached regex result is reused.
+    The least recently used entries are evicted above max_size.
+    """
+
+    max_size: int = 100000
+    _entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(job: Job) -> CachedResponse | None:
+        with ResponseCache._lock:
+            entry = ResponseCache._entries.get(job.name)
+            if entry is None:
+                return None
+            if entry.job != job:
+                del ResponseCache._entries[job.name]
+                return None
+            ResponseCache._entries.move_to_end(job.name)
+            return entry
+
+    @staticmethod
+    def set(entry: CachedResponse):
+        with ResponseCache._lock:
+            ResponseCache._entries[entry.job.name] = entry
+            ResponseCache._entries.move_to_end(entry.job.name)
+            while len(ResponseCache._entries) > ResponseCache.max_size:
+                ResponseCache._entries.popitem(last=False)
+
+    @staticmethod
+    def remove(job_name: str):
+        with ResponseCache._lock:
+            ResponseCache._entries.pop(job_name, None)
+
+    @staticmethod
+    def clear():
+        with ResponseCache._lock:
+            ResponseCache._entries = OrderedDict()
@@ -0,0 +1,91 @@
+import math
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from .const import LATENCY_HISTOGRAM_RESOLUTION, ROLLUP_RESOLUTIONS
+from .models import Check
+
+
+@dataclass
+class Rollup:
+    """
+    Aggregate of the checks of one job in one time bucket (minute or hour).
+    The rollups of the same bucket can be added up, so a batch of checks is merged into the stored rollup
+    instead of recomputing it from the raw checks. The latency is kept in a histogram with logarithmic buckets
+    (LATENCY_HISTOGRAM_RESOLUTION per doubling of the latency), the percentiles are computed from it.
+    """
+    check_count: int = 0
+    #Number of the 1xx, 2xx, 3xx, 4xx and 5xx responses
+    status_classes: List[int] = field(default_factory=lambda: [0] * 5)
+    #Checks of jobs with expected regex, and the ones with finding
+    regex_checks: int = 0
+    regex_hits: int = 0
+    latency_histogram: List[int] = field(default_factory=list)
+    latency_sum_ms: float = 0.0
+    latency_max_ms: float = 0.0
+
+    @staticmethod
+    def latency_bucket(latency_ms: float) -> int:
+        """ Index of the histogram bucket of the latency, the bucket i holds [2^(i/R), 2^((i+1)/R)) ms. """
+        if latency_ms < 1:
+            return 0
+        return int(math.log2(latency_ms) * LATENCY_HISTOGRAM_RESOLUTION)
+
+    @staticmethod
+    def truncate(timestamp: datetime, resolution: str) -> datetime:
+        match resolution:
+            case "minute":
+                return timestamp.replace(second=0, microsecond=0)
+            case "hour":
+                return timestamp.replace(minute=0, second=0, microsecond=0)
+            case _:
+                raise NotImplementedError(resolution)
+
+    @staticmethod
+    def aggregate(checks: Iterable[Check], job_ids: Dict[str, int], resolution: str) -> Dict[Tuple[int, datetime], "Rollup"]:
+        """ Rollups of the checks by (job id, bucket start), the checks of unknown jobs are skipped. """
+        if resolution not in ROLLUP_RESOLUTIONS:
+            raise NotImplementedError(resolution)
+        rollups: Dict[Tuple[int, datetime], Rollup] = {}
+        for act_check in checks:
+            job_id = job_ids.get(act_check.job_name)
+            if job_id is None:
+                continue
+            key = (job_id, Rollup.truncate(act_check.start_time, resolution))
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = Rollup()
+            rollup.add(act_check)
+        return rollups
+
+    def add(self, check: Check):
+        self.check_count += 1
+        #The checks timed out before the response count as unavailable
+        status_class = int(check.status_code) // 100 if check.status_code is not None else 0
+        if 1 <= status_class <= 5:
+            self.status_classes[status_class - 1] += 1
+        #The regex timing is only measured for the jobs with expected regex
+        if check.regex_ms is not None:
+            self.regex_checks += 1
+            if check.regex_result:
+                self.regex_hits += 1
+
+        latency_ms = max((check.end_time - check.start_time).total_seconds() * 1000, 0.0)
+        bucket = self.latency_bucket(latency_ms)
+        if bucket >= len(self.latency_histogram):
+            self.latency_histogram.extend([0] * (bucket + 1 - len(self.latency_histogram)))
+        self.latency_histogram[bucket] += 1
+        self.latency_sum_ms += latency_ms
+        self.latency_max_ms = max(self.latency_max_ms, latency_ms)
+
+    def percentile(self, percentile: float) -> float | None:
+        """ Latency percentile (0-1) estimated from the histogram, the same as the histogram_percentile() SQL function. """
+        if not self.check_count:
+            return None
+        cumulative = 0
+        for act_bucket, act_count in enumerate(self.latency_histogram):
+            cumulative += act_count
+            if cumulative >= percentile * self.check_count:
+                return 2 ** ((act_bucket + 0.5) / LATENCY_HISTOGRAM_RESOLUTION)
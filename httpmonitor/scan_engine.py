@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.queues import Queue
+from typing import Dict, List
+
+from .check_writer import CheckWriter
+from .const import DEFAULT_SCHEDULER_OVERRUN_POLICY, SCAN_ENGINE_STATS_INTERVAL
+from .db_connector import DbConnector
+from .host_limiter import HostLimiter
+from .logger import Logger
+from .models import Check, Job
+from .scanner import HTTPScanner
+
+
+class ScanEngine:
+    """
+    Runs the HTTPScanner checks as coroutines on a dedicated asyncio event loop.
+    The number of scans in flight is limited by a global semaphore (max_concurrency),
+    the blocking HTTP calls are executed on a thread pool with the same size,
+    so one slow site does not delay the other jobs.
+    The scans of the same host are also limited by the host limiter (concurrency and rate per host),
+    a scan waits for its host before taking a global slot, so a throttled host does not hold up the others.
+    The overrun policy decides what happens with a submitted job whose previous run is still waiting or running:
+    skip drops the new run, coalesce runs it once after the previous one (the overruns meanwhile are merged), overlap runs both.
+    The finished checks are passed to the check writer (or to the result queue of the worker process).
+    The counters are logged every stats_interval seconds and when the engine stops.
+    """
+
+    max_concurrency: int
+    upload: bool
+    db_connector: DbConnector | None
+    check_writer: CheckWriter | Queue | None
+    overrun_policy: str
+    stats_interval: float
+    in_flight: int
+    pending: int
+    skipped: int
+    coalesced: int
+
+    def __init__(self, max_concurrency: int, upload: bool = True, check_writer: CheckWriter | Queue | None = None,
+                 max_per_host: int = 0, host_rate: float = 0, host_burst: int = 1, overrun_policy: str = DEFAULT_SCHEDULER_OVERRUN_POLICY,
+                 stats_interval: float = SCAN_ENGINE_STATS_INTERVAL):
+        self.max_concurrency = max_concurrency
+        self.upload = upload
+        #Shared by all scans, the connections are pooled by the connector
+        self.db_connector = DbConnector() if upload else None
+        self.check_writer = check_writer
+        self.overrun_policy = overrun_policy
+        self.stats_interval = stats_interval
+        self.in_flight = 0
+        self.pending = 0
+        self.skipped = 0
+        self.coalesced = 0
+        #Jobs submitted and not finished yet (by name), with the job of the coalesced next run
+        self.active_jobs: Dict[str, Job | None] = {}
+
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="httpmonitor_scan")
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.host_limiter = HostLimiter(max_per_host=max_per_host, rate=host_rate, burst=host_burst)
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.__run_loop, name="httpmonitor_scan_engine", daemon=True)
+        self.thread.start()
+        self.loop.call_soon_threadsafe(self.loop.call_later, self.stats_interval, self.__log_stats_periodically)
+
+    def stop(self):
+        if self.thread and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.log_stats()
+
+    def log_stats(self):
+        Logger.info("Scan engine: %d scans in flight, %d waiting, %d skipped and %d coalesced overruns.",
+                    self.in_flight, self.pending, self.skipped, self.coalesced)
+        if self.host_limiter.enabled:
+            stats = self.host_limiter.stats()
+            Logger.info("%d scans waited for the host limits (avg: %.1f ms, max: %.1f ms).", stats.waited, stats.wait_ms_avg, stats.wait_ms_max)
+
+    def __log_stats_periodically(self):
+        self.log_stats()
+        self.loop.call_later(self.stats_interval, self.__log_stats_periodically)
+
+    def __run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def scan(self, job: Job) -> Check:
+        queued_at = time.monotonic()
+        #The scan waits for the limits until it gets a slot, it is not pending anymore if it is cancelled meanwhile
+        self.pending += 1
+        waiting = True
+        try:
+            async with self.host_limiter.limit(job.url) as host_wait:
+                if host_wait >= 0.001:
+                    Logger.debug("Job '%s' waited %.1f ms for the limits of its host.", job.name, host_wait * 1000)
+                async with self.semaphore:
+                    self.pending -= 1
+                    waiting = False
+                    self.in_flight += 1
+                    try:
+                        scanner = HTTPScanner(job=job, db_connector=self.db_connector, check_writer=self.check_writer,
+                                              queue_time=time.monotonic() - queued_at)
+                        await asyncio.get_running_loop().run_in_executor(self.executor, scanner.run, self.upload)
+                        return scanner.check
+                    finally:
+                        self.in_flight -= 1
+        finally:
+            if waiting:
+                self.pending -= 1
+
+    async def scan_all(self, jobs: List[Job]) -> List[Check]:
+        return await asyncio.gather(*[self.scan(act_job) for act_job in jobs])
+
+    async def run_job(self, job: Job) -> Check | None:
+        """ Scans the job following the overrun policy, returns None if the run was skipped or coalesced. """
+        if self.overrun_policy == "overlap":
+            return await self.scan(job)
+        if job.name in self.active_jobs:
+            match self.overrun_policy:
+                case "skip":
+                    self.skipped += 1
+                    Logger.warning("Job '%s' is skipped, its previous run is still going.", job.name)
+                case "coalesce":
+                    self.coalesced += 1
+                    self.active_jobs[job.name] = job
+                    Logger.warning("Job '%s' runs again after its previous run, which is still going.", job.name)
+                case _:
+                    raise NotImplementedError(self.overrun_policy)
+            return None
+
+        self.active_jobs[job.name] = None
+        try:
+            check = await self.scan(job)
+            while (next_job := self.active_jobs[job.name]) is not None:
+                self.active_jobs[job.name] = None
+                check = await self.scan(next_job)
+            return check
+        finally:
+            del self.active_jobs[job.name]
+
+    def submit(self, job: Job) -> Future:
+        """ Schedules the scan of the job on the engine loop without waiting for the result. """
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(self.run_job(job), self.loop)
+        future.add_done_callback(lambda done: self.__log_failure(job, done))
+        return future
+
+    @staticmethod
+    def __log_failure(job: Job, future: Future):
+        if not future.cancelled() and future.exception():
+            Logger.error("Job '%s' failed: %s", job.name, future.exception())
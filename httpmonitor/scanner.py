@@ -1,61 +1,330 @@
+import codecs
 import re
 import requests
+import threading
+import time
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from multiprocessing.queues import Queue
+from typing import Dict, Iterator, Tuple
+from urllib3.exceptions import ReadTimeoutError
 
+from .check_writer import CheckWriter
+from .config_handler import ConfigHandler
+from .const import REGEX_STREAM_OVERLAP, STREAM_CHUNK_SIZE
 from .db_connector import DbConnector
+from .http_client import HttpClient
+from .http_timing import ConnectionTimings, get_connection_timings, reset_connection_timings
 from .logger import Logger
 from .models import Job, Check
+from .regex_registry import RegexRegistry
+from .response_cache import CachedResponse, ResponseCache
+
+class StreamingRegexMatcher:
+    """
+    Searches a pattern in a text received in chunks.
+    The last 'overlap' characters of the searched text are kept and searched again with the next chunk,
+    so the matches crossing a chunk boundary are found (if they are not longer than the overlap).
+    A match is only accepted when at least 'overlap' characters follow it (the next chunks can not extend or replace it)
+    or when it is longer than the overlap, otherwise it is searched again from its start with the next chunk.
+    Another 'overlap' characters before the searched part are kept as context and skipped by the search position,
+    so the anchors, the word boundaries and the lookbehinds see the real preceding text instead of the start of the kept window.
+    """
+
+    pattern: re.Pattern
+    overlap: int
+
+    def __init__(self, pattern: re.Pattern, overlap: int = REGEX_STREAM_OVERLAP):
+        self.pattern = pattern
+        self.overlap = overlap
+        self.window = ""
+        #The matches are searched from this index of the window, the text before it is context only
+        self.pos = 0
+
+    def feed(self, text: str) -> re.Match | None:
+        self.window += text
+        match = self.pattern.search(self.window, self.pos)
+        if match:
+            if len(self.window) - match.end() >= self.overlap or match.end() - match.start() > self.overlap:
+                return match
+            # The match might continue in the next chunk (ex. a greedy or bounded repetition)
+            search_start = match.start()
+        else:
+            search_start = max(len(self.window) - self.overlap, self.pos)
+        cut = max(search_start - self.overlap, 0)
+        self.window = self.window[cut:]
+        self.pos = search_start - cut
+        return None
+
+    def finish(self) -> re.Match | None:
+        return self.pattern.search(self.window, self.pos)
+
 
 class HTTPScanner:
     job: Job
     check: Check
-    response: requests.Response
+    response: requests.Response | None
+    #Validators and regex result of the last full response (only for the jobs with conditional requests)
+    cached_response: CachedResponse | None
+    db_connector: DbConnector | None
+    check_writer: CheckWriter | Queue | None
+    http_client: HttpClient
+    #Monotonic clock readings of the scan and the time spent on reading the body and on the regex search
+    started_at: float
+    queue_time: float
+    #Monotonic clock reading of the submission of the scan, the deadline is counted from here
+    submitted_at: float
+    deadline_exceeded: bool
+    transfer_time: float
+    regex_time: float
 
-    def __init__(self, job: Job):
+    def __init__(self, job: Job, db_connector: DbConnector | None = None, check_writer: CheckWriter | Queue | None = None,
+                 http_client: HttpClient | None = None, queue_time: float = 0.0):
         self.job = job
+        self.db_connector = db_connector
+        self.check_writer = check_writer
+        #The connections are kept alive between the checks by the shared client
+        self.http_client = http_client or HttpClient.default()
+        #Time spent waiting for the concurrency and host limits before the scan (seconds)
+        self.queue_time = queue_time
+        self.submitted_at = time.monotonic() - queue_time
+        self.cached_response = None
+        self.transfer_time = 0.0
+        self.regex_time = 0.0
+        self.deadline_exceeded = False
+        self.watchdog: threading.Timer | None = None
+        self.watchdog_lock = threading.Lock()
+        self.request_timings: ConnectionTimings | None = None
+
+    def remaining_time(self) -> float:
+        """ Seconds left of the deadline, counted from the submission (the waiting for the limits included). """
+        return self.deadline - (time.monotonic() - self.submitted_at)
 
     def run(self, upload=True):
-        self.scan_site()
-        Logger.info(f"Job {self.job.name} started with params: {self.job.to_dict()}")
-        
-        if self.job.expected_regex:
-            self.check_regex()
+        try:
+            self.scan_site()
+            Logger.info("Job %s started with params: %s", self.job.name, self.job)
+
+            if self.response is not None:
+                try:
+                    if self.response.status_code == 304 and self.cached_response:
+                        self.use_cached_response()
+                    elif self.job.expected_regex:
+                        self.check_regex()
+                    else:
+                        self.discard_body()
+                except Exception as e:
+                    #The read timeouts of the body are raised as connection errors by requests
+                    read_timeout = isinstance(e, requests.exceptions.ConnectionError) and isinstance(e.args[0] if e.args else None, ReadTimeoutError)
+                    if not (read_timeout or self.deadline_exceeded):
+                        raise
+                    self.check.timed_out = True
+                    Logger.warning("Reading the response of job '%s' timed out.", self.job.name)
+        finally:
+            self.stop_watchdog()
+        if self.deadline_exceeded:
+            self.check.timed_out = True
+        if self.response is not None:
+            self.cache_response()
+        self.finish_timings()
 
         if upload:
             self.send_check_for_upload()
-            Logger.info(f"Job '{self.job.name}' finished with response: {self.check.to_dict()}")
+            Logger.info("Job '%s' finished with response: %s", self.job.name, self.check)
+
+    @property
+    def deadline(self) -> float:
+        """ The check must finish within the interval of the job (seconds), so it does not overlap with its next run. """
+        return float(self.job.scheduled_interval)
+
+    def get_timeouts(self) -> Tuple[float, float]:
+        """ Connect and read timeouts of the request: the ones of the job or the [http] defaults, at most the remaining time. """
+        config_handler = ConfigHandler.shared()
+        connect_timeout = self.job.connect_timeout or config_handler.http_connect_timeout
+        read_timeout = self.job.read_timeout or config_handler.http_read_timeout
+        remaining = self.remaining_time()
+        return (min(connect_timeout, remaining), min(read_timeout, remaining))
+
+    def start_watchdog(self):
+        """
+        The timeouts only bound the single socket operations, the watchdog aborts the connection of the request
+        when the deadline passes (ex. a server sending the response byte by byte).
+        """
+        self.request_timings = get_connection_timings()
+        self.watchdog = threading.Timer(max(self.remaining_time(), 0.0), self.expire)
+        self.watchdog.daemon = True
+        self.watchdog.start()
+
+    def expire(self):
+        with self.watchdog_lock:
+            #The connection is returned to the pool after the scan, it must not be aborted then
+            if self.watchdog is None:
+                return
+            self.deadline_exceeded = True
+            self.request_timings.abort()
+        Logger.warning("Job '%s' exceeded its deadline of %.0f seconds, its connection is aborted.", self.job.name, self.deadline)
+
+    def stop_watchdog(self):
+        with self.watchdog_lock:
+            if self.watchdog:
+                self.watchdog.cancel()
+                self.watchdog = None
+
+    def get_request_headers(self) -> Dict:
+        """ The headers of the job, with the validators of the cached response for a conditional request. """
+        if not self.cached_response:
+            return self.job.headers
+        headers = dict(self.job.headers)
+        if self.cached_response.etag:
+            headers["If-None-Match"] = self.cached_response.etag
+        if self.cached_response.last_modified:
+            headers["If-Modified-Since"] = self.cached_response.last_modified
+        return headers
 
     def scan_site(self):
+        """
+        Sends the request, the check is created when the response headers are received.
+        If the request times out, the check is created without status code and marked as timed out.
+        """
+        if self.job.conditional:
+            self.cached_response = ResponseCache.get(self.job)
         start_time = datetime.now()
-        response = requests.request(
-            method=str(self.job.method),
-            headers=self.job.headers,
-            url=self.job.url,
-            data=self.job.body
-        )
+        reset_connection_timings()
+        self.started_at = time.monotonic()
+        response = None
+        if self.remaining_time() <= 0:
+            Logger.warning("Job '%s' waited for its turn beyond its deadline, it is not sent.", self.job.name)
+        else:
+            self.start_watchdog()
+            try:
+                response = self.http_client.request(
+                    method=str(self.job.method),
+                    headers=self.get_request_headers(),
+                    url=self.job.url,
+                    data=self.job.body,
+                    stream=True,
+                    timeout=self.get_timeouts()
+                )
+            except requests.exceptions.RequestException as e:
+                if not (isinstance(e, requests.exceptions.Timeout) or self.deadline_exceeded):
+                    raise
+                Logger.warning("Request of job '%s' timed out: %s", self.job.name, e)
+
+        headers_received = time.monotonic() - self.started_at
 
         self.response = response
 
-        self.check = Check(
+        connection_timings = get_connection_timings()
+        self.check = Check.trusted(
             job_name=self.job.name,
             start_time=start_time,
-            end_time=start_time+response.elapsed,
-            status_code=response.status_code,
-            regex_result=""
+            end_time=start_time+timedelta(seconds=headers_received),
+            status_code=response.status_code if response is not None else None,
+            regex_result="",
+            dns_ms=connection_timings.dns_ms,
+            connect_ms=connection_timings.connect_ms,
+            tls_ms=connection_timings.tls_ms,
+            ttfb_ms=max(headers_received * 1000 - connection_timings.total_ms, 0.0),
+            queue_ms=self.queue_time * 1000,
+            timed_out=response is None
         )
 
-        Logger.info(f"Response received for job '{self.job.name}': {self.check.to_dict()}")
+        Logger.info("Response received for job '%s': %s", self.job.name, self.check)
+
+    def iter_body(self) -> Iterator[bytes]:
+        """
+        Reads the response body in chunks, at most max_body_size bytes of it (if it is set for the job).
+        The reading stops (and the check is marked as timed out) when the deadline passed,
+        a read blocked at that time is aborted by the watchdog.
+        """
+        remaining = self.job.max_body_size
+        chunks = self.response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        while True:
+            if self.remaining_time() <= 0:
+                self.check.timed_out = True
+                Logger.warning("Job '%s' exceeded its deadline of %.0f seconds.", self.job.name, self.deadline)
+                break
+            read_start = time.monotonic()
+            try:
+                act_chunk = next(chunks, None)
+            finally:
+                self.transfer_time += time.monotonic() - read_start
+            if act_chunk is None:
+                break
+            if remaining is not None:
+                act_chunk = act_chunk[:remaining]
+                remaining -= len(act_chunk)
+            yield act_chunk
+            if remaining is not None and remaining <= 0:
+                break
+
+    def iter_text(self) -> Iterator[str]:
+        # Without charset in the headers the body is decoded as UTF-8
+        decoder = codecs.getincrementaldecoder(self.response.encoding or "utf-8")(errors="replace")
+        for act_chunk in self.iter_body():
+            yield decoder.decode(act_chunk)
+        yield decoder.decode(b"", final=True)
 
     def check_regex(self):
-        re_pattern = r"{}".format(self.job.expected_regex)
-        match = re.search(re_pattern, self.response.text)
+        """ Searches the expected regex in the streamed body, the download stops at the first match. """
+        matcher = StreamingRegexMatcher(RegexRegistry.get(self.job.expected_regex))
+        match = None
+        try:
+            for act_text in self.iter_text():
+                search_start = time.monotonic()
+                match = matcher.feed(act_text)
+                self.regex_time += time.monotonic() - search_start
+                if match:
+                    break
+            else:
+                search_start = time.monotonic()
+                match = matcher.finish()
+                self.regex_time += time.monotonic() - search_start
+        finally:
+            self.response.close()
+
         if match:
             self.check.regex_result = match.group(0)
 
+    def use_cached_response(self):
+        """ The content did not change (304 Not Modified), the regex result of the last full response is reused. """
+        self.check.regex_result = self.cached_response.regex_result
+        self.check.from_cache = True
+        self.discard_body()
+
+    def cache_response(self):
+        """ Remembers the validators and the regex result of a complete 200 response of a job with conditional requests. """
+        if not self.job.conditional or self.check.timed_out or self.response.status_code != 200:
+            return
+        etag = self.response.headers.get("ETag")
+        last_modified = self.response.headers.get("Last-Modified")
+        if etag or last_modified:
+            ResponseCache.set(CachedResponse(job=self.job, etag=etag, last_modified=last_modified, regex_result=self.check.regex_result))
+        else:
+            ResponseCache.remove(self.job.name)
+
+    def discard_body(self):
+        try:
+            for _ in self.iter_body():
+                pass
+        finally:
+            self.response.close()
+
+    def finish_timings(self):
+        """ The end of the check is the end of the body processing, measured on the monotonic clock. """
+        self.check.end_time = self.check.start_time + timedelta(seconds=time.monotonic() - self.started_at)
+        self.check.transfer_ms = self.transfer_time * 1000
+        self.check.regex_ms = self.regex_time * 1000 if self.job.expected_regex else None
+
     def send_check_for_upload(self):
-        db_connector = DbConnector()
-        db_connector.save_check_into_db(check=self.check)
+        if self.check_writer:
+            self.check_writer.put(self.check)
+            Logger.info("Response for job '%s' queued for upload.", self.job.name)
+            return
+
+        if not self.db_connector:
+            self.db_connector = DbConnector()
+        self.db_connector.save_check_into_db(check=self.check)
 
-        Logger.info(f"Response for job '{self.job.name}' uploaded to the database.")
+        Logger.info("Response for job '%s' uploaded to the database.", self.job.name)
 
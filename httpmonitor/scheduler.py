@@ -1,39 +1,172 @@
-import schedule
+import select
+import threading
 import time
 
+from functools import partial
 from multiprocessing import Process
-from typing import List
+from multiprocessing.queues import Queue
+from typing import List, Tuple
 
+from .check_spool import CheckSpool
+from .check_writer import CheckWriter
 from .config_handler import ConfigHandler
-from .job_handler import JobHandler
+from .const import PARTITION_MAINTENANCE_INTERVAL, RELOAD_REQUEST_CHECK_INTERVAL
+from .db_connector import DbConnector
+from .heap_scheduler import HeapScheduler
+from .job_handler import JobDiff, JobHandler
+from .logger import Logger
 from .models import Job
-from .scanner import HTTPScanner
+from .regex_registry import RegexRegistry
+from .scan_engine import ScanEngine
 
 class Scheduler:
     job_handler: JobHandler
     config_handler: ConfigHandler
     scheduled_jobs: List[Job]
     scan_process: Process
+    scan_engine: ScanEngine
+    check_writer: CheckWriter | None
+    heap_scheduler: HeapScheduler
+    shard: Tuple[int, int] | None
 
-    def __init__(self, from_file: bool):
+    def __init__(self, from_file: bool, shard: Tuple[int, int] | None = None, result_queue: Queue | None = None):
+        """
+        By default the scheduler runs all jobs and writes the checks to the database.
+        A worker process runs only its (index, count) shard of the jobs and sends the checks to the result queue.
+        """
         self.job_handler = JobHandler(from_file=from_file)
-        self.config_handler = ConfigHandler()
+        self.config_handler = ConfigHandler.shared()
+        self.shard = shard
         self.scheduled_jobs = self.get_scheduled_jobs()
+        regex_stats = RegexRegistry.stats()
+        Logger.info("%d distinct regex patterns compiled for %d jobs (hit rate: %.2f%%).",
+                    regex_stats.size, len(self.scheduled_jobs), regex_stats.hit_rate * 100)
+        if result_queue is None:
+            self.check_writer = CheckWriter(
+                db_connector=DbConnector(),
+                batch_size=self.config_handler.writer_batch_size,
+                flush_interval_ms=self.config_handler.writer_flush_interval_ms,
+                queue_max_size=self.config_handler.writer_queue_max_size,
+                maintenance_interval=PARTITION_MAINTENANCE_INTERVAL,
+                spool=CheckSpool.from_config(self.config_handler)
+            )
+        else:
+            self.check_writer = None
+        self.scan_engine = ScanEngine(
+            max_concurrency=self.config_handler.scan_max_concurrency,
+            check_writer=self.check_writer if result_queue is None else result_queue,
+            max_per_host=self.config_handler.scan_max_per_host,
+            host_rate=self.config_handler.scan_host_rate,
+            host_burst=self.config_handler.scan_host_burst,
+            overrun_policy=self.config_handler.overrun_policy
+        )
+        self.heap_scheduler = HeapScheduler()
+        self.reload_thread = None
+        self.reload_requested = threading.Event()
 
     def get_scheduled_jobs(self) -> List[Job]:
+        if self.shard:
+            return self.job_handler.get_shard(*self.shard)
         return self.job_handler.jobs
 
     def schedule_jobs(self):
-        #Scheduling jobs with using the 'schedule' package (https://github.com/dbader/schedule)
+        #The scheduler only submits the scans, they are executed concurrently by the scan engine
         for act_job in self.scheduled_jobs:
-            scan_job = HTTPScanner(job=act_job)
-            schedule.every(int(act_job.scheduled_interval)).seconds.do(scan_job.run)
+            self.heap_scheduler.add(
+                key=act_job.name,
+                interval=int(act_job.scheduled_interval),
+                callback=partial(self.scan_engine.submit, act_job)
+            )
+
+        #Without reload_interval and reload_notify the thread only waits for the reload requests (SIGHUP)
+        self.reload_thread = threading.Thread(target=self.reload_task, name="httpmonitor_job_reload", daemon=True)
 
         scan_process = Process(target=self.process_task)
         self.scan_process = scan_process
 
     def process_task(self):
+        if self.check_writer:
+            self.check_writer.start()
+        self.scan_engine.start()
+        if self.reload_thread:
+            self.reload_thread.start()
+        try:
+            self.heap_scheduler.run()
+        finally:
+            self.scan_engine.stop()
+
+    def reload_jobs(self) -> JobDiff:
+        """ Reloads the jobs and reschedules only the added, changed and removed ones of this scheduler. """
+        diff = self.job_handler.reload()
+        if self.shard:
+            in_shard = lambda act_job: self.job_handler.shard_of(act_job.name, self.shard[1]) == self.shard[0]
+            diff = JobDiff(
+                added=[act_job for act_job in diff.added if in_shard(act_job)],
+                changed=[act_job for act_job in diff.changed if in_shard(act_job)],
+                removed=[act_job for act_job in diff.removed if in_shard(act_job)]
+            )
+        self.apply_job_diff(diff)
+        self.scheduled_jobs = self.get_scheduled_jobs()
+        return diff
+
+    def apply_job_diff(self, diff: JobDiff):
+        for act_job in diff.added:
+            self.heap_scheduler.add(
+                key=act_job.name,
+                interval=int(act_job.scheduled_interval),
+                callback=partial(self.scan_engine.submit, act_job)
+            )
+        #The unchanged jobs keep their next firing time, the changed ones keep their phase
+        for act_job in diff.changed:
+            self.heap_scheduler.reschedule(
+                key=act_job.name,
+                interval=int(act_job.scheduled_interval),
+                callback=partial(self.scan_engine.submit, act_job)
+            )
+        for act_job in diff.removed:
+            self.heap_scheduler.remove(act_job.name)
+        if len(diff):
+            Logger.info("Jobs reloaded: %d added, %d changed, %d removed.", len(diff.added), len(diff.changed), len(diff.removed))
+
+    def request_reload(self):
+        """ The jobs are reloaded by the reload thread right away (SIGHUP), without waiting for the interval. """
+        self.reload_requested.set()
+
+    def reload_task(self):
+        """
+        Reloads the jobs every reload_interval seconds and on request. With reload_notify the jobs are (also) reloaded
+        when the jobs table is changed, the notifications are received on a dedicated LISTEN connection.
+        Without the notifications (jobs file) and without reload_interval, the jobs are only reloaded on request.
+        """
+        interval = self.config_handler.reload_interval or None
+        if interval is None and self.config_handler.reload_notify and self.job_handler.from_file:
+            Logger.warning("reload_notify does not apply to the jobs file, it is only reloaded on SIGHUP (set reload_interval to poll it).")
         while True:
-            schedule.run_pending()
-            time.sleep(1)
+            try:
+                if self.config_handler.reload_notify and not self.job_handler.from_file:
+                    with DbConnector().listen() as conn:
+                        next_reload = time.monotonic() + interval if interval else None
+                        while True:
+                            #The wait is bounded, so the reload requests are not missed while no notification arrives
+                            timeout = RELOAD_REQUEST_CHECK_INTERVAL
+                            if next_reload is not None:
+                                timeout = min(timeout, max(next_reload - time.monotonic(), 0))
+                            notified = select.select([conn], [], [], timeout) != ([], [], [])
+                            if notified:
+                                conn.poll()
+                                conn.notifies.clear()
+                            interval_passed = next_reload is not None and time.monotonic() >= next_reload
+                            if notified or interval_passed or self.reload_requested.is_set():
+                                self.reload_requested.clear()
+                                if next_reload is not None:
+                                    next_reload = time.monotonic() + interval
+                                self.reload_jobs()
+                else:
+                    while True:
+                        self.reload_requested.wait(interval)
+                        self.reload_requested.clear()
+                        self.reload_jobs()
+            except Exception as e:
+                Logger.error("Reloading the jobs failed: %s", e)
+                time.sleep(interval or 1)
 
@@ -5,6 +5,7 @@ from typing import List
 
 from .config_handler import ConfigHandler
 from .const import CONFIG_PATH, JOBS_PATH
+from .credential_cache import CredentialCache
 from .db_connector import DbConnector
 from .enums import DbUserType
 from .errors import ValuesDoNotMatchException, WrongUserTypeException
@@ -30,9 +31,9 @@ class SetupScript:
 
         if password == password_conf:
             SetupScript.credentials.append(DbCredentials(username=username, password=password, type=user_type))
-            Logger.debug(f"User'{username}' created.")
+            Logger.debug("User '%s' created.", username)
         else:
-            Logger.error(f"User '{username}' registration: Passwords do not match.")
+            Logger.error("User '%s' registration: Passwords do not match.", username)
             raise ValuesDoNotMatchException
 
     @staticmethod
@@ -82,6 +83,7 @@ def setup():
                 keyring.set_password(config_handler.keyring_service_name, "connector_password", act_user_cred.password)
             case _:
                 raise WrongUserTypeException(given_type=act_user_cred.type) 
+        CredentialCache.invalidate(act_user_cred.type)
 
     Logger.debug("Credentials registered in keyring.")
 
@@ -99,11 +101,43 @@ def setup():
     # Remove admin password
     keyring.delete_password(config_handler.keyring_service_name, "connector_username")
     keyring.delete_password(config_handler.keyring_service_name, "connector_password")
+    CredentialCache.invalidate(DbUserType.Connector)
 
     Logger.debug("Setup finished.")
     
     print("Setup finished! Enter 'httpmonitor -h' for available commands.")
 
 
+def migrate():
+    """
+    Upgrades the database schema of an existing installation.
+    The schema changes require the admin credentials, they are removed from the key storage afterwards.
+    """
+
+    config_handler = ConfigHandler(config_path=CONFIG_PATH)
+
+    while True:
+        try:
+            SetupScript.collect_user_data(DbUserType.Connector, f"\nTo migrate the database schema the scripts needs the credentials of the admin database user.")
+            break
+        except ValuesDoNotMatchException:
+            continue
+
+    connector_cred = SetupScript.credentials[-1]
+    keyring.set_password(config_handler.keyring_service_name, "connector_username", connector_cred.username)
+    keyring.set_password(config_handler.keyring_service_name, "connector_password", connector_cred.password)
+    CredentialCache.invalidate(DbUserType.Connector)
+
+    try:
+        DbConnector().migrate_database()
+        Logger.debug("Database migrated.")
+    finally:
+        keyring.delete_password(config_handler.keyring_service_name, "connector_username")
+        keyring.delete_password(config_handler.keyring_service_name, "connector_password")
+        CredentialCache.invalidate(DbUserType.Connector)
+
+    print("Migration finished!")
+
+
 if __name__ == "__main__":
     setup()
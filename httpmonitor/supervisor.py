@@ -0,0 +1,139 @@
+import multiprocessing
+import time
+
+from multiprocessing.process import BaseProcess
+from typing import Dict
+
+from .check_spool import CheckSpool
+from .check_writer import CheckWriter
+from .config_handler import ConfigHandler
+from .const import PARTITION_MAINTENANCE_INTERVAL
+from .db_connector import DbConnector
+from .job_handler import JobHandler
+from .logger import Logger, LoggerFactory
+from .scheduler import Scheduler
+
+
+def run_worker(shard_index: int, shard_count: int, result_queue, log_queue):
+    """ Entry point of the worker processes: schedules and scans the jobs of one shard. """
+    LoggerFactory.forward_to(log_queue)
+    scheduler = Scheduler(from_file=False, shard=(shard_index, shard_count), result_queue=result_queue)
+    Logger.info("Worker %d/%d started with %d jobs.", shard_index, shard_count, len(scheduler.scheduled_jobs))
+    scheduler.schedule_jobs()
+    scheduler.process_task()
+
+
+class WorkerSupervisor:
+    """
+    Splits the jobs into worker_count shards (by the stable hash of the job name) and scans every shard
+    in its own worker process. The workers send the checks back on a shared queue, they are written to the
+    database by the single CheckWriter of the supervisor. Workers that die are restarted.
+    """
+
+    worker_count: int
+    check_interval: float
+    max_restart_delay: float
+    workers: Dict[int, BaseProcess]
+
+    def __init__(self, worker_count: int, from_file: bool = False, check_interval: float = 1, max_restart_delay: float = 60):
+        # Importing the jobs once, the workers load them from the database
+        self.job_handler = JobHandler(from_file=True) if from_file else None
+
+        self.config_handler = ConfigHandler.shared()
+        self.worker_count = worker_count
+        self.check_interval = check_interval
+        self.max_restart_delay = max_restart_delay
+        self.context = multiprocessing.get_context("spawn")
+        self.result_queue = self.context.Queue(maxsize=self.config_handler.writer_queue_max_size)
+        #The records of the workers are written by the logger of the supervisor
+        self.log_queue = LoggerFactory.create_process_queue(self.context)
+        self.check_writer = CheckWriter(
+            db_connector=DbConnector(),
+            batch_size=self.config_handler.writer_batch_size,
+            flush_interval_ms=self.config_handler.writer_flush_interval_ms,
+            queue_max_size=self.config_handler.writer_queue_max_size,
+            check_queue=self.result_queue,
+            maintenance_interval=PARTITION_MAINTENANCE_INTERVAL,
+            spool=CheckSpool.from_config(self.config_handler)
+        )
+        self.workers = {}
+        self.started_at: Dict[int, float] = {}
+        self.restart_delays: Dict[int, float] = {}
+        self.restart_after: Dict[int, float] = {}
+        self.stopped = False
+        self.next_reload = time.monotonic() + self.config_handler.reload_interval
+        self.reload_requested = False
+
+    def start_worker(self, shard_index: int):
+        worker = self.context.Process(
+            target=run_worker,
+            args=(shard_index, self.worker_count, self.result_queue, self.log_queue),
+            name=f"httpmonitor_worker_{shard_index}",
+            daemon=True
+        )
+        worker.start()
+        self.workers[shard_index] = worker
+        self.started_at[shard_index] = time.monotonic()
+
+    def check_workers(self):
+        """ Restarts the dead workers, the ones crashing right after start are restarted with growing delay. """
+        now = time.monotonic()
+        for shard_index, worker in list(self.workers.items()):
+            if worker.is_alive():
+                continue
+
+            if shard_index not in self.restart_after:
+                if now - self.started_at[shard_index] < self.max_restart_delay:
+                    delay = min(max(self.restart_delays.get(shard_index, 0.5) * 2, 1), self.max_restart_delay)
+                else:
+                    delay = 1
+                self.restart_delays[shard_index] = delay
+                self.restart_after[shard_index] = now + delay
+                Logger.error("Worker %d exited with code %s, restarting in %.0fs.", shard_index, worker.exitcode, delay)
+            elif now >= self.restart_after[shard_index]:
+                del self.restart_after[shard_index]
+                self.start_worker(shard_index)
+
+    def request_reload(self):
+        """ The jobs file is reloaded at the next check (SIGHUP), without waiting for the interval. """
+        self.reload_requested = True
+
+    def reload_jobs_file(self):
+        """
+        The changes of the jobs file are saved to the database, the workers reload the jobs from there.
+        The file is reloaded every reload_interval seconds (if it is set) and on request.
+        """
+        if not self.job_handler:
+            return
+        interval_passed = self.config_handler.reload_interval > 0 and time.monotonic() >= self.next_reload
+        if not (interval_passed or self.reload_requested):
+            return
+        self.reload_requested = False
+        self.next_reload = time.monotonic() + self.config_handler.reload_interval
+        try:
+            diff = self.job_handler.reload()
+            if len(diff):
+                Logger.info("Jobs file reloaded: %d added, %d changed, %d removed.", len(diff.added), len(diff.changed), len(diff.removed))
+        except Exception as e:
+            Logger.error("Reloading the jobs file failed: %s", e)
+
+    def run(self):
+        self.check_writer.start()
+        for shard_index in range(self.worker_count):
+            self.start_worker(shard_index)
+        try:
+            while not self.stopped:
+                time.sleep(self.check_interval)
+                self.check_workers()
+                self.reload_jobs_file()
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.stopped = True
+        for worker in self.workers.values():
+            if worker.is_alive():
+                worker.terminate()
+        for worker in self.workers.values():
+            worker.join()
+        self.check_writer.stop()
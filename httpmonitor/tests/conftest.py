@@ -0,0 +1,21 @@
+import threading
+import pytest
+
+from http.server import ThreadingHTTPServer
+
+@pytest.fixture
+def http_server():
+    """ Starts local HTTP servers with the given request handler classes (returns the base url), they are shut down after the test. """
+    servers = []
+
+    def start(handler) -> str:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/"
+
+    yield start
+    for act_server in servers:
+        act_server.shutdown()
+        act_server.server_close()
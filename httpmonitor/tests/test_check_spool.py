@@ -0,0 +1,63 @@
+import os
+
+from datetime import datetime, timedelta
+
+from httpmonitor.check_spool import CheckSpool
+from httpmonitor.models import Check
+
+def create_checks(count: int) -> list:
+    start = datetime(2023, 6, 1, 12)
+    return [Check(
+        job_name="test_job",
+        start_time=start + timedelta(seconds=i),
+        end_time=start + timedelta(seconds=i, milliseconds=100),
+        status_code=200,
+        regex_result="found" if i % 2 else "",
+        ttfb_ms=12.5
+    ) for i in range(count)]
+
+def test_spool_replays_synced_checks_in_order(tmp_path):
+    spool = CheckSpool(directory=str(tmp_path), fsync_interval_ms=10000)
+    checks = create_checks(10)
+    spool.append(checks)
+    #Only the fsynced checks are readable
+    assert(spool.read(100)[0] == [])
+    spool.sync(force=True)
+    read_checks, position = spool.read(4)
+    assert(read_checks == checks[:4])
+    #Not committed yet, the same checks are read again
+    assert(spool.read(4)[0] == checks[:4])
+    spool.commit(position)
+    assert(spool.read(100)[0] == checks[4:])
+
+def test_spool_rotates_and_deletes_replayed_segments(tmp_path):
+    spool = CheckSpool(directory=str(tmp_path), segment_max_bytes=500, fsync_interval_ms=0)
+    checks = create_checks(20)
+    spool.append(checks)
+    spool.sync()
+    assert(len(spool.list_segments()) > 2)
+    read_checks, position = spool.read(100)
+    assert(read_checks == checks)
+    spool.commit(position)
+    assert(spool.list_segments() == [spool.write_segment])
+    assert(spool.pending_bytes == 0)
+
+def test_spool_resumes_from_checkpoint_and_skips_torn_tail(tmp_path):
+    spool = CheckSpool(directory=str(tmp_path), fsync_interval_ms=0)
+    checks = create_checks(6)
+    spool.append(checks)
+    spool.sync()
+    read_checks, position = spool.read(2)
+    spool.commit(position)
+    spool.close()
+    #Simulating a torn write of a crash
+    with open(spool.segment_path(spool.write_segment), "ab") as writer:
+        writer.write(b"\x10\x00\x00")
+
+    reopened_spool = CheckSpool(directory=str(tmp_path), fsync_interval_ms=0)
+    assert(reopened_spool.write_segment == spool.write_segment + 1)
+    reopened_spool.append(create_checks(1))
+    reopened_spool.sync()
+    read_checks, position = reopened_spool.read(100)
+    assert(read_checks == checks[2:] + create_checks(1))
+    assert(os.path.exists(os.path.join(str(tmp_path), "checkpoint")))
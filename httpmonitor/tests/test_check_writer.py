@@ -0,0 +1,91 @@
+import time
+
+from datetime import datetime
+
+from psycopg2 import OperationalError
+
+from httpmonitor.check_spool import CheckSpool
+from httpmonitor.check_writer import CheckWriter
+from httpmonitor.models import Check
+
+class FakeDbConnector:
+    def __init__(self):
+        self.batches = []
+        self.maintained = 0
+
+    def save_checks_into_db(self, checks):
+        self.batches.append(list(checks))
+        return len(checks)
+
+    def maintain_check_partitions(self):
+        self.maintained += 1
+        return (0, 0)
+
+def create_check():
+    return Check(
+        job_name="test_job",
+        start_time=datetime.now(),
+        end_time=datetime.now(),
+        status_code=200,
+        regex_result=""
+    )
+
+def test_writer_flushes_full_batches():
+    db_connector = FakeDbConnector()
+    writer = CheckWriter(db_connector=db_connector, batch_size=10, flush_interval_ms=10000, queue_max_size=100)
+    for _ in range(25):
+        writer.put(create_check())
+    writer.start()
+    writer.stop()
+    assert([len(act_batch) for act_batch in db_connector.batches] == [10, 10, 5])
+    assert(writer.written == 25)
+    assert(writer.depth == 0)
+
+def test_writer_flushes_after_interval():
+    db_connector = FakeDbConnector()
+    writer = CheckWriter(db_connector=db_connector, batch_size=100, flush_interval_ms=50, queue_max_size=100)
+    writer.start()
+    writer.put(create_check())
+    writer.put(create_check())
+    time.sleep(0.5)
+    assert([len(act_batch) for act_batch in db_connector.batches] == [2])
+    writer.stop()
+
+def test_writer_reports_queue_depth():
+    writer = CheckWriter(db_connector=FakeDbConnector(), batch_size=10, flush_interval_ms=50, queue_max_size=100)
+    for _ in range(3):
+        writer.put(create_check())
+    assert(writer.depth == 3)
+
+def test_writer_maintains_partitions():
+    db_connector = FakeDbConnector()
+    writer = CheckWriter(db_connector=db_connector, batch_size=10, flush_interval_ms=10, queue_max_size=100, maintenance_interval=3600)
+    writer.start()
+    writer.put(create_check())
+    writer.stop()
+    assert(db_connector.maintained == 1)
+    assert(writer.written == 1)
+
+def test_writer_spools_while_database_unavailable(tmp_path):
+    class UnavailableDbConnector(FakeDbConnector):
+        def save_checks_into_db(self, checks):
+            raise OperationalError("database unavailable")
+
+    checks = [create_check() for _ in range(15)]
+    writer = CheckWriter(db_connector=UnavailableDbConnector(), batch_size=10, flush_interval_ms=10, queue_max_size=100,
+                         spool=CheckSpool(directory=str(tmp_path), fsync_interval_ms=0))
+    writer.start()
+    for act_check in checks:
+        writer.put(act_check)
+    writer.stop()
+    assert(writer.written == 0 and writer.spool.pending_bytes > 0)
+    writer.spool.close()
+
+    #The spooled checks are replayed in order at the next start
+    db_connector = FakeDbConnector()
+    writer = CheckWriter(db_connector=db_connector, batch_size=10, flush_interval_ms=10, queue_max_size=100,
+                         spool=CheckSpool(directory=str(tmp_path), fsync_interval_ms=0))
+    writer.start()
+    writer.stop()
+    assert([act_check for act_batch in db_connector.batches for act_check in act_batch] == checks)
+    assert(writer.written == 15 and writer.spool.pending_bytes == 0)
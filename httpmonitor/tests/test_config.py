@@ -1,10 +1,13 @@
+import keyring
 import os
 import pytest
 
 from configparser import MissingSectionHeaderError, NoOptionError, NoSectionError
 from httpmonitor.errors import ValidatorException, InvalidFilenameException, FilePathAlreadyTakenException, WrongUserTypeException, EmptyParameterException
+from httpmonitor.errors import InsecureCredentialFileException
 
 from httpmonitor.config_handler import ConfigHandler
+from httpmonitor.credential_cache import CredentialCache
 from httpmonitor.enums import DbUserType
 
 def test_config_wrong_config_path():
@@ -147,3 +150,56 @@ def test_keyring_set_username_valid_type():
     config_handler.set_username(user_type=user_type, username=recent_username)
     username = config_handler.get_username(user_type)
     assert(username == recent_username)
+
+def test_shared_config_is_loaded_once():
+    config_handler = ConfigHandler.shared()
+    assert(ConfigHandler.shared() is config_handler)
+
+def test_shared_config_reloaded_on_change():
+    config_handler = ConfigHandler.shared()
+    stat = os.stat(config_handler.config_path)
+    os.utime(config_handler.config_path, (stat.st_atime, stat.st_mtime + 10))
+    ConfigHandler._next_mtime_check = 0.0
+    reloaded = ConfigHandler.shared()
+    assert(reloaded is not config_handler and reloaded.db_name == config_handler.db_name)
+
+    ConfigHandler.request_reload()
+    assert(ConfigHandler.shared() is not reloaded)
+
+def test_credentials_are_cached(monkeypatch):
+    config_handler = ConfigHandler()
+    CredentialCache.clear()
+    lookups = []
+    monkeypatch.setattr(keyring, "get_password", lambda service, name: lookups.append(name) or "cached_value")
+    assert(config_handler.get_username(DbUserType.Loader) == "cached_value")
+    assert(config_handler.get_username(DbUserType.Loader) == "cached_value")
+    assert(lookups == ["dmluser_username"])
+
+    monkeypatch.setattr(keyring, "set_password", lambda service, name, value: None)
+    config_handler.set_username(DbUserType.Loader, "new_username")
+    config_handler.get_username(DbUserType.Loader)
+    assert(lookups == ["dmluser_username", "dmluser_username"])
+    CredentialCache.clear()
+
+def test_credentials_from_environment(monkeypatch):
+    config_handler = ConfigHandler()
+    config_handler.credential_source = "env"
+    CredentialCache.clear()
+    monkeypatch.setenv("HTTPMONITOR_RETRIEVER_USERNAME", "env_retriever")
+    assert(config_handler.get_username(DbUserType.Retriever) == "env_retriever")
+    CredentialCache.clear()
+
+def test_credentials_from_file():
+    config_handler = ConfigHandler()
+    config_handler.credential_source = "file"
+    config_handler.credential_file = os.path.abspath("credentials.ini")
+    with open("credentials.ini", "w") as writer:
+        writer.write("[Loader]\nusername = file_loader\npassword = File_pw1!\n")
+    CredentialCache.clear()
+    os.chmod("credentials.ini", 0o644)
+    with pytest.raises(InsecureCredentialFileException):
+        config_handler.get_password(DbUserType.Loader)
+    os.chmod("credentials.ini", 0o600)
+    assert(config_handler.get_password(DbUserType.Loader) == "File_pw1!")
+    os.remove("credentials.ini")
+    CredentialCache.clear()
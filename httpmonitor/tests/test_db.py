@@ -1,6 +1,17 @@
-from datetime import datetime
+import os
+import pytest
+import select
 
+from configparser import ConfigParser
+
+from datetime import datetime, timedelta
+
+from httpmonitor.config_handler import ConfigHandler
+from httpmonitor.credential_cache import CredentialCache
 from httpmonitor.db_connector import DbConnector
+from httpmonitor.errors import InsecureCredentialFileException, MissingCredentialFileException, ValidatorException
+from httpmonitor.finding_cache import FindingIdCache
+from httpmonitor.job_cache import JobIdCache
 from httpmonitor.models import Job, Check
 from httpmonitor.job_handler import JobHandler
 
@@ -38,6 +49,32 @@ def test_db_get_jobs_from_db():
     jobs = db_connector.get_jobs_from_db()
     assert(len(jobs) > 1)
 
+def test_db_save_checks_into_db():
+    db_connector = DbConnector()
+    job = Job(name="test_job",
+            url="https://google.com",
+            method="GET",
+            headers={},
+            body={},
+            scheduled_interval=100,
+            expected_regex="<title>.+?</title>")
+    db_connector.save_job_into_db(job)
+    checks = [Check(
+        job_name="test_job",
+        start_time=datetime.now(),
+        end_time=datetime.now(),
+        status_code=200,
+        regex_result="<title>Google</title>" if i % 2 else "",
+        dns_ms=1.5 if i % 3 else None,
+        ttfb_ms=20.25,
+        transfer_ms=3.0
+    ) for i in range(10)]
+    #Timed out before the response
+    checks.append(Check(job_name="test_job", start_time=datetime.now(), end_time=datetime.now(), status_code=None, regex_result="", timed_out=True))
+    #Not modified, with the cached regex result
+    checks.append(Check(job_name="test_job", start_time=datetime.now(), end_time=datetime.now(), status_code=304, regex_result="<title>Google</title>", from_cache=True))
+    assert(db_connector.save_checks_into_db(checks=checks) == 12)
+
 def test_db_save_check_into_db():
     db_connector = DbConnector()
     check = Check(
@@ -52,3 +89,152 @@ def test_db_save_check_into_db():
     #Cleaning up the database
     job_handler = JobHandler(from_file=True)
     job_handler.read_jobs_from_file()
+
+def test_db_job_id_cache_filled_on_save():
+    db_connector = DbConnector()
+    job = Job(name="test_job",
+            url="https://google.com",
+            method="GET",
+            headers={},
+            body={},
+            scheduled_interval=100,
+            expected_regex="")
+    JobIdCache.clear()
+    db_connector.save_job_into_db(job)
+    job_id = JobIdCache.get("test_job")
+    assert(job_id is not None)
+    assert(db_connector.get_job_id("test_job") == job_id)
+    assert(db_connector.get_job_from_db(job_name="test_job")[0] == job_id)
+
+def test_db_jobs_change_notified():
+    db_connector = DbConnector()
+    with db_connector.listen() as conn:
+        db_connector.save_job_into_db(Job(name="notified_job",
+            url="https://google.com",
+            method="GET",
+            headers={},
+            body={},
+            scheduled_interval=100,
+            expected_regex=""))
+        assert(select.select([conn], [], [], 5) != ([], [], []))
+        conn.poll()
+        assert(len(conn.notifies) > 0)
+
+def test_db_save_jobs_into_db_report():
+    db_connector = DbConnector()
+    run_id = datetime.now().strftime("%H%M%S%f")
+    jobs = [Job(name=f"bulk_{run_id}_{i}",
+            url="https://google.com",
+            method="GET",
+            headers={"Accept": "text/html"},
+            body={},
+            scheduled_interval=100,
+            expected_regex="") for i in range(50)]
+    db_connector.save_jobs_into_db(jobs)
+
+    jobs[0] = Job.trusted(**{**jobs[0].to_dict(), "scheduled_interval": 200})
+    report = db_connector.save_jobs_into_db(jobs + [Job.trusted(**{**jobs[1].to_dict(), "name": f"bulk_{run_id}_new"})])
+    assert(report.inserted == 1 and report.updated == 1 and report.unchanged == 49)
+    assert(db_connector.get_job_from_db(job_name=f"bulk_{run_id}_0")[1].headers == {"Accept": "text/html"})
+    assert(JobIdCache.get(f"bulk_{run_id}_new") is not None)
+
+def test_db_maintain_check_partitions():
+    db_connector = DbConnector()
+    db_connector.maintain_check_partitions()
+    #The partitions of the next periods already exist
+    assert(db_connector.maintain_check_partitions() == (0, 0))
+    check = Check(
+        job_name="test_job",
+        start_time=datetime(2001, 1, 1),
+        end_time=datetime(2001, 1, 1),
+        status_code=200,
+        regex_result=""
+    )
+    #Checks out of the range of the partitions are stored in the default partition
+    assert(db_connector.save_checks_into_db(checks=[check]) == 1)
+
+def test_db_iter_job_stats_and_checks():
+    db_connector = DbConnector()
+    job = Job(name="test_job",
+            url="https://google.com",
+            method="GET",
+            headers={},
+            body={},
+            scheduled_interval=100,
+            expected_regex="")
+    db_connector.save_job_into_db(job)
+    start = datetime.now()
+    checks = [Check(
+        job_name="test_job",
+        start_time=start,
+        end_time=start + timedelta(milliseconds=100),
+        status_code=200 if i < 8 else 503,
+        regex_result=""
+    ) for i in range(10)]
+    db_connector.save_checks_into_db(checks=checks)
+
+    stats = {act_row[0]: act_row for act_row in db_connector.iter_job_stats(since=start - timedelta(hours=1))}
+    assert(stats["test_job"][1] >= 10 and stats["test_job"][4] >= 2)
+    exported = list(db_connector.iter_checks(since=start, until=start + timedelta(seconds=1), job_name="test_job"))
+    assert(len(exported) >= 10)
+
+def test_db_regex_findings_deduplicated():
+    db_connector = DbConnector()
+    job = Job(name="test_job",
+            url="https://google.com",
+            method="GET",
+            headers={},
+            body={},
+            scheduled_interval=100,
+            expected_regex="<title>.+?</title>")
+    db_connector.save_job_into_db(job)
+    create_check = lambda: Check(
+        job_name="test_job",
+        start_time=datetime.now(),
+        end_time=datetime.now(),
+        status_code=200,
+        regex_result="<title>Deduplicated</title>"
+    )
+    FindingIdCache.clear()
+    db_connector.save_checks_into_db(checks=[create_check(), create_check()])
+    assert(len(FindingIdCache._ids) == 1)
+    finding_id = next(iter(FindingIdCache._ids.values()))
+
+    #The stored finding is found again without the cache
+    FindingIdCache.clear()
+    db_connector.save_check_into_db(check=create_check())
+    assert(list(FindingIdCache._ids.values()) == [finding_id])
+
+def use_credential_file_config(monkeypatch, tmp_path, credential_file: str):
+    """ Makes the DbConnector use a config with the 'file' credential source (and a database without pooled connections). """
+    parser = ConfigParser(interpolation=None)
+    parser.read(ConfigHandler.shared().config_path)
+    parser.set("database", "db_name", "httpmonitorcredentialtest")
+    parser.set("keyring", "credential_source", "file")
+    parser.set("keyring", "credential_file", credential_file)
+    config_path = os.path.join(tmp_path, "config.ini")
+    with open(config_path, "w") as writer:
+        parser.write(writer)
+    CredentialCache.clear()
+    monkeypatch.setattr(ConfigHandler, "shared", staticmethod(lambda: ConfigHandler(config_path=config_path)))
+
+def test_db_credential_file_errors_reach_caller(monkeypatch, tmp_path):
+    credential_path = os.path.join(tmp_path, "credentials.ini")
+    with open(credential_path, "w") as writer:
+        writer.write("[Retriever]\nusername = file_retriever\npassword = File_pw1!\n")
+    os.chmod(credential_path, 0o644)
+    use_credential_file_config(monkeypatch, tmp_path, credential_path)
+    with pytest.raises(InsecureCredentialFileException):
+        DbConnector().get_jobs_from_db()
+
+    use_credential_file_config(monkeypatch, tmp_path, os.path.join(tmp_path, "missing.ini"))
+    with pytest.raises(MissingCredentialFileException):
+        DbConnector().get_jobs_from_db()
+    CredentialCache.clear()
+
+def test_db_credential_file_required_by_file_source(monkeypatch, tmp_path):
+    use_credential_file_config(monkeypatch, tmp_path, "")
+    with pytest.raises(ValidatorException) as e:
+        DbConnector().get_jobs_from_db()
+    assert("keyring_credential_file" in str(e.value.errors))
+    CredentialCache.clear()
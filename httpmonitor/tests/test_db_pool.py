@@ -0,0 +1,98 @@
+import threading
+import time
+
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from httpmonitor.db_pool import ConnectionPool
+
+class FakeInfo:
+    transaction_status = TRANSACTION_STATUS_IDLE
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query):
+        self.conn.health_checks += 1
+        if self.conn.broken:
+            raise OperationalError("server closed the connection")
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.health_checks = 0
+        self.info = FakeInfo()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = 1
+
+def create_pool(max_size=2, idle_timeout=60, health_check_interval=60):
+    created = []
+    def connect():
+        created.append(FakeConnection())
+        return created[-1]
+    return ConnectionPool(connect=connect, max_size=max_size, idle_timeout=idle_timeout, health_check_interval=health_check_interval), created
+
+def test_pool_reuses_connections():
+    pool, created = create_pool()
+    for _ in range(10):
+        with pool.connection():
+            pass
+    assert(len(created) == 1)
+    assert(pool.size == 1)
+
+def test_pool_blocks_at_max_size():
+    pool, created = create_pool(max_size=1)
+    conn = pool.acquire()
+    acquired = threading.Event()
+    def borrow():
+        with pool.connection():
+            acquired.set()
+    thread = threading.Thread(target=borrow)
+    thread.start()
+    assert(not acquired.wait(0.2))
+    pool.release(conn)
+    assert(acquired.wait(1))
+    thread.join()
+    assert(len(created) == 1)
+
+def test_pool_closes_idle_connections():
+    pool, created = create_pool(idle_timeout=0)
+    with pool.connection():
+        pass
+    time.sleep(0.01)
+    with pool.connection():
+        pass
+    assert(len(created) == 2)
+    assert(created[0].closed)
+
+def test_pool_replaces_unhealthy_connections():
+    pool, created = create_pool(health_check_interval=0)
+    with pool.connection():
+        pass
+    created[0].broken = True
+    with pool.connection() as conn:
+        assert(conn is created[1])
+    assert(created[0].health_checks == 1)
+    assert(pool.size == 1)
+
+def test_pool_discards_connection_on_operational_error():
+    pool, created = create_pool()
+    try:
+        with pool.connection():
+            raise OperationalError("connection lost")
+    except OperationalError:
+        pass
+    assert(pool.size == 0)
+    assert(created[0].closed)
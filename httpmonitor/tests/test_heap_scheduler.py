@@ -0,0 +1,91 @@
+import threading
+import time
+
+from httpmonitor.heap_scheduler import HeapScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_start_offset_is_deterministic_and_within_interval():
+    offsets = [HeapScheduler.start_offset(f"job_{i}", 5) for i in range(100)]
+    assert(offsets == [HeapScheduler.start_offset(f"job_{i}", 5) for i in range(100)])
+    assert(all(0 <= act_offset < 5 for act_offset in offsets))
+    assert(len(set(offsets)) > 50)
+
+def test_entries_fire_in_due_order():
+    clock = FakeClock()
+    scheduler = HeapScheduler(clock=clock)
+    fired = []
+    scheduler.add("slow", 10, lambda: fired.append("slow"), offset=2)
+    scheduler.add("fast", 1, lambda: fired.append("fast"), offset=0.5)
+
+    clock.now = 0.4
+    assert(abs(scheduler.run_pending() - 0.1) < 1e-9)
+    for act_now in [0.6, 1.6, 2.1, 2.6]:
+        clock.now = act_now
+        scheduler.run_pending()
+    assert(fired == ["fast", "fast", "slow", "fast"])
+
+def test_missed_periods_are_skipped_and_lag_measured():
+    clock = FakeClock()
+    scheduler = HeapScheduler(clock=clock)
+    fired = []
+    scheduler.add("job", 1, lambda: fired.append(clock.now), offset=0)
+    clock.now = 3.25
+    scheduler.run_pending()
+    assert(fired == [3.25])
+    assert(scheduler.lag.max == 3.25)
+    assert(scheduler.lag.skipped == 3)
+    assert(scheduler.next_due("job") == 4)
+
+def test_removed_entries_do_not_fire():
+    clock = FakeClock()
+    scheduler = HeapScheduler(clock=clock)
+    fired = []
+    scheduler.add("job", 1, lambda: fired.append("job"), offset=0)
+    scheduler.remove("job")
+    clock.now = 5
+    assert(scheduler.run_pending() is None)
+    assert(fired == [] and len(scheduler) == 0)
+
+def test_reschedule_keeps_phase():
+    clock = FakeClock()
+    scheduler = HeapScheduler(clock=clock)
+    scheduler.add("job", 10, lambda: None, offset=3)
+    scheduler.reschedule("job", 20)
+    assert(scheduler.next_due("job") == 3)
+
+def test_run_has_sub_second_precision():
+    scheduler = HeapScheduler()
+    fired = []
+    scheduler.add("job", 0.05, lambda: fired.append(time.monotonic()), offset=0)
+    thread = threading.Thread(target=scheduler.run)
+    thread.start()
+    time.sleep(0.5)
+    scheduler.stop()
+    thread.join()
+    assert(8 <= len(fired) <= 11)
+    assert(scheduler.lag.max < 0.05)
+
+def test_entry_added_before_wait_is_not_missed():
+    scheduler = HeapScheduler()
+    fired = []
+    run_pending = scheduler.run_pending
+
+    def add_after_run_pending():
+        #The entry is added after the wait is computed (empty heap) and before the loop waits
+        wait = run_pending()
+        if not fired and not scheduler.entries:
+            scheduler.add("job", 10, lambda: fired.append(1) or scheduler.stop(), offset=0)
+        return wait
+
+    scheduler.run_pending = add_after_run_pending
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    thread.join(timeout=2)
+    assert(not thread.is_alive())
+    assert(fired == [1])
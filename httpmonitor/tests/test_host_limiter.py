@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from httpmonitor.host_limiter import HostLimiter
+
+async def run_limited(limiter: HostLimiter, url: str, index: int, events: list, duration: float = 0.0):
+    async with limiter.limit(url):
+        events.append((index, time.monotonic()))
+        await asyncio.sleep(duration)
+
+def test_host_limiter_rate_is_fair_and_per_host():
+    limiter = HostLimiter(rate=20, burst=2)
+    events = []
+    other_events = []
+
+    async def run_all():
+        await asyncio.gather(
+            *[run_limited(limiter, "https://example.org/page", i, events) for i in range(6)],
+            *[run_limited(limiter, "https://other.example.org/", i, other_events) for i in range(2)]
+        )
+
+    start = time.monotonic()
+    asyncio.run(run_all())
+    #2 burst tokens, then one token per 50 ms, in arrival order
+    assert([act_index for act_index, _ in events] == list(range(6)))
+    assert(events[-1][1] - start >= 0.19)
+    #The other host is not limited by the first one
+    assert(all(act_time - start < 0.05 for _, act_time in other_events))
+    stats = limiter.stats()
+    assert(stats.waited == 4 and stats.hosts == 2 and stats.wait_ms_max >= 190)
+
+def test_host_limiter_concurrency():
+    limiter = HostLimiter(max_per_host=2)
+    events = []
+
+    async def run_all():
+        await asyncio.gather(*[run_limited(limiter, f"http://Example.org:8080/{i}", i, events, duration=0.1) for i in range(4)])
+
+    start = time.monotonic()
+    asyncio.run(run_all())
+    assert([act_index for act_index, _ in events] == list(range(4)))
+    assert(events[1][1] - start < 0.05 and events[2][1] - start >= 0.09)
+    assert(limiter.stats().waited == 2)
+    assert(HostLimiter.host_of("http://Example.org:8080/1") == "example.org")
@@ -0,0 +1,51 @@
+import time
+
+from http.server import BaseHTTPRequestHandler
+
+from httpmonitor.http_client import HttpClient
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """ Answers with the client port of the connection, so the reuse of the connections is visible. """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = str(self.client_address[1]).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "session=abc")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def test_connections_are_reused(http_server):
+    url = http_server(KeepAliveHandler)
+    client = HttpClient(pool_max_size=2, max_hosts=10, idle_timeout=60)
+    ports = {client.request("GET", url).text for _ in range(5)}
+    client.close_all()
+    assert(len(ports) == 1)
+
+def test_cookies_are_not_stored(http_server):
+    url = http_server(KeepAliveHandler)
+    client = HttpClient(pool_max_size=2, max_hosts=10, idle_timeout=60)
+    client.request("GET", url)
+    assert(len(client.get_session(url).cookies) == 0)
+    client.close_all()
+
+def test_least_recently_used_host_is_evicted():
+    client = HttpClient(pool_max_size=2, max_hosts=2, idle_timeout=60)
+    first = client.get_session("http://a.example/")
+    client.get_session("http://b.example/")
+    assert(client.get_session("http://a.example/page") is first)
+    client.get_session("http://c.example/")
+    assert(len(client) == 2)
+    assert(client.get_session("http://a.example/") is first)
+    assert(("http", "b.example") not in client.sessions)
+
+def test_idle_sessions_expire():
+    client = HttpClient(pool_max_size=2, max_hosts=10, idle_timeout=0.1)
+    first = client.get_session("http://a.example/")
+    time.sleep(0.2)
+    assert(client.get_session("http://a.example/") is not first)
+    assert(len(client) == 1)
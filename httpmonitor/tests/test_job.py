@@ -1,11 +1,14 @@
 import json
 import os
 import pytest
+import threading
 
-from httpmonitor.errors import InvalidFilenameException, ValidatorException
+from httpmonitor.errors import InvalidFilenameException, InvalidRegexException, ValidatorException
 
 from httpmonitor.job_handler import JobHandler 
 from httpmonitor.config_handler import ConfigHandler
+from httpmonitor.models import Job
+from httpmonitor.regex_registry import RegexRegistry
 
 def test_init_from_database():
     job_handler = JobHandler()
@@ -43,3 +46,64 @@ def test_read_from_bad_file():
     with pytest.raises(ValidatorException):
         JobHandler(jobs_path="../bad_jobs.json", from_file=True) 
     os.remove("../bad_jobs.json")
+
+def test_shard_of_is_stable_and_balanced():
+    job_names = [f"job_{i}" for i in range(1000)]
+    shards = [JobHandler.shard_of(act_name, 4) for act_name in job_names]
+    assert(shards == [JobHandler.shard_of(act_name, 4) for act_name in job_names])
+    assert(all(200 < shards.count(act_shard) < 300 for act_shard in range(4)))
+
+def create_regex_job(name: str, expected_regex: str):
+    return Job(name=name,
+            url="https://example.org",
+            method="GET",
+            headers={},
+            body={},
+            scheduled_interval=30,
+            expected_regex=expected_regex)
+
+def test_regex_compiled_once_and_shared():
+    RegexRegistry.clear()
+    create_regex_job("regex_job_1", "<title>.+?</title>")
+    create_regex_job("regex_job_2", "<title>.+?</title>")
+    stats = RegexRegistry.stats()
+    assert(stats.size == 1 and stats.misses == 1 and stats.hits == 1)
+    assert(RegexRegistry.compile("<title>.+?</title>") is RegexRegistry.compile("<title>.+?</title>"))
+
+def test_regex_lookup_of_scans_not_counted():
+    RegexRegistry.clear()
+    create_regex_job("regex_job_1", "<h1>.+?</h1>")
+    patterns = {id(RegexRegistry.get("<h1>.+?</h1>")) for _ in range(10)}
+    stats = RegexRegistry.stats()
+    assert(len(patterns) == 1)
+    assert(stats.misses == 1 and stats.hits == 0)
+
+def test_regex_stats_of_concurrent_loads():
+    RegexRegistry.clear()
+    threads = [threading.Thread(target=lambda: [RegexRegistry.compile("<h2>.+?</h2>") for _ in range(1000)]) for _ in range(8)]
+    for act_thread in threads:
+        act_thread.start()
+    for act_thread in threads:
+        act_thread.join()
+    stats = RegexRegistry.stats()
+    assert(stats.misses == 1 and stats.hits == 7999)
+
+def test_unused_regex_dropped():
+    RegexRegistry.clear()
+    create_regex_job("regex_job_1", "<h1>.+?</h1>")
+    create_regex_job("regex_job_2", "<h2>.+?</h2>")
+    RegexRegistry.retain(["<h2>.+?</h2>"])
+    assert(RegexRegistry.stats().size == 1)
+    assert(RegexRegistry.get("<h1>.+?</h1>").pattern == "<h1>.+?</h1>")
+
+def test_invalid_regex_rejected_at_load():
+    with pytest.raises(InvalidRegexException):
+        create_regex_job("regex_job_bad", "<title>(.+?</title>")
+
+def test_diff_jobs():
+    old_jobs = [create_regex_job("diff_job_1", ""), create_regex_job("diff_job_2", ""), create_regex_job("diff_job_3", "")]
+    new_jobs = [create_regex_job("diff_job_1", ""), create_regex_job("diff_job_2", "<p>"), create_regex_job("diff_job_4", "")]
+    diff = JobHandler.diff_jobs(old_jobs, new_jobs)
+    assert([act_job.name for act_job in diff.added] == ["diff_job_4"])
+    assert([act_job.name for act_job in diff.changed] == ["diff_job_2"])
+    assert([act_job.name for act_job in diff.removed] == ["diff_job_3"])
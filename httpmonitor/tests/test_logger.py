@@ -0,0 +1,60 @@
+import json
+import logging
+import multiprocessing
+import time
+
+from httpmonitor.logger import JsonLinesFormatter, Logger, LoggerFactory
+
+class CountingRepr:
+    def __init__(self):
+        self.count = 0
+
+    def __repr__(self):
+        self.count += 1
+        return "counted"
+
+def test_disabled_levels_are_not_formatted():
+    level = Logger.level
+    Logger.setLevel(logging.INFO)
+    value = CountingRepr()
+    Logger.debug("Value: %r", value)
+    Logger.setLevel(level)
+    assert(value.count == 0)
+
+def test_records_are_written_by_the_listener():
+    assert(not Logger.propagate)
+    assert(LoggerFactory._listener._thread is not None)
+
+def test_json_lines_formatter():
+    record = logging.LogRecord("httpmonitor_logger", logging.INFO, __file__, 1, "Job '%s' finished", ("test_job",), None)
+    entry = json.loads(JsonLinesFormatter().format(record))
+    assert(entry["level"] == "INFO" and entry["message"] == "Job 'test_job' finished")
+
+def log_from_worker(process_queue):
+    LoggerFactory.forward_to(process_queue)
+    Logger.warning("Record of worker %d", 1)
+
+class CollectingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def test_worker_records_are_written_by_the_parent():
+    context = multiprocessing.get_context("spawn")
+    handler = CollectingHandler()
+    handlers = LoggerFactory._listener.handlers
+    LoggerFactory._listener.handlers = handlers + (handler,)
+    try:
+        worker = context.Process(target=log_from_worker, args=(LoggerFactory.create_process_queue(context),), name="test_worker")
+        worker.start()
+        worker.join()
+        deadline = time.monotonic() + 5
+        while not handler.records and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        LoggerFactory._listener.handlers = handlers
+    assert(worker.exitcode == 0)
+    assert([(act_record.getMessage(), act_record.processName) for act_record in handler.records] == [("Record of worker 1", "test_worker")])
@@ -0,0 +1,28 @@
+import io
+import pytest
+
+from datetime import datetime, timedelta
+
+from httpmonitor.report import CHECK_COLUMNS, JOB_STATS_COLUMNS, parse_duration, write_rows
+
+def test_parse_duration():
+    assert(parse_duration("30m") == timedelta(minutes=30))
+    assert(parse_duration("24h") == timedelta(hours=24))
+    assert(parse_duration("7d") == timedelta(days=7))
+    with pytest.raises(ValueError):
+        parse_duration("7 days")
+
+def test_write_rows_csv():
+    out = io.StringIO()
+    rows = iter([("test_job", datetime(2023, 6, 1, 12), datetime(2023, 6, 1, 12, 0, 1), 200, None, 1.5, 2.0, None, 10.0, 1.0, None, 0.0)])
+    assert(write_rows(rows, CHECK_COLUMNS, out, "csv") == 1)
+    lines = out.getvalue().splitlines()
+    assert(lines[0].startswith("job,start_ts,end_ts,status_code"))
+    assert(lines[1] == "test_job,2023-06-01 12:00:00,2023-06-01 12:00:01,200,,1.5,2.0,,10.0,1.0,,0.0")
+
+def test_write_rows_table():
+    out = io.StringIO()
+    rows = [("test_job", 10, 90.0, 0, 1, None, 120.5, 100.0, 300.0, 400.0, 410.0)] * 3
+    assert(write_rows(rows, JOB_STATS_COLUMNS, out, "table") == 3)
+    lines = out.getvalue().splitlines()
+    assert(len(lines) == 4 and len({len(act_line) for act_line in lines}) == 1)
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from httpmonitor.models import Check
+from httpmonitor.rollups import Rollup
+
+def create_check(start_time: datetime, latency_ms: float, status_code: int | None = 200, regex_result: str = "", regex_ms: float | None = None) -> Check:
+    return Check(
+        job_name="test_job",
+        start_time=start_time,
+        end_time=start_time + timedelta(milliseconds=latency_ms),
+        status_code=status_code,
+        regex_result=regex_result,
+        regex_ms=regex_ms
+    )
+
+def test_rollup_buckets_by_resolution():
+    start = datetime(2023, 6, 1, 12, 0, 30)
+    checks = [create_check(start, 100), create_check(start + timedelta(minutes=1), 100), create_check(start, 100)]
+    minute_rollups = Rollup.aggregate(checks, {"test_job": 1}, "minute")
+    hour_rollups = Rollup.aggregate(checks, {"test_job": 1}, "hour")
+    assert(sorted(act_rollup.check_count for act_rollup in minute_rollups.values()) == [1, 2])
+    assert(hour_rollups[(1, datetime(2023, 6, 1, 12))].check_count == 3)
+    assert(Rollup.aggregate(checks, {}, "hour") == {})
+
+def test_rollup_counts_and_percentiles():
+    start = datetime(2023, 6, 1, 12)
+    rollup = Rollup()
+    for act_latency in range(1, 101):
+        rollup.add(create_check(start, act_latency * 10, status_code=500 if act_latency > 90 else 200,
+                                regex_result="found" if act_latency % 2 else "", regex_ms=0.5))
+    assert(rollup.check_count == 100)
+    assert(rollup.status_classes == [0, 90, 0, 0, 10])
+    assert(rollup.regex_checks == 100 and rollup.regex_hits == 50)
+    assert(rollup.latency_max_ms == 1000)
+    #The histogram buckets are 2^(1/4) (~19%) wide
+    assert(abs(rollup.percentile(0.5) - 500) / 500 < 0.2)
+    assert(abs(rollup.percentile(0.99) - 990) / 990 < 0.2)
+
+def test_rollup_counts_timed_out_check_without_status():
+    rollup = Rollup()
+    rollup.add(create_check(datetime(2023, 6, 1, 12), 5000, status_code=None))
+    assert(rollup.check_count == 1 and rollup.status_classes == [0] * 5)
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from http.server import BaseHTTPRequestHandler
+
+from httpmonitor.models import Job
+from httpmonitor.scan_engine import ScanEngine
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(0.5)
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"<title>slow page</title>")
+
+    def log_message(self, *args):
+        pass
+
+def create_jobs(url: str, count: int):
+    return [Job(name=f"engine_job_{i}",
+            url=url,
+            method="GET",
+            headers={},
+            body={},
+            scheduled_interval=5,
+            expected_regex="<title>.+?</title>") for i in range(count)]
+
+def test_scan_all_runs_concurrently(http_server):
+    url = http_server(SlowHandler)
+    engine = ScanEngine(max_concurrency=4, upload=False)
+    start = time.monotonic()
+    checks = asyncio.run(engine.scan_all(create_jobs(url, 4)))
+    elapsed = time.monotonic() - start
+    engine.stop()
+    assert(len(checks) == 4)
+    assert(all(act_check.status_code == 200 for act_check in checks))
+    assert(all(act_check.regex_result == "<title>slow page</title>" for act_check in checks))
+    assert(elapsed < 1.5)
+
+def test_submit_respects_concurrency_limit(http_server):
+    url = http_server(SlowHandler)
+    engine = ScanEngine(max_concurrency=2, upload=False)
+    start = time.monotonic()
+    futures = [engine.submit(act_job) for act_job in create_jobs(url, 4)]
+    checks = [act_future.result(timeout=10) for act_future in futures]
+    elapsed = time.monotonic() - start
+    engine.stop()
+    assert(len(checks) == 4)
+    assert(elapsed >= 1.0)
+
+def test_scan_respects_host_limit(http_server):
+    url = http_server(SlowHandler)
+    engine = ScanEngine(max_concurrency=4, upload=False, max_per_host=1)
+    start = time.monotonic()
+    checks = asyncio.run(engine.scan_all(create_jobs(url, 3)))
+    elapsed = time.monotonic() - start
+    engine.stop()
+    assert(elapsed >= 1.5)
+    assert(sorted(act_check.queue_ms >= 400 for act_check in checks) == [False, True, True])
+    assert(engine.host_limiter.stats().waited == 2)
+
+def test_overrun_policies(http_server):
+    url = http_server(SlowHandler)
+    job = create_jobs(url, 1)[0]
+    engine = ScanEngine(max_concurrency=4, upload=False, overrun_policy="skip")
+    futures = [engine.submit(job) for _ in range(3)]
+    results = [act_future.result(timeout=10) for act_future in futures]
+    engine.stop()
+    assert(results[0] is not None and results[1:] == [None, None])
+    assert(engine.skipped == 2)
+
+    engine = ScanEngine(max_concurrency=4, upload=False, overrun_policy="coalesce")
+    start = time.monotonic()
+    futures = [engine.submit(job) for _ in range(3)]
+    results = [act_future.result(timeout=10) for act_future in futures]
+    elapsed = time.monotonic() - start
+    engine.stop()
+    #The two overruns are merged into one more run
+    assert(results[1:] == [None, None] and engine.coalesced == 2)
+    assert(1.0 <= elapsed < 1.5)
+
+def test_cancelled_waiting_scans_are_not_pending(http_server):
+    url = http_server(SlowHandler)
+    engine = ScanEngine(max_concurrency=1, upload=False)
+    futures = [engine.submit(act_job) for act_job in create_jobs(url, 3)]
+    deadline = time.monotonic() + 5
+    while engine.pending < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert(engine.pending == 2)
+    futures[1].cancel()
+    futures[2].cancel()
+    futures[0].result(timeout=10)
+    deadline = time.monotonic() + 5
+    while engine.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    engine.stop()
+    assert(engine.pending == 0 and engine.in_flight == 0)
+
+def test_stats_are_logged_periodically():
+    engine = ScanEngine(max_concurrency=1, upload=False, stats_interval=0.1)
+    logged = []
+    engine.log_stats = lambda: logged.append(time.monotonic())
+    engine.start()
+    time.sleep(0.35)
+    engine.stop()
+    assert(len(logged) >= 3)
@@ -1,5 +1,13 @@
+import random
+import re
+import time
+
+from http.server import BaseHTTPRequestHandler
+
+from httpmonitor.http_client import HttpClient
 from httpmonitor.models import Job
-from httpmonitor.scanner import HTTPScanner
+from httpmonitor.response_cache import ResponseCache
+from httpmonitor.scanner import HTTPScanner, StreamingRegexMatcher
 
 def test_scan_site():
     job = Job(name="test_job",
@@ -26,3 +34,234 @@ def test_check_regex():
     scanner = HTTPScanner(job)
     scanner.run(upload=False)
     assert(len(str(scanner.check.regex_result)) > 0)
+
+class LargePageHandler(BaseHTTPRequestHandler):
+    """ Sends a 4 MB page with a marker after its first 100 kB, counting the bytes actually sent. """
+    sent = 0
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.end_headers()
+        try:
+            for i in range(64):
+                chunk = b"<p>filler</p>".ljust(65536, b" ")
+                if i == 1:
+                    chunk = b"<marker>found</marker>" + chunk[22:]
+                self.wfile.write(chunk)
+                LargePageHandler.sent += len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+def create_job(url: str, expected_regex: str, max_body_size: int | None = None):
+    return Job(name="stream_job",
+            url=url,
+            method="GET",
+            headers={},
+            body={},
+            scheduled_interval=50,
+            expected_regex=expected_regex,
+            max_body_size=max_body_size)
+
+def test_streaming_matcher_finds_match_across_chunks():
+    matcher = StreamingRegexMatcher(re.compile("<title>.+?</title>"), overlap=64)
+    assert(matcher.feed("x" * 1000 + "<tit") is None)
+    assert(matcher.feed("le>page</ti") is None)
+    assert(matcher.feed("tle>" + "y" * 1000).group(0) == "<title>page</title>")
+
+def test_streaming_matcher_waits_for_greedy_match_end():
+    matcher = StreamingRegexMatcher(re.compile("a+"), overlap=64)
+    assert(matcher.feed("xxaaa") is None)
+    assert(matcher.feed("aa") is None)
+    assert(matcher.finish().group(0) == "aaaaa")
+
+def test_streaming_matcher_keeps_context_of_trimmed_window():
+    body = "aaaaaOKbbbbbb" + "ccc" + " xOK yOK"
+    chunks = ["aaaaaOKbbbbbb", "ccc", " xOK", " yOK"]
+    for act_pattern in ("^OK", "\\AOK", "\\bOK", "(?<=y)OK", "(?m)^c+"):
+        matcher = StreamingRegexMatcher(re.compile(act_pattern), overlap=8)
+        match = None
+        for act_chunk in chunks:
+            match = matcher.feed(act_chunk)
+            if match:
+                break
+        else:
+            match = matcher.finish()
+        expected = re.search(act_pattern, body)
+        assert((match.group(0) if match else None) == (expected.group(0) if expected else None))
+
+def test_streaming_matcher_waits_for_match_growing_into_next_chunk():
+    #The match does not touch the end of the first chunk, but the bounded repetition extends it in the next one
+    matcher = StreamingRegexMatcher(re.compile("a.{0,20}b"), overlap=32)
+    assert(matcher.feed("xx a bnd") is None)
+    assert(matcher.feed("2/ db" + "y" * 100).group(0) == "a bnd2/ db")
+
+def test_streaming_matcher_matches_full_body_search():
+    rand = random.Random(7)
+    for act_pattern in ("a.{0,20}b", "a[^x]*b", "b+a?", "(ab|a)+"):
+        for _ in range(200):
+            body = "".join(rand.choice("ab x") for _ in range(rand.randint(0, 120)))
+            matcher = StreamingRegexMatcher(re.compile(act_pattern), overlap=32)
+            match = None
+            for act_start in range(0, len(body), 7):
+                match = matcher.feed(body[act_start:act_start + 7])
+                if match:
+                    break
+            else:
+                match = matcher.finish()
+            expected = re.search(act_pattern, body)
+            #Only the matches not longer than the overlap are guaranteed
+            if expected and len(expected.group(0)) <= 32:
+                assert(match.group(0) == expected.group(0))
+
+def test_check_regex_stops_download_at_match(http_server):
+    LargePageHandler.sent = 0
+    url = http_server(LargePageHandler)
+    scanner = HTTPScanner(create_job(url, "<marker>.+?</marker>"))
+    scanner.run(upload=False)
+    assert(scanner.check.regex_result == "<marker>found</marker>")
+    assert(LargePageHandler.sent < 64 * 65536)
+
+def test_check_regex_respects_max_body_size(http_server):
+    url = http_server(LargePageHandler)
+    scanner = HTTPScanner(create_job(url, "<marker>.+?</marker>", max_body_size=65536))
+    scanner.run(upload=False)
+    assert(scanner.check.regex_result == "")
+
+def test_phase_timings_recorded(http_server):
+    url = http_server(LargePageHandler)
+    client = HttpClient(pool_max_size=2, max_hosts=10, idle_timeout=60)
+    first = HTTPScanner(create_job(url, "<marker>.+?</marker>"), http_client=client)
+    first.run(upload=False)
+    assert(first.check.dns_ms is not None and first.check.connect_ms is not None)
+    assert(first.check.tls_ms is None)
+    assert(first.check.ttfb_ms >= 0 and first.check.transfer_ms > 0 and first.check.regex_ms > 0)
+    assert(first.check.end_time > first.check.start_time)
+
+    second = HTTPScanner(create_job(url, ""), http_client=client)
+    second.run(upload=False)
+    client.close_all()
+    assert(second.check.regex_ms is None)
+    assert(second.check.transfer_ms > 0)
+
+class StallingHandler(BaseHTTPRequestHandler):
+    """ Stalls before the response headers on /headers, sends the body byte by byte on /dribble, and stalls after the headers on the other paths. """
+
+    def do_GET(self):
+        if self.path == "/headers":
+            time.sleep(1)
+            return
+        if self.path == "/dribble":
+            self.send_response(200)
+            self.send_header("Content-Length", "100")
+            self.end_headers()
+            try:
+                for _ in range(100):
+                    self.wfile.write(b"x")
+                    self.wfile.flush()
+                    time.sleep(0.05)
+            except OSError:
+                pass
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "100")
+        self.end_headers()
+        self.wfile.write(b"<p>partial")
+        self.wfile.flush()
+        time.sleep(1)
+
+    def log_message(self, *args):
+        pass
+
+def test_timeout_recorded_as_check(http_server):
+    url = http_server(StallingHandler)
+    client = HttpClient(pool_max_size=2, max_hosts=10, idle_timeout=60)
+    job = create_job(url + "headers", "")
+    job.read_timeout = 0.2
+    scanner = HTTPScanner(job, http_client=client)
+    scanner.run(upload=False)
+    assert(scanner.check.timed_out and scanner.check.status_code is None)
+    assert((scanner.check.end_time - scanner.check.start_time).total_seconds() < 0.9)
+
+    job = create_job(url + "body", "<title>.+?</title>")
+    job.read_timeout = 0.2
+    scanner = HTTPScanner(job, http_client=client)
+    scanner.run(upload=False)
+    client.close_all()
+    assert(scanner.check.timed_out and scanner.check.status_code == 200)
+    assert(scanner.check.regex_result == "")
+
+def test_deadline_counts_queue_wait_and_bounds_whole_scan(http_server):
+    url = http_server(StallingHandler)
+    client = HttpClient(pool_max_size=2, max_hosts=10, idle_timeout=60)
+    #The job waited 49.6 of its 50 seconds in the queue, the default read timeout is far longer than the rest
+    job = create_job(url + "headers", "")
+    scanner = HTTPScanner(job, http_client=client, queue_time=49.6)
+    scanner.run(upload=False)
+    assert(scanner.check.timed_out and scanner.check.status_code is None)
+    assert((scanner.check.end_time - scanner.check.start_time).total_seconds() < 0.9)
+
+    #Every read returns within the read timeout, only the watchdog stops the scan
+    job = create_job(url + "dribble", "<title>.+?</title>")
+    scanner = HTTPScanner(job, http_client=client, queue_time=49.6)
+    scanner.run(upload=False)
+    assert(scanner.check.timed_out and scanner.check.status_code == 200)
+    assert((scanner.check.end_time - scanner.check.start_time).total_seconds() < 0.9)
+
+    job = create_job(url + "headers", "")
+    scanner = HTTPScanner(job, http_client=client, queue_time=51)
+    scanner.run(upload=False)
+    client.close_all()
+    assert(scanner.check.timed_out and scanner.check.status_code is None)
+
+class EtagHandler(BaseHTTPRequestHandler):
+    """ Sends a page with an ETag, or 304 if the client has the current version. """
+    full_responses = 0
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            return
+        body = b"<title>cached page</title>"
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        EtagHandler.full_responses += 1
+
+    def log_message(self, *args):
+        pass
+
+def test_conditional_request_reuses_regex_result(http_server):
+    EtagHandler.full_responses = 0
+    ResponseCache.clear()
+    url = http_server(EtagHandler)
+    client = HttpClient(pool_max_size=2, max_hosts=10, idle_timeout=60)
+    job = create_job(url, "<title>.+?</title>")
+    job.conditional = True
+    checks = []
+    for _ in range(3):
+        scanner = HTTPScanner(job, http_client=client)
+        scanner.run(upload=False)
+        checks.append(scanner.check)
+    assert([act_check.status_code for act_check in checks] == [200, 304, 304])
+    assert([act_check.from_cache for act_check in checks] == [False, True, True])
+    assert(all(act_check.regex_result == "<title>cached page</title>" for act_check in checks))
+    assert(EtagHandler.full_responses == 1)
+
+    #The cached response of a changed job is not used, neither for the jobs without conditional requests
+    changed_job = create_job(url, "<title>.+?</")
+    changed_job.conditional = True
+    plain_job = create_job(url, "<title>.+?</title>")
+    for act_job in (changed_job, plain_job):
+        scanner = HTTPScanner(act_job, http_client=client)
+        scanner.run(upload=False)
+        assert(scanner.check.status_code == 200 and not scanner.check.from_cache)
+    client.close_all()
+    assert(EtagHandler.full_responses == 3)
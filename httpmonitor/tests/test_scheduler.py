@@ -1,6 +1,71 @@
+import copy
+import threading
+import time
+
+from httpmonitor.job_handler import JobDiff
+from httpmonitor.models import Job
 from httpmonitor.scheduler import Scheduler
 
 def test_schedule_jobs():
     scheduler = Scheduler(from_file=False)
     scheduler.schedule_jobs()
     assert(len(scheduler.get_scheduled_jobs()) > 0)
+
+def test_apply_job_diff_keeps_phase():
+    scheduler = Scheduler(from_file=False)
+    scheduler.schedule_jobs()
+    job = scheduler.get_scheduled_jobs()[0]
+    next_due = scheduler.heap_scheduler.next_due(job.name)
+
+    changed_job = Job.trusted(**{**job.to_dict(), "scheduled_interval": 300})
+    added_job = Job.trusted(**{**job.to_dict(), "name": "reload_added_job"})
+    scheduler.apply_job_diff(JobDiff(added=[added_job], changed=[changed_job]))
+    assert(scheduler.heap_scheduler.next_due(job.name) == next_due)
+    assert(scheduler.heap_scheduler.entries[job.name].interval == 300)
+    assert(scheduler.heap_scheduler.next_due("reload_added_job") is not None)
+
+    scheduler.apply_job_diff(JobDiff(removed=[added_job]))
+    assert(scheduler.heap_scheduler.next_due("reload_added_job") is None)
+
+def test_reload_task_without_interval_waits_for_request():
+    scheduler = Scheduler(from_file=False)
+    scheduler.config_handler = copy.copy(scheduler.config_handler)
+    scheduler.config_handler.reload_interval = 0
+    scheduler.config_handler.reload_notify = False
+    reloads = []
+    scheduler.reload_jobs = lambda: reloads.append(time.monotonic())
+    threading.Thread(target=scheduler.reload_task, daemon=True).start()
+    time.sleep(0.3)
+    assert(reloads == [])
+    scheduler.request_reload()
+    time.sleep(0.2)
+    assert(len(reloads) == 1)
+
+def test_reload_request_with_default_config():
+    scheduler = Scheduler(from_file=False)
+    reloads = []
+    scheduler.reload_jobs = lambda: reloads.append(time.monotonic())
+    scheduler.schedule_jobs()
+    assert(scheduler.reload_thread is not None)
+    scheduler.reload_thread.start()
+    time.sleep(0.2)
+    assert(reloads == [])
+    scheduler.request_reload()
+    time.sleep(0.2)
+    assert(len(reloads) == 1)
+
+def test_reload_request_while_listening_for_notifications():
+    scheduler = Scheduler(from_file=False)
+    scheduler.config_handler = copy.copy(scheduler.config_handler)
+    scheduler.config_handler.reload_interval = 0
+    scheduler.config_handler.reload_notify = True
+    reloads = []
+    scheduler.reload_jobs = lambda: reloads.append(time.monotonic())
+    threading.Thread(target=scheduler.reload_task, daemon=True).start()
+    time.sleep(0.3)
+    assert(reloads == [])
+    scheduler.request_reload()
+    deadline = time.monotonic() + 3
+    while not reloads and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert(len(reloads) == 1)
@@ -0,0 +1,33 @@
+import time
+
+from httpmonitor.supervisor import WorkerSupervisor
+
+def test_supervisor_restarts_dead_workers():
+    supervisor = WorkerSupervisor(worker_count=2, check_interval=0.1, max_restart_delay=1)
+    supervisor.start_worker(0)
+    supervisor.start_worker(1)
+    first_worker = supervisor.workers[0]
+    first_worker.kill()
+    first_worker.join()
+
+    deadline = time.monotonic() + 10
+    while supervisor.workers[0] is first_worker and time.monotonic() < deadline:
+        supervisor.check_workers()
+        time.sleep(0.1)
+
+    assert(supervisor.workers[0] is not first_worker)
+    assert(supervisor.workers[0].is_alive())
+    assert(supervisor.workers[1].is_alive())
+    supervisor.stop()
+
+def test_supervisor_reloads_jobs_file_on_request():
+    supervisor = WorkerSupervisor(worker_count=2)
+    reloads = []
+    supervisor.job_handler = type("FakeJobHandler", (), {"reload": lambda self: reloads.append(1) or []})()
+    supervisor.config_handler = type("FakeConfig", (), {"reload_interval": 0})()
+    supervisor.reload_jobs_file()
+    assert(reloads == [])
+    supervisor.request_reload()
+    supervisor.reload_jobs_file()
+    supervisor.reload_jobs_file()
+    assert(reloads == [1])
@@ -0,0 +1,54 @@
+from cerberus import Validator
+from datetime import datetime
+
+from httpmonitor.models import Check, Job
+from httpmonitor.validators import CheckValidator, CompiledSchema, JobValidator
+
+VALID_JOB = {
+    "name": "test_job",
+    "url": "https://example.org/path?q=1",
+    "method": "GET",
+    "headers": {"User-Agent": "httpmonitor"},
+    "body": {"page": 1},
+    "expected_regex": "",
+    "scheduled_interval": 30,
+    "max_body_size": None
+}
+
+def cerberus_errors(schema: dict, document: dict) -> dict:
+    validator = Validator()
+    validator.require_all = True
+    validator.validate(document, schema)
+    return validator.errors
+
+def test_compiled_schema_matches_cerberus():
+    documents = [
+        VALID_JOB,
+        {**VALID_JOB, "name": "abc"},
+        {**VALID_JOB, "name": "bad name!"},
+        {**VALID_JOB, "url": "ftp://example.org"},
+        {**VALID_JOB, "url": "https://example.org/ with space"},
+        {**VALID_JOB, "method": "FETCH"},
+        {**VALID_JOB, "headers": {"User-Agent": 5}},
+        {**VALID_JOB, "body": {"page": "one"}},
+        {**VALID_JOB, "expected_regex": None},
+        {**VALID_JOB, "scheduled_interval": 3},
+        {**VALID_JOB, "scheduled_interval": "30"},
+        {**VALID_JOB, "max_body_size": 0},
+        {key: value for key, value in VALID_JOB.items() if key != "url"},
+        {**VALID_JOB, "unknown": 1}
+    ]
+    compiled_schema = CompiledSchema(JobValidator.schema)
+    assert(compiled_schema.supported)
+    for act_document in documents:
+        assert(set(compiled_schema.validate(act_document)) == set(cerberus_errors(JobValidator.schema, act_document)))
+
+def test_unsupported_rules_fall_back_to_cerberus():
+    assert(not CompiledSchema({"name": {"type": "string", "coerce": str}}).supported)
+    assert(CompiledSchema(CheckValidator.schema).supported)
+
+def test_trusted_construction_skips_validation():
+    check = Check.trusted(job_name="x", start_time=datetime.now(), end_time=datetime.now(), status_code=700, regex_result="")
+    assert(check.status_code == 700 and check.ttfb_ms is None)
+    job = Job.trusted(**VALID_JOB)
+    assert(job == Job(**VALID_JOB))
@@ -1,9 +1,147 @@
-from cerberus import Validator
+import re
 
+from cerberus import Validator
+from collections.abc import Iterable, Mapping, Sized
 from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List
 
 from .errors import AbstractInstantiationException
 
+
+class CompiledSchema:
+    """
+    A validation schema turned into plain Python checks once, instead of interpreting it with Cerberus for every object.
+    It follows the Cerberus semantics of the rules used in this module: every field is required, unknown fields
+    are rejected, the rules run in the nullable, type, empty, <rest> order and the regexes must match the whole value.
+    Schemas using any other rule are not compiled (supported is False), they are validated by Cerberus.
+    """
+
+    SUPPORTED_RULES = {'type', 'nullable', 'empty', 'allowed', 'min', 'max', 'minlength', 'maxlength', 'regex', 'keysrules', 'valuesrules'}
+    #The types of the Cerberus types_mapping: (included types, excluded types)
+    TYPES = {
+        'boolean': ((bool,), ()),
+        'datetime': ((datetime,), ()),
+        'dict': ((Mapping,), ()),
+        'float': ((float, int), ()),
+        'integer': ((int,), ()),
+        'number': ((int, float), (bool,)),
+        'string': ((str,), ())
+    }
+    #Rules skipped for empty values if the 'empty' rule is set
+    EMPTY_SKIPPED_RULES = {'allowed', 'minlength', 'maxlength', 'regex'}
+
+    schema: dict
+    supported: bool
+    fields: Dict[str, Callable[[object], List[str]]]
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+        self.supported = all(self.__is_supported(act_rules) for act_rules in schema.values())
+        self.fields = {act_name: self.__compile_rules(act_rules) for act_name, act_rules in schema.items()} if self.supported else {}
+
+    def validate(self, document: dict) -> dict:
+        """ Returns the errors of the document in the Cerberus format ({field: [messages]}), empty if it is valid. """
+        errors = {}
+        for act_name, act_check in self.fields.items():
+            if act_name not in document:
+                errors[act_name] = ["required field"]
+                continue
+            field_errors = act_check(document[act_name])
+            if field_errors:
+                errors[act_name] = field_errors
+        for act_name in document:
+            if act_name not in self.fields:
+                errors[act_name] = ["unknown field"]
+        return errors
+
+    def __is_supported(self, rules: dict) -> bool:
+        if not set(rules) <= self.SUPPORTED_RULES:
+            return False
+        types = rules.get('type', [])
+        if not all(act_type in self.TYPES for act_type in ([types] if isinstance(types, str) else types)):
+            return False
+        return all(self.__is_supported(rules[act_rule]) for act_rule in ('keysrules', 'valuesrules') if act_rule in rules)
+
+    def __compile_rules(self, rules: dict) -> Callable[[object], List[str]]:
+        nullable = rules.get('nullable', False)
+        empty = rules.get('empty')
+        type_check = self.__compile_type(rules['type']) if rules.get('type') else None
+        rule_checks = [
+            (act_rule, self.__compile_rule(act_rule, act_constraint))
+            for act_rule, act_constraint in rules.items()
+            if act_rule not in ('type', 'nullable', 'empty')
+        ]
+
+        def check(value) -> List[str]:
+            if value is None:
+                return [] if nullable else ["null value not allowed"]
+            if type_check and not type_check(value):
+                return [f"must be of {rules['type']} type"]
+
+            errors = []
+            skipped_rules = ()
+            if empty is not None and isinstance(value, Sized) and len(value) == 0:
+                if not empty:
+                    errors.append("empty values not allowed")
+                skipped_rules = self.EMPTY_SKIPPED_RULES
+            for act_rule, act_check in rule_checks:
+                if act_rule in skipped_rules:
+                    continue
+                error = act_check(value)
+                if error:
+                    errors.append(error)
+            return errors
+
+        return check
+
+    def __compile_type(self, data_type: str | list) -> Callable[[object], bool]:
+        type_definitions = [self.TYPES[act_type] for act_type in ([data_type] if isinstance(data_type, str) else data_type)]
+        return lambda value: any(
+            isinstance(value, included) and not isinstance(value, excluded) for included, excluded in type_definitions
+        )
+
+    def __compile_rule(self, rule: str, constraint) -> Callable[[object], str | None]:
+        match rule:
+            case 'allowed':
+                def check_allowed(value):
+                    if isinstance(value, Iterable) and not isinstance(value, str):
+                        unallowed = tuple(act_value for act_value in value if act_value not in constraint)
+                        return f"unallowed values {unallowed}" if unallowed else None
+                    return f"unallowed value {value}" if value not in constraint else None
+                return check_allowed
+            case 'min':
+                def check_min(value):
+                    try:
+                        return f"min value is {constraint}" if value < constraint else None
+                    except TypeError:
+                        return None
+                return check_min
+            case 'max':
+                def check_max(value):
+                    try:
+                        return f"max value is {constraint}" if value > constraint else None
+                    except TypeError:
+                        return None
+                return check_max
+            case 'minlength':
+                return lambda value: f"min length is {constraint}" if isinstance(value, Iterable) and len(value) < constraint else None
+            case 'maxlength':
+                return lambda value: f"max length is {constraint}" if isinstance(value, Iterable) and len(value) > constraint else None
+            case 'regex':
+                pattern = re.compile(constraint if constraint.endswith('$') else constraint + '$')
+                return lambda value: f"value does not match regex '{constraint}'" if isinstance(value, str) and not pattern.match(value) else None
+            case 'keysrules' | 'valuesrules':
+                nested_check = self.__compile_rules(constraint)
+                def check_items(value):
+                    if not isinstance(value, Mapping):
+                        return None
+                    items = value.keys() if rule == 'keysrules' else value.values()
+                    errors = [f"{act_item}: {', '.join(act_errors)}" for act_item in items for act_errors in [nested_check(act_item)] if act_errors]
+                    return f"{rule} errors: {'; '.join(errors)}" if errors else None
+                return check_items
+
+
 @dataclass
 class AbstractValidator:
     data: object | None
@@ -15,7 +153,19 @@ class AbstractValidator:
             raise AbstractInstantiationException(class_to_instantiate='AbstractInstantiationException')
         self.errors = {}
 
+    @classmethod
+    def compiled_schema(cls) -> CompiledSchema:
+        """ The schema of the validator class is compiled at the first use. """
+        if '_compiled_schema' not in cls.__dict__:
+            cls._compiled_schema = CompiledSchema(cls.schema)
+        return cls._compiled_schema
+
     def validate(self) -> bool:
+        compiled_schema = self.compiled_schema()
+        if compiled_schema.supported:
+            self.errors = compiled_schema.validate(self.data.to_dict())
+            return not self.errors
+
         validator = Validator()
         validator.require_all = True
         
@@ -95,6 +245,24 @@ class JobValidator(AbstractValidator):
             'type': 'integer',
             'min': 5,
             'max': 300
+        },
+        'max_body_size': {
+            'type': 'integer',
+            'min': 1,
+            'nullable': True
+        },
+        'connect_timeout': {
+            'type': 'number',
+            'min': 0.1,
+            'nullable': True
+        },
+        'read_timeout': {
+            'type': 'number',
+            'min': 0.1,
+            'nullable': True
+        },
+        'conditional': {
+            'type': 'boolean'
         }
     }
 
@@ -117,10 +285,52 @@ class CheckValidator(AbstractValidator):
             'type': 'integer',
             'min': 100,
             'max': 599,
+            'nullable': True
         },
         'regex_result': {
             'type': 'string',
             'empty': True
+        },
+        'dns_ms': {
+            'type': 'number',
+            'min': 0,
+            'nullable': True
+        },
+        'connect_ms': {
+            'type': 'number',
+            'min': 0,
+            'nullable': True
+        },
+        'tls_ms': {
+            'type': 'number',
+            'min': 0,
+            'nullable': True
+        },
+        'ttfb_ms': {
+            'type': 'number',
+            'min': 0,
+            'nullable': True
+        },
+        'transfer_ms': {
+            'type': 'number',
+            'min': 0,
+            'nullable': True
+        },
+        'regex_ms': {
+            'type': 'number',
+            'min': 0,
+            'nullable': True
+        },
+        'queue_ms': {
+            'type': 'number',
+            'min': 0,
+            'nullable': True
+        },
+        'timed_out': {
+            'type': 'boolean'
+        },
+        'from_cache': {
+            'type': 'boolean'
         }
         
     }
@@ -152,11 +362,47 @@ class ConfigValidator(AbstractValidator):
             'regex': '[a-zA-Z0-9]+',
             'empty': False
         },
+        'database_pool_max_size': {
+            'type': 'integer',
+            'min': 1
+        },
+        'database_pool_idle_timeout': {
+            'type': 'integer',
+            'min': 0
+        },
+        'database_pool_health_check_interval': {
+            'type': 'integer',
+            'min': 0
+        },
+        'database_partition_interval': {
+            'type': 'string',
+            'allowed': ['day', 'week', 'month']
+        },
+        'database_partitions_ahead': {
+            'type': 'integer',
+            'min': 1
+        },
+        'database_retention_days': {
+            'type': 'integer',
+            'min': 0
+        },
         'keyring_service_name': {
             'type': 'string',
             'minlength': 3,
             'maxlength': 50
         },
+        'keyring_credential_source': {
+            'type': 'string',
+            'allowed': ['keyring', 'env', 'file']
+        },
+        'keyring_credential_file': {
+            'type': 'string',
+            'empty': True
+        },
+        'keyring_cache_ttl': {
+            'type': 'integer',
+            'min': 0
+        },
         'log_out_path': {
             'type': 'string',
             'empty': False
@@ -164,5 +410,100 @@ class ConfigValidator(AbstractValidator):
         'log_level': {
             'type': 'string',
             'allowed': ['debug', 'info', 'warning', 'error', 'critical']
+        },
+        'log_json_out_path': {
+            'type': 'string',
+            'empty': True
+        },
+        'log_json_max_bytes': {
+            'type': 'integer',
+            'min': 0
+        },
+        'log_json_backup_count': {
+            'type': 'integer',
+            'min': 0
+        },
+        'scanner_max_concurrency': {
+            'type': 'integer',
+            'min': 1
+        },
+        'scanner_workers': {
+            'type': 'integer',
+            'min': 1
+        },
+        'scanner_max_per_host': {
+            'type': 'integer',
+            'min': 0
+        },
+        'scanner_host_rate': {
+            'type': 'number',
+            'min': 0
+        },
+        'scanner_host_burst': {
+            'type': 'integer',
+            'min': 1
+        },
+        'scheduler_reload_interval': {
+            'type': 'integer',
+            'min': 0
+        },
+        'scheduler_reload_notify': {
+            'type': 'boolean'
+        },
+        'scheduler_overrun_policy': {
+            'type': 'string',
+            'allowed': ['skip', 'coalesce', 'overlap']
+        },
+        'writer_batch_size': {
+            'type': 'integer',
+            'min': 1
+        },
+        'writer_flush_interval_ms': {
+            'type': 'integer',
+            'min': 0
+        },
+        'writer_queue_max_size': {
+            'type': 'integer',
+            'min': 1
+        },
+        'writer_spool_dir': {
+            'type': 'string',
+            'empty': True
+        },
+        'writer_spool_segment_max_bytes': {
+            'type': 'integer',
+            'min': 1
+        },
+        'writer_spool_fsync_interval_ms': {
+            'type': 'integer',
+            'min': 0
+        },
+        'http_pool_max_size': {
+            'type': 'integer',
+            'min': 1
+        },
+        'http_max_hosts': {
+            'type': 'integer',
+            'min': 1
+        },
+        'http_idle_timeout': {
+            'type': 'integer',
+            'min': 1
+        },
+        'http_connect_timeout': {
+            'type': 'number',
+            'min': 0.1
+        },
+        'http_read_timeout': {
+            'type': 'number',
+            'min': 0.1
         }
     }
+
+    def validate(self) -> bool:
+        valid = super().validate()
+        #The fields depending on each other are checked after the schema
+        if self.data.keyring_credential_source == 'file' and not self.data.keyring_credential_file:
+            self.errors['keyring_credential_file'] = ["required by the 'file' credential source"]
+            valid = False
+        return valid